@@ -0,0 +1,47 @@
+# allocation.py
+# Cluster prioritisation and per-person resource allocation used by main.py (kept free of
+# Flask/Haystack imports so benchmarks and the simulator can call it directly).
+
+# Units per person for each resource in the dashboard's recommendation panel
+RESOURCES_PER_PERSON = {
+    'Medical Kits': 0.2,
+    'Food Packets': 1,
+    'Water Bottles': 3,
+    'Blankets': 1,
+    'Emergency Kits': 0.5
+}
+
+# Distance at which a cluster's urgency is halved in cluster_priority
+PRIORITY_DISTANCE_KM = 25.0
+
+def recommended_resources(people):
+    return {name: int(people * ratio) for name, ratio in RESOURCES_PER_PERSON.items()}
+
+def cluster_priority(people, distance_km):
+    # Same ordering intent as priority_score (more people, closer distance) but absolute: it does
+    # not depend on the other clusters, so map aggregates can be kept up to date incrementally.
+    # Accepts scalars or NumPy arrays.
+    return people / (1.0 + distance_km / PRIORITY_DISTANCE_KM)
+
+def compute_recommendations(df, min_people, max_distance, top_n=5):
+    # Filter clusters based on criteria
+    filtered_df = df[
+        (df['No_of_People'] >= min_people) & 
+        (df['Distance_from_Inventory_km'] <= max_distance)
+    ].copy()
+    
+    # Sort by priority (more people, closer distance)
+    filtered_df['priority_score'] = (
+        filtered_df['No_of_People'] / filtered_df['No_of_People'].max() -
+        filtered_df['Distance_from_Inventory_km'] / filtered_df['Distance_from_Inventory_km'].max()
+    )
+    
+    filtered_df = filtered_df.sort_values('priority_score', ascending=False)
+    
+    # Get top recommendations
+    recommendations = filtered_df.head(top_n).to_dict('records')
+    
+    # Calculate resource allocations
+    for rec in recommendations:
+        rec['recommended_resources'] = recommended_resources(rec['No_of_People'])
+    return recommendations
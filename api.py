@@ -1,38 +1,272 @@
 # api.py
-from fastapi import FastAPI
-from pydantic import BaseModel
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Literal
+from fastapi import FastAPI, HTTPException, Request, Response
+from pydantic import BaseModel, Field
 from haystack.document_stores import FAISSDocumentStore
-from haystack import Pipeline
-from haystack.components.embedders import SentenceTransformersTextEmbedder
-from haystack.components.retrievers import InMemoryEmbeddingRetriever
-import pandas as pd
+from hybrid_retrieve import HybridRetriever
+from sharded_retrieve import KINDS, FanOutRetriever, shard_index_path
+from embed_cache import CachedTextEmbedder, all_stats, get_cache
+from embed_backend import cache_model_name
+from embed_batcher import BatchingEmbedder
+from planner_prompt import render_planner_prompt, validate_plan_json
+from shm_store import open_inventory
+from columnar_store import load_clusters
+from stock_ledger import StockLedger
+from cluster_store import etag_matches
+from routing import Router, load_graph, fill_routes
+from dispatch import assign_teams
+import llm_client
+from metrics import REGISTRY, PROMETHEUS_CONTENT_TYPE, PARSE_FAILURES, LLM_ERRORS, stage, stats_collector
+import httpx
 import orjson
 
 app = FastAPI()
 store = FAISSDocumentStore.load(index_path=None)
-embed = SentenceTransformersTextEmbedder(model="sentence-transformers/all-MiniLM-L6-v2")
-retriever = InMemoryEmbeddingRetriever(document_store=store, top_k=10)
-pipe = Pipeline()
-pipe.add_component("embed", embed)
-pipe.add_component("ret", retriever)
-pipe.connect("embed.documents", "ret.query_embedding")
+# Concurrent /plan requests share one encode call per few-ms window, off the event loop
+batcher = BatchingEmbedder(model="sentence-transformers/all-MiniLM-L6-v2", max_batch=64, max_wait_ms=5)
+# Cache entries are per backend (EMBED_BACKEND), since int8 vectors differ slightly from fp32
+embed = CachedTextEmbedder(batcher, get_cache(cache_model_name(batcher.model)))
+# dense-only by default (same as the old embed -> ret pipeline); bm25/hybrid are per-request opt-ins
+retriever = HybridRetriever(document_store=store, embedder=embed, top_k=10)
+# Per-kind sub-indexes written by ingest.py, queried in parallel with per-kind quotas
+fanout = FanOutRetriever(
+    stores={kind: FAISSDocumentStore.load(index_path=shard_index_path(kind)) for kind in KINDS},
+    embedder=embed,
+)
 
-inventory_df = pd.read_csv("/mnt/data/inventory_data.csv")
+# Shared across workers when SHM_TABLES is set, so /inventory/update is seen by all of them
+inventory = open_inventory(os.getenv("INVENTORY_PATH", "/mnt/data/inventory_data.csv"))
+# Totals and low-stock alerts, kept current by this worker's updates; resyncs only on foreign writes
+stock_ledger = StockLedger.from_frame(inventory.df)
+stock_ledger.source_version = inventory.version
+
+# Routes/ETAs come from the road graph, not the model; trees per depot are cached in the router
+# Only the columns routing needs are decoded (CLUSTERS_PATH may be .csv or a typed .parquet snapshot)
+clusters_df = load_clusters(os.getenv("CLUSTERS_PATH", os.getenv("CLUSTERS_CSV", "drone_data.csv")),
+                            columns=["Cluster_ID", "Latitude", "Longitude"])
+cluster_coords = dict(zip(clusters_df["Cluster_ID"], zip(clusters_df["Latitude"], clusters_df["Longitude"])))
+router = Router(load_graph(clusters_df))
+
+# CPU-bound retrieval/prompt rendering runs here, never on the event loop. The semaphore bounds
+# queued work too, so an overload surfaces as 503s instead of an ever-growing backlog.
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "4"))
+retrieval_pool = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="plan-retrieve")
+retrieval_slots = asyncio.Semaphore(RETRIEVAL_WORKERS * 4)
+# Validation, routing and dispatch run after the LLM answer is paid for: their own pool, and
+# requests wait for a slot (bounded by the stage deadline) instead of being turned away
+POSTPROCESS_WORKERS = int(os.getenv("PLAN_POSTPROCESS_WORKERS", "2"))
+postprocess_pool = ThreadPoolExecutor(max_workers=POSTPROCESS_WORKERS, thread_name_prefix="plan-post")
+postprocess_slots = asyncio.Semaphore(POSTPROCESS_WORKERS * 4)
+# Per-stage deadlines in seconds
+STAGE_DEADLINES = {
+    "embed": float(os.getenv("PLAN_EMBED_DEADLINE", "2")),
+    "retrieve": float(os.getenv("PLAN_RETRIEVE_DEADLINE", "5")),
+    "prompt": float(os.getenv("PLAN_PROMPT_DEADLINE", "2")),
+    "llm": float(os.getenv("PLAN_LLM_DEADLINE", "90")),
+    "validate": float(os.getenv("PLAN_VALIDATE_DEADLINE", "5")),
+    "route": float(os.getenv("PLAN_ROUTE_DEADLINE", "10")),
+    "dispatch": float(os.getenv("PLAN_DISPATCH_DEADLINE", "10")),
+}
+DISCONNECT_POLL_SECONDS = 0.1
 
 class Query(BaseModel):
     user_query: str
+    retrieval_mode: Literal["dense", "bm25", "hybrid"] = "dense"
+    top_k: int = Field(10, ge=1)
+    # e.g. {"protocol": 2, "report": 5, "situation": 5}; when set, top_k is ignored
+    quotas: Dict[str, int] | None = None
 
-@app.post("/plan")
-async def plan(q: Query):
-    r = pipe.run(data={"embed": {"text": q.user_query}})
-    docs = [
+class InventoryUpdate(BaseModel):
+    item: str
+    quantity: int = Field(ge=0)
+
+class Blockage(BaseModel):
+    lat: float
+    lon: float
+    radius_km: float = 0.5
+    blocked: bool = True  # False re-opens the edges
+
+async def _stage(name: str, aw):
+    try:
+        return await asyncio.wait_for(aw, STAGE_DEADLINES[name])
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"{name} stage exceeded {STAGE_DEADLINES[name]}s")
+
+async def _run_in(pool: ThreadPoolExecutor, slots: asyncio.Semaphore, fn, *args, **kwargs):
+    await slots.acquire()
+    loop = asyncio.get_running_loop()
+
+    def release(_):
+        try:
+            loop.call_soon_threadsafe(slots.release)
+        except RuntimeError:  # loop already closed at shutdown
+            pass
+
+    try:
+        fut = pool.submit(functools.partial(fn, *args, **kwargs))
+    except BaseException:
+        slots.release()
+        raise
+    # The slot is held until the thread is done, not until the awaiting task gives up: a stage
+    # deadline cancels the wait, but work already running keeps its slot until it finishes
+    fut.add_done_callback(release)
+    return await asyncio.wrap_future(fut)
+
+async def _offload(fn, *args, **kwargs):
+    if retrieval_slots.locked():
+        raise HTTPException(status_code=503, detail="Retrieval queue is full, retry shortly")
+    return await _run_in(retrieval_pool, retrieval_slots, fn, *args, **kwargs)
+
+async def _postprocess(fn, *args, **kwargs):
+    return await _run_in(postprocess_pool, postprocess_slots, fn, *args, **kwargs)
+
+def _retrieve(q: Query, q_emb):
+    if q.quotas is not None:
+        retrieved = fanout.run(q.user_query, mode=q.retrieval_mode, quotas=q.quotas, query_embedding=q_emb)
+    else:
+        retrieved = retriever.run(q.user_query, mode=q.retrieval_mode, top_k=q.top_k, query_embedding=q_emb)
+    return [
         {"id": d.meta.get("id"), "index": d.meta.get("index"), "created_at": d.meta.get("created_at"), "text": d.content}
-        for d in r["ret"]["documents"]
+        for d in retrieved
     ]
-    inv_table = inventory_df.to_dict(orient="records")
-    # TODO: call LLM with SYSTEM_PROMPT/USER_TEMPLATE, then run optimizer.
-    return orjson.dumps({
-        "retrieved": docs,
-        "inventory": inv_table,
-        "plan": {"status": "NOT_IMPLEMENTED", "message": "Connect LLM + optimizer"}
-    }).decode()
\ No newline at end of file
+
+async def _run_plan(q: Query):
+    q_emb = None
+    if q.retrieval_mode != "bm25":
+        with stage("plan", "embed"):
+            q_emb = (await _stage("embed", embed.aembed(q.user_query))).tolist()
+    with stage("plan", "retrieve"):
+        docs = await _stage("retrieve", _offload(_retrieve, q, q_emb))
+
+    if not llm_client.PLANNER_LLM_URL:
+        plan_json = orjson.dumps({"status": "NOT_IMPLEMENTED", "message": "Set PLANNER_LLM_URL to enable the LLM step"})
+    else:
+        with stage("plan", "prompt"):
+            prompt = await _stage("prompt", _offload(render_planner_prompt, inventory, docs, q.user_query, max_context=None))
+        try:
+            with stage("plan", "llm"):
+                raw = await _stage("llm", llm_client.agenerate(prompt["system"] + "\n" + prompt["user"]))
+        except httpx.HTTPStatusError as e:
+            code = e.response.status_code
+            LLM_ERRORS.labels(component="plan", reason=str(code)).inc()
+            # An overloaded LLM is worth retrying; anything else it answers is a bad gateway
+            if code in (429, 503):
+                raise HTTPException(status_code=503, detail=f"planner LLM is overloaded ({code})",
+                                    headers={"Retry-After": e.response.headers.get("Retry-After", "5")})
+            raise HTTPException(status_code=502, detail=f"planner LLM returned {code}")
+        except (httpx.ConnectError, httpx.TimeoutException) as e:
+            reason = "timeout" if isinstance(e, httpx.TimeoutException) else "connect"
+            LLM_ERRORS.labels(component="plan", reason=reason).inc()
+            raise HTTPException(status_code=503, detail=f"planner LLM unreachable ({reason})", headers={"Retry-After": "5"})
+        except httpx.HTTPError as e:
+            LLM_ERRORS.labels(component="plan", reason="other").inc()
+            raise HTTPException(status_code=502, detail=f"planner LLM call failed: {type(e).__name__}")
+        try:
+            with stage("plan", "validate"):
+                # Allocation totals are checked against current stock in the same validation pass
+                plan_obj = await _stage("validate", _postprocess(validate_plan_json, raw, inventory=inventory))
+        except ValueError as e:
+            PARSE_FAILURES.labels(component="plan").inc()
+            raise HTTPException(status_code=502, detail=str(e))
+        with stage("plan", "route"):
+            await _stage("route", _postprocess(fill_routes, plan_obj, cluster_coords, router))
+        # Teams from the plan's "team" constraints; eta_minutes becomes the scheduled arrival,
+        # which includes earlier stops and trips of the same team. Depot legs come from the same
+        # road-graph tree, and clusters fill_routes found unreachable get no team.
+        with stage("plan", "dispatch"):
+            await _stage("dispatch", _postprocess(assign_teams, plan_obj, cluster_coords, router=router))
+        plan_json = plan_obj.model_dump_json().encode()
+    # Splice the pre-serialized inventory bytes instead of re-encoding the table per request
+    with stage("plan", "serialize"):
+        inventory_version, inventory_bytes = inventory.json_snapshot()
+        body = b"".join((
+            b'{"retrieved":', orjson.dumps(docs),
+            b',"inventory_version":', str(inventory_version).encode(),
+            b',"inventory":', inventory_bytes,
+            b',"plan":', plan_json,
+            b"}",
+        ))
+    return Response(content=body, media_type="application/json")
+
+async def _cancel_on_disconnect(request: Request, aw):
+    """Runs aw, cancelling it (and whatever stage it is awaiting) if the client goes away."""
+    task = asyncio.ensure_future(aw)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                # 499: client closed request (nobody is listening for the body anyway)
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
+
+@app.post("/plan")
+async def plan(q: Query, request: Request):
+    return await _cancel_on_disconnect(request, _run_plan(q))
+
+@app.get("/inventory")
+async def get_inventory(request: Request):
+    version = inventory.version
+    headers = {"ETag": f'"i{version}"', "X-Inventory-Version": str(version)}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    version, body = inventory.json_snapshot()
+    headers = {"ETag": f'"i{version}"', "X-Inventory-Version": str(version)}
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.post("/inventory/update")
+async def update_inventory(u: InventoryUpdate):
+    try:
+        version = inventory.set_quantity(u.item, u.quantity)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    stock_ledger.applied(version, u.item, u.quantity)
+    return {"success": True, "version": version}
+
+@app.get("/inventory/status")
+async def inventory_status(request: Request):
+    """Totals, per-category usage and low-stock alerts; a poll is a version check plus cached bytes."""
+    ledger = stock_ledger.follow(inventory)
+    # The inventory version the ledger mirrors, not a second read that may already be newer
+    version = ledger.source_version
+    headers = {"ETag": f'"s{version}.{ledger.version}"', "X-Inventory-Version": str(version)}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=ledger.status_bytes(), media_type="application/json", headers=headers)
+
+@app.post("/routing/blockages")
+async def report_blockage(b: Blockage):
+    edges = router.graph.edges_near(b.lat, b.lon, b.radius_km)
+    change = router.block_edges if b.blocked else router.unblock_edges
+    recomputed = await _offload(change, edges)
+    return {"edges": len(edges), "recomputed_trees": len(recomputed), **router.stats()}
+
+@app.on_event("shutdown")
+async def shutdown():
+    await llm_client.aclose()
+    retrieval_pool.shutdown(wait=False, cancel_futures=True)
+    postprocess_pool.shutdown(wait=False, cancel_futures=True)
+
+@app.get("/metrics/embedding-cache")
+async def embedding_cache_metrics():
+    return {"cache": all_stats(), "batcher": batcher.stats()}
+
+def _embedding_cache_samples():
+    for model, stats in all_stats().items():
+        yield from stats_collector("embedding_cache", lambda: stats, {"model": model})()
+
+REGISTRY.register_collector(_embedding_cache_samples)
+REGISTRY.register_collector(stats_collector("embedding_batcher", batcher.stats, counters=("batches", "requests")))
+REGISTRY.register_collector(stats_collector("router", router.stats, counters=("tree_builds",)))
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(content=REGISTRY.render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
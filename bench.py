@@ -0,0 +1,253 @@
+# bench.py
+# Reproducible benchmark suite: recommendations, FAISS build/search, prompt rendering,
+# plan validation and allocation over seeded synthetic data from 10^2 to 10^6 rows.
+#
+#   python bench.py                                   # default scales, prints a table
+#   python bench.py --full                            # include 10^6 for every case
+#   python bench.py --cases recommendations,render_prompt --scales 100,10000
+#   python bench.py --output results.json             # write JSON results
+#   python bench.py --compare bench_baseline.json     # exit 1 if any case regressed > threshold
+#   python bench.py --save-baseline                   # overwrite bench_baseline.json
+#
+# The LLM is always stubbed (no network) and the embedder is a deterministic hash stub, so the
+# numbers measure this repo's code rather than model or API latency.
+import os
+import sys
+import json
+import time
+import hashlib
+import itertools
+import platform
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from unittest import mock
+import numpy as np
+
+from synthetic_data import synth_clusters, synth_inventory, synth_rag_inventory, synth_plan
+
+BASELINE_PATH = "bench_baseline.json"
+DEFAULT_SCALES = [100, 1_000, 10_000, 100_000]
+FULL_SCALES = DEFAULT_SCALES + [1_000_000]
+QUERIES = [
+    "There are 45 people suffering from injuries and dehydration.",
+    "Flood victims need shelter and food for 25 people.",
+    "Earthquake survivors need medical aid for 30 injured people.",
+]
+
+
+class StubEmbedder:
+    """Deterministic 384-d vectors from a text hash; same interface as SentenceTransformer.encode."""
+
+    dim = 384
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        single = isinstance(texts, str)
+        out = np.stack([self._vec(t) for t in ([texts] if single else texts)])
+        return out[0] if single else out
+
+    def _vec(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+        return np.random.default_rng(seed).standard_normal(self.dim).astype("float32")
+
+
+class StubResponse:
+    def __init__(self, prompt: str):
+        # Echo the prompt plus a JSON answer naming the first listed items, like the HF API does
+        names = [line[2:].split(" (")[0] for line in prompt.splitlines() if line.startswith("- ") and "(Available" in line]
+        self._body = [{"generated_text": prompt + json.dumps({n: 1 for n in names[:3]})}]
+
+    def json(self):
+        return self._body
+
+
+def stub_llm_post(url, headers=None, json=None, **kwargs):
+    return StubResponse(json["inputs"])
+
+
+def _make_rag(n: int, seed: int, tmp: str):
+    import raag2
+    from embed_cache import EmbeddingCache
+    rag = raag2.DisasterReliefRAG(
+        index_path=os.path.join(tmp, "inventory.index"),
+        inventory_path=os.path.join(tmp, "inventory.pkl"),
+        inventory=synth_rag_inventory(n, seed),
+        embedder=StubEmbedder(),
+    )
+    # Private cache so earlier cases/scales don't turn encodes into hits
+    rag.query_cache = EmbeddingCache("bench-stub", disk_path=None)
+    return rag
+
+
+# ---- Cases: each returns (setup-free callable to time, optional teardown) ----
+
+def case_recommendations(n: int, seed: int):
+    from allocation import compute_recommendations
+    df = synth_clusters(n, seed)
+    return lambda: compute_recommendations(df, 0, 100), None
+
+
+def case_faiss_build(n: int, seed: int):
+    tmp = tempfile.TemporaryDirectory()
+    rag = _make_rag(n, seed, tmp.name)
+    return rag._build_index, tmp.cleanup
+
+
+def case_recommend_aid(n: int, seed: int):
+    import raag2
+    tmp = tempfile.TemporaryDirectory()
+    rag = _make_rag(n, seed, tmp.name)
+    patcher = mock.patch.object(raag2.requests, "post", stub_llm_post)
+    patcher.start()
+    counter = itertools.count()
+
+    def fn():
+        # Distinct text every call so the encode stage is measured, not the query cache
+        i = next(counter)
+        return rag.recommend_aid(f"{QUERIES[i % len(QUERIES)]} #{i}")
+    return fn, lambda: (patcher.stop(), tmp.cleanup())
+
+
+def case_render_prompt(n: int, seed: int):
+    from planner_prompt import render_planner_prompt
+    inv = synth_inventory(n, seed)
+    docs = [{"meta": {"id": f"SIT-{c}", "index": "situation", "created_at": "2025-08-18T12:30:00Z"},
+             "text": f"Cluster {c}: people stranded"} for c in synth_clusters(10, seed)["Cluster_ID"]]
+    return lambda: render_planner_prompt(inv, docs, QUERIES[0]), None
+
+
+def case_validate_plan(n: int, seed: int):
+    from planner_prompt import validate_plan_json
+    raw = "Here is the plan:\n" + json.dumps(synth_plan(n, synth_inventory(50, seed), seed)) + "\nDone."
+    return lambda: validate_plan_json(raw), None
+
+
+def case_allocate(n: int, seed: int):
+    tmp = tempfile.TemporaryDirectory()
+    rag = _make_rag(n, seed, tmp.name)
+    # Spread requests over the table so lookups aren't all at the front
+    picks = [rag.inventory[int(i)]["item"] for i in np.linspace(0, n - 1, 5)]
+    return lambda: rag.allocate_aid({name: 1 for name in picks}), tmp.cleanup
+
+
+CASES: Dict[str, Tuple[Callable, List[int]]] = {
+    # name: (factory, default scales); --full extends every case to 10^6
+    "recommendations": (case_recommendations, FULL_SCALES),
+    "faiss_build": (case_faiss_build, DEFAULT_SCALES),
+    "recommend_aid": (case_recommend_aid, DEFAULT_SCALES),
+    "render_prompt": (case_render_prompt, FULL_SCALES),
+    "validate_plan": (case_validate_plan, DEFAULT_SCALES),
+    "allocate": (case_allocate, DEFAULT_SCALES),
+}
+
+
+def time_case(fn: Callable, repeats: int, budget_s: float) -> Dict[str, float]:
+    fn()  # warm-up (imports, caches, first-call allocation)
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < repeats:
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+        # Big scales: don't spend minutes on repeats once the budget is gone
+        if time.perf_counter() - started > budget_s:
+            break
+    return {
+        "median_s": statistics.median(samples),
+        "min_s": min(samples),
+        "mean_s": statistics.fmean(samples),
+        "repeats": len(samples),
+    }
+
+
+def run(cases: List[str], scales: Optional[List[int]], full: bool, repeats: int, budget_s: float, seed: int) -> Dict:
+    results: Dict[str, Dict[str, Dict]] = {}
+    for name in cases:
+        factory, default_scales = CASES[name]
+        results[name] = {}
+        for n in scales or (FULL_SCALES if full else default_scales):
+            try:
+                fn, teardown = factory(n, seed)
+            except ImportError as e:
+                results[name][str(n)] = {"skipped": f"missing dependency: {e}"}
+                print(f"{name:<16} {n:>9,}  skipped ({e})")
+                continue
+            try:
+                res = time_case(fn, repeats, budget_s)
+            finally:
+                if teardown:
+                    teardown()
+            results[name][str(n)] = res
+            print(f"{name:<16} {n:>9,}  median {res['median_s'] * 1000:>10.3f} ms  min {res['min_s'] * 1000:>10.3f} ms  (x{res['repeats']})")
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "seed": seed,
+            "repeats": repeats,
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float, stat: str = "min_s") -> List[str]:
+    """Cases slower than baseline by more than threshold (0.2 = 20%). Compares the fastest
+    run by default: it is far less sensitive to noisy neighbours than the median."""
+    regressions = []
+    print(f"\n{'case':<16} {'scale':>9}  {'baseline ms':>12} {'current ms':>12} {'ratio':>7}   ({stat})")
+    for name, scales in current["results"].items():
+        for n, res in scales.items():
+            base = baseline.get("results", {}).get(name, {}).get(n)
+            if not base or stat not in base or stat not in res:
+                continue
+            ratio = res[stat] / base[stat] if base[stat] else float("inf")
+            flag = "  REGRESSION" if ratio > 1 + threshold else ""
+            print(f"{name:<16} {int(n):>9,}  {base[stat] * 1000:>12.3f} {res[stat] * 1000:>12.3f} {ratio:>6.2f}x{flag}")
+            if flag:
+                regressions.append(f"{name}@{n}")
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--cases", default=",".join(CASES), help="comma-separated subset of: " + ", ".join(CASES))
+    ap.add_argument("--scales", help="comma-separated row counts, overrides per-case defaults")
+    ap.add_argument("--full", action="store_true", help="run every case up to 10^6 rows")
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--budget", type=float, default=10.0, help="seconds per case/scale before cutting repeats short")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--output", help="write results JSON here")
+    ap.add_argument("--compare", nargs="?", const=BASELINE_PATH, help="baseline JSON to compare against")
+    ap.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown vs baseline (0.2 = 20%%)")
+    ap.add_argument("--stat", default="min_s", choices=["min_s", "median_s", "mean_s"], help="statistic compared against the baseline")
+    ap.add_argument("--save-baseline", nargs="?", const=BASELINE_PATH, help="write results as the new baseline")
+    args = ap.parse_args(argv)
+
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        ap.error(f"unknown cases: {unknown}")
+    scales = [int(float(s)) for s in args.scales.split(",")] if args.scales else None
+
+    current = run(cases, scales, args.full, args.repeats, args.budget, args.seed)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"wrote {path}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold, args.stat)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+        print("\nno regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# bench_constrained_decoding.py
+# raag.py's local LLM step: free sampling (max_new_tokens=200) + _parse_llm_response vs
+# ConstrainedJSONDecoder. Reports tokens, forward passes, per-request CPU time and parse failures.
+# Usage: python bench_constrained_decoding.py [model] [requests]
+import sys
+import json
+import time
+import statistics
+from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+from constrained_json import ConstrainedJSONDecoder
+from planner_prompt import repair_json
+from raag import PROMPT_PREFIX
+from synthetic_data import synth_rag_inventory
+
+SCENARIOS = [
+    "There are 12 people suffering from injuries and severe dehydration in a remote area.",
+    "Flash flood victims need immediate shelter and food for 25 people including 8 children.",
+    "Emergency medical situation with 5 people requiring first aid and antibiotics.",
+]
+
+
+def build_prompt(query: str, items) -> str:
+    # Same layout as DisasterReliefRAG._create_prompt
+    context = "\n".join(f"- {i['item']} (Available: {i['quantity']}, Category: {i['category']})" for i in items)
+    return f"{PROMPT_PREFIX}SITUATION: {query}\n\nAVAILABLE INVENTORY:\n{context}\n\nRECOMMENDATION:"
+
+
+def parse_free(response: str, prompt: str):
+    # DisasterReliefRAG._parse_llm_response, minus logging
+    response = response.replace(prompt, "").strip()
+    start, end = response.find("{"), response.rfind("}") + 1
+    if start == -1:
+        return None
+    try:
+        return json.loads(repair_json(response[start:end] if end > start else response[start:]))
+    except ValueError:
+        return None
+
+
+def main(model_name: str = "meta-llama/Llama-3.2-1B", n: int = 12):
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype="auto", low_cpu_mem_usage=True).eval()
+    llm = pipeline("text-generation", model=model, tokenizer=tokenizer, device=-1, max_new_tokens=200,
+                   temperature=0.7, do_sample=True, top_p=0.95, pad_token_id=tokenizer.pad_token_id)
+    decoder = ConstrainedJSONDecoder(model, tokenizer)
+    inventory = synth_rag_inventory(40, seed=0)
+
+    free = {"cpu": [], "tokens": [], "failures": 0}
+    constrained = {"cpu": [], "tokens": [], "passes": [], "failures": 0}
+    for r in range(n):
+        items = inventory[(r * 5) % 35:(r * 5) % 35 + 5]  # top_k=5 retrieval
+        prompt = build_prompt(SCENARIOS[r % len(SCENARIOS)], items)
+
+        cpu0 = time.process_time()
+        out = llm(prompt)[0]["generated_text"]
+        parsed = parse_free(out, prompt)
+        free["cpu"].append(time.process_time() - cpu0)
+        free["tokens"].append(len(tokenizer(out)["input_ids"]) - len(tokenizer(prompt)["input_ids"]))
+        free["failures"] += parsed is None or not isinstance(parsed, dict)
+
+        result = decoder.generate(prompt, {i["item"]: i["quantity"] for i in items})
+        constrained["cpu"].append(result.cpu_seconds)
+        constrained["tokens"].append(result.generated_tokens)
+        constrained["passes"].append(result.forward_passes)
+        constrained["failures"] += not isinstance(json.loads(result.text), dict)
+
+    print(f"{n} requests, model {model_name}, 5 retrieved items each\n")
+    print(f"{'decoder':<12} {'gen tokens':>10} {'fwd passes':>10} {'cpu ms p50':>11} {'cpu ms mean':>12} {'parse fail':>10}")
+    print(f"{'free':<12} {statistics.mean(free['tokens']):>10.1f} {statistics.mean(free['tokens']) + 1:>10.1f} "
+          f"{statistics.median(free['cpu']) * 1000:>11.0f} {statistics.mean(free['cpu']) * 1000:>12.0f} {free['failures']:>10}")
+    print(f"{'constrained':<12} {statistics.mean(constrained['tokens']):>10.1f} {statistics.mean(constrained['passes']):>10.1f} "
+          f"{statistics.median(constrained['cpu']) * 1000:>11.0f} {statistics.mean(constrained['cpu']) * 1000:>12.0f} "
+          f"{constrained['failures']:>10}")
+    print(f"\nCPU time saved per request: {(statistics.mean(free['cpu']) - statistics.mean(constrained['cpu'])) * 1000:.0f} ms "
+          f"({statistics.mean(free['cpu']) / statistics.mean(constrained['cpu']):.1f}x)")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(*(args[:1] or ["meta-llama/Llama-3.2-1B"]), *[int(a) for a in args[1:2]])
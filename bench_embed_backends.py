@@ -0,0 +1,64 @@
+# bench_embed_backends.py
+# Embed throughput on ingest-shaped text: PyTorch vs ONNX fp32 vs ONNX int8, across batch sizes
+# and intra-op thread counts, with the parity check against the PyTorch vectors.
+# Usage: python bench_embed_backends.py [n_texts] [model]
+import sys
+import time
+import numpy as np
+from embed_backend import DEFAULT_MODEL, OnnxEmbedder, load_embedder, parity, _threads
+from synthetic_data import synth_clusters, synth_inventory
+
+BATCH_SIZES = (1, 32, 128)
+
+
+def ingest_texts(n: int):
+    # Same templates ingest.py builds its situation / inventory documents from
+    clusters = synth_clusters(n, seed=0)
+    inv = synth_inventory(max(1, n // 10), seed=0)
+    texts = [
+        f"Cluster {r.Cluster_ID}: {int(r.No_of_People)} people at ({r.Latitude:.5f}, {r.Longitude:.5f}); "
+        f"distance {r.Distance_from_Inventory_km:.2f} km from depot."
+        for r in clusters.itertuples()
+    ]
+    texts += [f"Inventory: {r.Resource} = {int(r.Quantity)} units at depot (18.5204, 73.8567)." for r in inv.itertuples()]
+    return texts[:n]
+
+
+def throughput(encode, texts, batch_size: int) -> float:
+    encode(texts[:batch_size], batch_size=batch_size)  # warm-up / first-call allocation
+    t0 = time.perf_counter()
+    encode(texts, batch_size=batch_size)
+    return len(texts) / (time.perf_counter() - t0)
+
+
+def thread_counts():
+    top = _threads()
+    return sorted({1, max(1, top // 2), top})
+
+
+def main(n: int = 2000, model: str = DEFAULT_MODEL):
+    import torch
+    texts = ingest_texts(n)
+    print(f"{len(texts)} ingest-style texts, model {model}\n")
+    print(f"{'backend':<10} {'threads':>7} " + " ".join(f"{'batch ' + str(b):>11}" for b in BATCH_SIZES) + "  (texts/s)")
+    base = {}
+    for threads in thread_counts():
+        torch.set_num_threads(threads)
+        st = load_embedder(model, "torch")
+        rates = [throughput(st.encode, texts, b) for b in BATCH_SIZES]
+        base[threads] = rates
+        print(f"{'torch':<10} {threads:>7} " + " ".join(f"{r:>11.1f}" for r in rates))
+    for backend in ("onnx", "onnx-int8"):
+        for threads in thread_counts():
+            emb = OnnxEmbedder(model, quantized=backend == "onnx-int8", threads=threads)
+            rates = [throughput(emb.encode, texts, b) for b in BATCH_SIZES]
+            print(f"{backend:<10} {threads:>7} " + " ".join(f"{r:>11.1f}" for r in rates)
+                  + f"  {np.mean([r / b for r, b in zip(rates, base[threads])]):.2f}x vs torch")
+    print()
+    for backend in ("onnx", "onnx-int8"):
+        print(f"parity {backend:<10} {parity(model, backend)}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 2000, *args[1:2])
@@ -0,0 +1,59 @@
+# bench_embed_batching.py
+# Load test: per-request encode vs BatchingEmbedder with 1-256 concurrent clients.
+# Usage: python bench_embed_batching.py [requests_per_client] [--synthetic]
+#   --synthetic replaces MiniLM with a fixed-overhead + per-text cost model (no model download)
+import sys
+import time
+import asyncio
+import threading
+import numpy as np
+from embed_batcher import BatchingEmbedder, sentence_transformer_encoder
+
+CONCURRENCY = (1, 4, 16, 64, 256)
+
+
+def synthetic_encoder(overhead_ms: float = 4.0, per_text_ms: float = 0.3):
+    lock = threading.Lock()  # one model, one forward pass at a time (like a single torch model on CPU)
+
+    def encode(texts):
+        with lock:
+            time.sleep((overhead_ms + per_text_ms * len(texts)) / 1000.0)
+        return np.zeros((len(texts), 384), dtype=np.float32)
+    return encode
+
+
+async def client(embed, n: int, cid: int, lat: list):
+    for i in range(n):
+        t0 = time.perf_counter()
+        await embed(f"client {cid} query {i}: need water and medical kits near C0{i % 100:02d}")
+        lat.append((time.perf_counter() - t0) * 1000)
+
+
+async def run_level(embed, clients: int, per_client: int):
+    lat: list = []
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client(embed, per_client, c, lat) for c in range(clients)))
+    wall = time.perf_counter() - t0
+    return len(lat) / wall, np.percentile(lat, 50), np.percentile(lat, 99)
+
+
+def main():
+    per_client = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 8
+    encode = synthetic_encoder() if "--synthetic" in sys.argv else sentence_transformer_encoder()
+    batcher = BatchingEmbedder(encode_batch=encode, max_batch=64, max_wait_ms=5)
+    batcher.warm_up()
+
+    async def unbatched(text):
+        # What api.py did before: one encode per request (here at least off the event loop)
+        return (await asyncio.to_thread(encode, [text]))[0]
+
+    print(f"{'clients':>7} | {'unbatched req/s':>15} {'p50':>7} {'p99':>7} | {'batched req/s':>13} {'p50':>7} {'p99':>7} {'speedup':>7}")
+    for clients in CONCURRENCY:
+        u = asyncio.run(run_level(unbatched, clients, per_client))
+        b = asyncio.run(run_level(batcher.aembed, clients, per_client))
+        print(f"{clients:>7} | {u[0]:>15.1f} {u[1]:>7.1f} {u[2]:>7.1f} | {b[0]:>13.1f} {b[1]:>7.1f} {b[2]:>7.1f} {b[0] / u[0]:>6.1f}x")
+    print(f"batcher: {batcher.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# bench_plan_latency.py
+# p50/p99 latency of /plan under concurrent load.
+#   python bench_plan_latency.py --url http://localhost:8000 [clients] [requests]   -> live server
+#   python bench_plan_latency.py --api [clients] [requests]                         -> api.py + mock_llm
+#   python bench_plan_latency.py [clients] [requests]                               -> model of the handler
+# --api measures the real api.app under uvicorn, with PLANNER_LLM_URL pointed at an in-process
+# mock_llm (LLM latency from MOCK_LLM_LATENCY, default fixed:150). It needs what api.py needs
+# at import (FAISS indexes, INVENTORY_PATH).
+# The default mode is a model, not a measurement: two toy apps with synthetic stage costs
+# (time.sleep). "blocking" runs every stage inline in the async handler, the shape api.py had
+# before; "offloaded" uses a bounded executor for CPU stages and awaits the LLM call.
+import os
+import sys
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+from mock_llm import MockConfig, create_app
+
+# Synthetic stage costs in seconds
+EMBED_S, RETRIEVE_S, SERIALIZE_S, LLM_S = 0.005, 0.015, 0.002, 0.150
+QUERY = {"user_query": "Create a 6-hour plan for clusters near Sinhagad Rd", "retrieval_mode": "dense"}
+
+
+def blocking_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/plan")
+    async def plan(q: dict):
+        time.sleep(EMBED_S)
+        time.sleep(RETRIEVE_S)
+        time.sleep(SERIALIZE_S)
+        time.sleep(LLM_S)  # requests.post(...) inside async def
+        return {"ok": True}
+    return app
+
+
+def offloaded_app(workers: int = 4) -> FastAPI:
+    app = FastAPI()
+    pool = ThreadPoolExecutor(max_workers=workers)
+
+    @app.post("/plan")
+    async def plan(q: dict):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(pool, time.sleep, EMBED_S)  # batcher thread
+        await loop.run_in_executor(pool, time.sleep, RETRIEVE_S + SERIALIZE_S)
+        await asyncio.sleep(LLM_S)  # awaited HTTP call
+        return {"ok": True}
+    return app
+
+
+def real_api(mock_port: int) -> FastAPI:
+    import api
+    import llm_client
+    serve(create_app(MockConfig(latency=os.getenv("MOCK_LLM_LATENCY", "fixed:150"))), mock_port)
+    llm_client.PLANNER_LLM_URL = f"http://127.0.0.1:{mock_port}/models/mock"
+    return api.app
+
+
+def serve(app: FastAPI, port: int) -> uvicorn.Server:
+    """Runs app in a background thread so the load generator has its own event loop."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+async def load(client: httpx.AsyncClient, clients: int, total: int):
+    lat, rejected = [], []
+    per_client = max(total // clients, 1)
+
+    async def one_client():
+        for _ in range(per_client):
+            t0 = time.perf_counter()
+            r = await client.post("/plan", json=QUERY)
+            if r.status_code in (503, 504):  # load shedding / stage deadlines are expected under overload
+                rejected.append(r.status_code)
+                continue
+            r.raise_for_status()
+            lat.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one_client() for _ in range(clients)))
+    if not lat:
+        return 0.0, float("nan"), float("nan"), len(rejected)
+    return len(lat) / (time.perf_counter() - t0), np.percentile(lat, 50), np.percentile(lat, 99), len(rejected)
+
+
+async def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--") and "://" not in a]
+    clients = int(args[0]) if args else 32
+    total = int(args[1]) if len(args) > 1 else 256
+    url = next((a for a in sys.argv[1:] if "://" in a), None)
+
+    if url:
+        targets = {"live": url}
+    elif "--api" in sys.argv:
+        targets = {"api.py": real_api(18799)}
+    else:
+        print("model of the handler (synthetic stage costs), not a measurement of api.py")
+        targets = {"blocking": blocking_app(), "offloaded": offloaded_app()}
+
+    print(f"{clients} clients, {total} requests")
+    print(f"{'server':<10} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'503/504':>8}")
+    for port, (name, target) in enumerate(targets.items(), start=18700):
+        server = None
+        if not isinstance(target, str):
+            server = serve(target, port)
+            target = f"http://127.0.0.1:{port}"
+        limits = httpx.Limits(max_connections=clients)
+        async with httpx.AsyncClient(base_url=target, timeout=300, limits=limits) as client:
+            rps, p50, p99, rejected = await load(client, clients, total)
+        print(f"{name:<10} {rps:>8.1f} {p50:>8.1f} {p99:>8.1f} {rejected:>8}")
+        if server is not None:
+            server.should_exit = True
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+# bench_plan_validation.py
+# Plan validation cost on large LLM outputs: the old json.loads + model_validate path vs
+# model_validate_json on the span, with the inventory cross-check, and with JSON repair.
+# Usage: python bench_plan_validation.py [n_allocations] [repeats]
+import sys
+import json
+import time
+import statistics
+from planner_prompt import Plan, validate_plan_json, stock_levels
+from synthetic_data import synth_plan, synth_inventory
+
+
+def legacy_validate(raw_text: str, inventory=None) -> Plan:
+    # Previous implementation: dicts first, then a second walk in model_validate, then totals
+    start, end = raw_text.find("{"), raw_text.rfind("}")
+    plan = Plan.model_validate(json.loads(raw_text[start:end + 1]))
+    if inventory is not None:
+        stock = stock_levels(inventory)
+        totals = {}
+        for alloc in plan.allocations:
+            for it in alloc.items:
+                totals[it.item] = totals.get(it.item, 0) + it.qty
+        if any(q > stock.get(i, 0) for i, q in totals.items()):
+            raise ValueError("allocations exceed inventory")
+    return plan
+
+
+def timed(fn, repeats: int) -> float:
+    fn()
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def main(n: int = 10_000, repeats: int = 7):
+    inv = synth_inventory(50, 0)
+    inv["Quantity"] = n * 10  # plenty of stock so every allocation is kept
+    body = json.dumps(synth_plan(n, inv, 0))
+    raw = "Here is the plan:\n```json\n" + body + "\n```"
+    # Typical model slips: a few trailing commas, so the fast path fails and repair runs
+    sloppy = raw.replace('}], "unmet_demand"', '},], "unmet_demand"', 1).replace('allocations."}', 'allocations.",}')
+    stock = stock_levels(inv)
+    print(f"{n:,} allocations, {len(raw) / 1e6:.2f} MB of JSON, median of {repeats}\n")
+    rows = [
+        ("json.loads + model_validate", lambda: legacy_validate(raw)),
+        ("model_validate_json", lambda: validate_plan_json(raw)),
+        ("legacy + stock check", lambda: legacy_validate(raw, stock)),
+        ("fast + stock check", lambda: validate_plan_json(raw, inventory=stock)),
+        ("fast + stock (DataFrame)", lambda: validate_plan_json(raw, inventory=inv)),
+        ("repair path (trailing commas)", lambda: validate_plan_json(sloppy, inventory=stock)),
+    ]
+    base = None
+    for name, fn in rows:
+        ms = timed(fn, repeats)
+        base = base or ms
+        print(f"{name:<32} {ms:>9.2f} ms  {base / ms:>5.2f}x")
+
+
+if __name__ == "__main__":
+    args = [int(float(a)) for a in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,100 @@
+# bench_prefix_cache.py
+# Time-to-first-token for the local LLM: full-prompt prefill (what raag.py did before) vs the
+# cached instruction prefix + suffix-only prefill, solo and with N requests pending at once.
+# Cases: raag.py's recommendation prompt and planner_prompt's SYSTEM_PROMPT + user block.
+# Usage: python bench_prefix_cache.py [model] [requests]
+import sys
+import time
+import statistics
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+from prefix_cache import PrefixKVCache
+from planner_prompt import SYSTEM_PROMPT, USER_TEMPLATE
+from raag import PROMPT_PREFIX
+from synthetic_data import synth_rag_inventory
+
+SCENARIOS = [
+    "There are 12 people suffering from injuries and severe dehydration in a remote area.",
+    "Flash flood victims need immediate shelter and food for 25 people including 8 children.",
+    "Emergency medical situation with 5 people requiring first aid and antibiotics.",
+]
+
+
+def raag_prompts(n: int):
+    # Same layout as DisasterReliefRAG._create_prompt
+    inventory = synth_rag_inventory(40, seed=0)
+    out = []
+    for r in range(n):
+        items = inventory[(r * 5) % 35:(r * 5) % 35 + 5]
+        context = "\n".join(f"- {i['item']} (Available: {i['quantity']}, Category: {i['category']})" for i in items)
+        out.append(f"{PROMPT_PREFIX}SITUATION: {SCENARIOS[r % len(SCENARIOS)]} #{r}\n\n"
+                   f"AVAILABLE INVENTORY:\n{context}\n\nRECOMMENDATION:")
+    return PROMPT_PREFIX, out
+
+
+def planner_prompts(n: int):
+    # render_planner_prompt's system + user messages, concatenated for a local model
+    inventory = synth_rag_inventory(12, seed=1)
+    csv = "Resource,Quantity\n" + "\n".join(f"{i['item']},{i['quantity']}" for i in inventory)
+    out = []
+    for r in range(n):
+        docs = "\n\n".join(f"[id=doc{r}-{k}] [index=situations] [created_at=2025-08-18T12:{k:02d}:00Z]\n"
+                           f"Cluster C{r * 3 + k:03d}: {10 + k * 7} people stranded, {k} injured." for k in range(3))
+        user = USER_TEMPLATE.format(user_query=SCENARIOS[r % len(SCENARIOS)], time_window="last 6 hours",
+                                    inventory_csv=csv, context_blocks=docs)
+        out.append(SYSTEM_PROMPT + user)
+    return SYSTEM_PROMPT, out
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def run_case(name, prefix, prompts, model, tokenizer):
+    cache = PrefixKVCache(model, tokenizer, max_batch=len(prompts))
+    prefix_s = timed(lambda: cache.add(prefix))
+    full_ids = [tokenizer(p)["input_ids"] for p in prompts]
+    rows = [cache.split(p)[1] for p in prompts]
+
+    def full(ids):
+        with torch.inference_mode():
+            model(input_ids=torch.tensor([ids], dtype=torch.long), use_cache=True)
+
+    full(full_ids[0]), cache.prefill(rows[:1], prefix)  # warm-up
+    uncached = [timed(lambda ids=ids: full(ids)) for ids in full_ids]
+    cached = [timed(lambda row=row: cache.prefill([row], prefix)) for row in rows]
+    batched = timed(lambda: cache.prefill(rows, prefix))
+    # N requests pending together: served one by one, request k waits for the k before it;
+    # batched, all of them get their first token when the single pass finishes
+    queue_uncached = statistics.mean(sum(uncached[:k + 1]) for k in range(len(uncached)))
+    queue_cached = statistics.mean(sum(cached[:k + 1]) for k in range(len(cached)))
+
+    print(f"\n{name}: prefix {len(cache._prefixes[prefix].ids)} tokens (computed once in {prefix_s * 1000:.0f} ms), "
+          f"suffix {statistics.mean(len(r) for r in rows):.0f} tokens avg")
+    print(f"  {'':<34} {'TTFT ms p50':>11} {'mean':>8} {'speedup':>8} {'all served':>11}")
+    print(f"  {'solo, full prompt':<34} {statistics.median(uncached) * 1000:>11.1f} {statistics.mean(uncached) * 1000:>8.1f}")
+    print(f"  {'solo, cached prefix':<34} {statistics.median(cached) * 1000:>11.1f} {statistics.mean(cached) * 1000:>8.1f}"
+          f" {statistics.mean(uncached) / statistics.mean(cached):>7.1f}x")
+    print(f"  {f'{len(prompts)} pending, full prompt one by one':<34} {'':>11} {queue_uncached * 1000:>8.1f} "
+          f"{'':>8} {sum(uncached) * 1000:>11.1f}")
+    print(f"  {f'{len(prompts)} pending, cached prefix one by one':<34} {'':>11} {queue_cached * 1000:>8.1f} "
+          f"{queue_uncached / queue_cached:>7.1f}x {sum(cached) * 1000:>11.1f}")
+    print(f"  {f'{len(prompts)} pending, cached prefix batched':<34} {'':>11} {batched * 1000:>8.1f} "
+          f"{queue_uncached / batched:>7.1f}x {batched * 1000:>11.1f}")
+
+
+def main(model_name: str = "meta-llama/Llama-3.2-1B", n: int = 8):
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype="auto", low_cpu_mem_usage=True).eval()
+    print(f"model {model_name}, {torch.get_num_threads()} threads, {n} requests per case")
+    run_case("raag.py recommendation prompt", *raag_prompts(n), model, tokenizer)
+    run_case("planner SYSTEM_PROMPT + user block", *planner_prompts(n), model, tokenizer)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(*(args[:1] or ["meta-llama/Llama-3.2-1B"]), *[int(a) for a in args[1:2]])
@@ -0,0 +1,77 @@
+# bench_retrieval.py
+# Latency / recall comparison of dense, bm25 and hybrid retrieval on the cluster documents.
+# Usage: python bench_retrieval.py [n_queries] [top_k]
+import sys
+import time
+import random
+import numpy as np
+import pandas as pd
+from haystack import Document
+from haystack.document_stores.in_memory import InMemoryDocumentStore
+from haystack.components.embedders import SentenceTransformersDocumentEmbedder, SentenceTransformersTextEmbedder
+from hybrid_retrieve import HybridRetriever, MODES
+
+MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def build_store(clusters: pd.DataFrame) -> InMemoryDocumentStore:
+    docs = [
+        Document(
+            content=f"Cluster {r['Cluster_ID']}: {int(r['No_of_People'])} people at "
+                    f"({float(r['Latitude']):.5f}, {float(r['Longitude']):.5f}); "
+                    f"distance {float(r['Distance_from_Inventory_km']):.2f} km from depot.",
+            meta={"index": "situation", "id": f"SIT-{r['Cluster_ID']}", "cluster_id": r['Cluster_ID']}
+        )
+        for _, r in clusters.iterrows()
+    ]
+    docs.append(Document(
+        content="20 people need water near Sinhagad Rd; approach by boat; road to depot blocked.",
+        meta={"index": "report", "id": "RP1022"}
+    ))
+    doc_embedder = SentenceTransformersDocumentEmbedder(model=MODEL)
+    doc_embedder.warm_up()
+    store = InMemoryDocumentStore()
+    store.write_documents(doc_embedder.run(docs)["documents"])
+    return store
+
+
+def make_queries(clusters: pd.DataFrame, n: int, seed: int = 0):
+    rng = random.Random(seed)
+    templates = [
+        "status of cluster {cid}",
+        "how many people are stranded at {cid}?",
+        "send water to {cid} urgently",
+    ]
+    ids = clusters["Cluster_ID"].tolist()
+    queries = [(rng.choice(templates).format(cid=cid), f"SIT-{cid}") for cid in rng.choices(ids, k=n)]
+    queries.append(("latest on report RP1022", "RP1022"))
+    return queries
+
+
+def run(n_queries: int = 200, top_k: int = 5):
+    clusters = pd.read_csv("drone_data.csv")
+    store = build_store(clusters)
+    retriever = HybridRetriever(document_store=store, embedder=SentenceTransformersTextEmbedder(model=MODEL), top_k=top_k)
+    queries = make_queries(clusters, n_queries)
+
+    print(f"{len(store.filter_documents())} docs, {len(queries)} queries, top_k={top_k}")
+    print(f"{'mode':<8} {'recall@k':>9} {'mrr':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode in MODES:
+        retriever.run(queries[0][0], mode=mode)  # warm-up
+        hits, rr, lat = 0, 0.0, []
+        for text, expected in queries:
+            t0 = time.perf_counter()
+            docs = retriever.run(text, mode=mode, top_k=top_k)
+            lat.append((time.perf_counter() - t0) * 1000)
+            ids = [d.meta.get("id") for d in docs]
+            if expected in ids:
+                hits += 1
+                rr += 1.0 / (ids.index(expected) + 1)
+        print(f"{mode:<8} {hits / len(queries):>9.3f} {rr / len(queries):>7.3f} "
+              f"{np.percentile(lat, 50):>8.2f} {np.percentile(lat, 99):>8.2f}")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    run(n, k)
@@ -0,0 +1,134 @@
+# cluster_store.py
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+# drone_data.csv schema
+CLUSTER_COLUMNS = ["Cluster_ID", "No_of_People", "Latitude", "Longitude", "Distance_from_Inventory_km"]
+
+
+class ClusterTable:
+    """Cluster table (drone_data.csv shape) with a version counter and a bounded change log.
+
+    Every upsert/remove bumps the version; changes_since() answers "what happened after
+    version v" for delta responses, or None once v has fallen out of the log.
+    """
+
+    def __init__(self, df: pd.DataFrame, history: int = 1024):
+        self._df = df[CLUSTER_COLUMNS].reset_index(drop=True)
+        self._lock = threading.Lock()
+        self._log: deque = deque(maxlen=history)  # (version, added, changed, removed)
+        self.version = 0
+
+    @classmethod
+    def from_csv(cls, path: str, **kwargs) -> "ClusterTable":
+        return cls(pd.read_csv(path), **kwargs)
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """Current frame; replaced (never mutated) on change, so readers can hold on to it."""
+        return self._df
+
+    def snapshot(self) -> Tuple[int, pd.DataFrame]:
+        with self._lock:
+            return self.version, self._df
+
+    def select(self, where: Optional[Callable[[Dict[str, np.ndarray]], np.ndarray]] = None,
+               ids: Optional[Iterable[str]] = None) -> Tuple[int, pd.DataFrame]:
+        """(version, rows) where where(columns) is True and/or Cluster_ID is in ids.
+
+        where gets the numeric columns as NumPy arrays and returns a boolean mask; requests
+        use this rather than snapshot() so a shared table only copies the rows they need.
+        """
+        version, df = self.snapshot()
+        mask = np.ones(len(df), dtype=bool)
+        if where is not None:
+            mask &= where({c: df[c].to_numpy() for c in CLUSTER_COLUMNS[1:]})
+        if ids is not None:
+            mask &= df["Cluster_ID"].isin(set(ids)).to_numpy()
+        return version, df if mask.all() else df[mask].reset_index(drop=True)
+
+    def upsert(self, rows: Iterable[Dict[str, Any]]) -> int:
+        new = pd.DataFrame(list(rows), columns=CLUSTER_COLUMNS)
+        if new.empty:
+            return self.version
+        new = new.drop_duplicates("Cluster_ID", keep="last")
+        with self._lock:
+            cur = self._df.set_index("Cluster_ID")
+            incoming = new.set_index("Cluster_ID")
+            existing = incoming.index.intersection(cur.index)
+            added = set(incoming.index.difference(cur.index))
+            # Only rows whose values actually moved count as changed
+            same = (cur.loc[existing] == incoming.loc[existing, cur.columns]).all(axis=1)
+            changed = set(same.index[~same])
+            if not added and not changed:
+                return self.version
+            cur = pd.concat([cur.drop(index=existing), incoming])
+            self._df = cur.reset_index()[CLUSTER_COLUMNS]
+            return self._commit(added, changed, set())
+
+    def remove(self, cluster_ids: Iterable[str]) -> int:
+        with self._lock:
+            removed = set(cluster_ids) & set(self._df["Cluster_ID"])
+            if not removed:
+                return self.version
+            self._df = self._df[~self._df["Cluster_ID"].isin(removed)].reset_index(drop=True)
+            return self._commit(set(), set(), removed)
+
+    def _commit(self, added, changed, removed) -> int:
+        # Callers hold self._lock
+        self.version += 1
+        self._log.append((self.version, added, changed, removed))
+        return self.version
+
+    def changes_since(self, since: int) -> Optional[Dict[str, set]]:
+        """Net added/changed/removed cluster ids after version `since`; None if the log no longer covers it."""
+        with self._lock:
+            if since > self.version or since < 0:
+                return None
+            if since < self.version and (not self._log or self._log[0][0] > since + 1):
+                return None
+            status: Dict[str, str] = {}
+            for version, added, changed, removed in self._log:
+                if version <= since:
+                    continue
+                for cid in added:
+                    status[cid] = "changed" if status.get(cid) == "removed" else "added"
+                for cid in changed:
+                    status[cid] = "added" if status.get(cid) == "added" else "changed"
+                for cid in removed:
+                    if status.get(cid) == "added":
+                        del status[cid]  # never seen by a client at `since`
+                    else:
+                        status[cid] = "removed"
+        out: Dict[str, set] = {"added": set(), "changed": set(), "removed": set()}
+        for cid, s in status.items():
+            out[s].add(cid)
+        return out
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """RFC 7232 weak comparison against an If-None-Match header value."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == bare:
+            return True
+    return False
+
+
+def diff_records(old: List[Dict[str, Any]], new: List[Dict[str, Any]], key: str = "Cluster_ID") -> Dict[str, list]:
+    """added / changed / removed between two record lists keyed by `key`."""
+    old_by = {r[key]: r for r in old}
+    new_by = {r[key]: r for r in new}
+    return {
+        "added": [r for k, r in new_by.items() if k not in old_by],
+        "changed": [r for k, r in new_by.items() if k in old_by and old_by[k] != r],
+        "removed": [k for k in old_by if k not in new_by],
+    }
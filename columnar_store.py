@@ -0,0 +1,302 @@
+# columnar_store.py
+# Typed Parquet storage for cluster snapshots (drone_data.csv schema) and inventory
+# (inventory_data.csv schema), read with row-group and column pushdown.
+#
+# save() casts to a fixed schema (int32 headcounts/quantities, float64 coordinates, string IDs)
+# and writes row groups of ROW_GROUP_ROWS with min/max statistics. Clusters are sorted by
+# distance from the depot first, so each row group covers a narrow distance band and a
+# "distance <= d" filter skips whole groups from the footer metadata alone. scan() only
+# decodes the requested + filtered columns of the row groups that can match, then applies the
+# exact predicate. load() takes .csv paths too (same dtypes, filter applied after the read), so
+# every loader can point at either format.
+#
+# Request paths (main.py, api.py) filter the in-memory ClusterTable, which also sees live
+# upserts; query_clusters() is for reading a snapshot file directly, e.g. the query command.
+#
+#   python columnar_store.py convert drone_data.csv drone_data.parquet
+#   python columnar_store.py query drone_data.parquet --min-people 50 --max-distance 20
+#   python columnar_store.py --bench 1000000
+import os
+import sys
+import operator
+import time
+import argparse
+import tempfile
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import pandas as pd
+
+from cluster_store import CLUSTER_COLUMNS
+
+ROW_GROUP_ROWS = int(os.getenv("COLUMNAR_ROW_GROUP_ROWS", "65536"))
+COMPRESSION = os.getenv("COLUMNAR_COMPRESSION", "zstd")
+
+# Arrow type aliases per column
+CLUSTER_TYPES = {
+    "Cluster_ID": "string",
+    "No_of_People": "int32",
+    "Latitude": "float64",
+    "Longitude": "float64",
+    "Distance_from_Inventory_km": "float64",
+}
+INVENTORY_TYPES = {
+    "Resource": "string",
+    "Quantity": "int32",
+    "Inventory_Latitude": "float64",
+    "Inventory_Longitude": "float64",
+    "Category": "string",  # StockLedger's per-category thresholds
+}
+KINDS = {
+    # kind: (column types, columns every snapshot must have, sort key that makes row-group
+    # statistics selective); the other typed columns are written when the frame has them
+    "clusters": (CLUSTER_TYPES, CLUSTER_COLUMNS, "Distance_from_Inventory_km"),
+    "inventory": (INVENTORY_TYPES, ["Resource", "Quantity"], None),
+}
+
+Predicate = Tuple[str, str, Any]  # (column, op, value), AND-ed; op in == != < <= > >=
+_COMPARE = {"==": operator.eq, "!=": operator.ne, "<": operator.lt, "<=": operator.le, ">": operator.gt,
+            ">=": operator.ge}
+_ARROW_COMPARE = {"==": "equal", "!=": "not_equal", "<": "less", "<=": "less_equal", ">": "greater",
+                  ">=": "greater_equal"}
+
+
+@dataclass
+class ScanStats:
+    row_groups: int = 0
+    row_groups_read: int = 0
+    rows_read: int = 0
+    rows_out: int = 0
+    columns_read: int = 0
+    seconds: float = 0.0
+
+
+def is_parquet(path: str) -> bool:
+    return path.endswith((".parquet", ".pq"))
+
+
+def _schema(types: Dict[str, str]):
+    import pyarrow as pa
+    return pa.schema([(col, pa.type_for_alias(t)) for col, t in types.items()])
+
+
+def _csv_dtypes(types: Dict[str, str]) -> Dict[str, str]:
+    return {col: "str" if t == "string" else t for col, t in types.items()}
+
+
+def save(df: pd.DataFrame, path: str, kind: str = "clusters", row_group_rows: int = ROW_GROUP_ROWS) -> str:
+    """Write a typed snapshot (Parquet by extension, CSV otherwise); replaces path atomically."""
+    types, required, sort_key = KINDS[kind]
+    missing = [c for c in required if c not in df.columns]
+    if missing:
+        raise KeyError(f"{kind} snapshot needs column(s) {missing}")
+    types = {col: t for col, t in types.items() if col in df.columns}
+    df = df[list(types)]
+    if sort_key is not None:
+        df = df.sort_values(sort_key, kind="stable")
+    tmp = f"{path}.tmp{os.getpid()}"
+    if is_parquet(path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pandas(df, schema=_schema(types), preserve_index=False)
+        pq.write_table(table, tmp, row_group_size=row_group_rows, compression=COMPRESSION,
+                       write_statistics=True)
+    else:
+        df.astype(_csv_dtypes(types)).to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return path
+
+
+def _may_match(op: str, value, lo, hi) -> bool:
+    """Can any row with min lo / max hi satisfy `col op value`?"""
+    if op == "==":
+        return lo <= value <= hi
+    if op == "!=":
+        return not (lo == hi == value)
+    if op == "<":
+        return lo < value
+    if op == "<=":
+        return lo <= value
+    if op == ">":
+        return hi > value
+    return hi >= value
+
+
+def _mask(frame, where: Sequence[Predicate]):
+    """Exact AND of the predicates over a pandas frame or an Arrow table."""
+    pandas = isinstance(frame, pd.DataFrame)
+    if not pandas:
+        import pyarrow.compute as pc
+    mask = None
+    for col, op, value in where:
+        if pandas:
+            m = _COMPARE[op](frame[col], value)
+        else:
+            m = getattr(pc, _ARROW_COMPARE[op])(frame[col], value)
+        if mask is None:
+            mask = m
+        else:
+            mask = mask & m if pandas else pc.and_(mask, m)
+    return mask
+
+
+def scan(path: str, columns: Optional[Sequence[str]] = None,
+         where: Sequence[Predicate] = ()) -> Tuple[pd.DataFrame, ScanStats]:
+    """Read a Parquet snapshot, skipping row groups whose statistics rule the predicates out and
+    decoding only `columns` (+ the filtered ones). Returns (frame, stats)."""
+    import pyarrow.parquet as pq
+    t0 = time.perf_counter()
+    for _, op, _ in where:
+        if op not in _COMPARE:
+            raise ValueError(f"unsupported operator {op!r}; use one of {', '.join(_COMPARE)}")
+    pf = pq.ParquetFile(path)
+    meta = pf.metadata
+    names = pf.schema_arrow.names
+    wanted = list(columns) if columns is not None else names
+    needed = wanted + [col for col, _, _ in where if col not in wanted]
+    missing = [c for c in needed if c not in names]
+    if missing:
+        raise KeyError(f"{path} has no column(s) {missing}")
+    index = {name: names.index(name) for name in needed}
+    keep = []
+    for rg in range(meta.num_row_groups):
+        group = meta.row_group(rg)
+        ok = True
+        for col, op, value in where:
+            stats = group.column(index[col]).statistics
+            if stats is not None and stats.has_min_max and not _may_match(op, value, stats.min, stats.max):
+                ok = False
+                break
+        if ok and group.num_rows:
+            keep.append(rg)
+    stats = ScanStats(row_groups=meta.num_row_groups, row_groups_read=len(keep), columns_read=len(needed))
+    table = pf.read_row_groups(keep, columns=needed) if keep else pf.schema_arrow.empty_table().select(needed)
+    stats.rows_read = table.num_rows
+    if where:
+        table = table.filter(_mask(table, where))
+    # Columns are handed to pandas one by one and freed on the Arrow side, so the load doesn't
+    # hold both copies of the table at once
+    df = table.select(wanted).to_pandas(split_blocks=True, self_destruct=True)
+    del table
+    stats.rows_out = len(df)
+    stats.seconds = time.perf_counter() - t0
+    return df, stats
+
+
+def load(path: str, kind: str = "clusters", columns: Optional[Sequence[str]] = None,
+         where: Sequence[Predicate] = ()) -> pd.DataFrame:
+    """Typed frame from a Parquet or CSV snapshot, with the same columns/predicates either way."""
+    if is_parquet(path):
+        return scan(path, columns, where)[0]
+    types = KINDS[kind][0]
+    wanted = list(columns) if columns is not None else None
+    usecols = None if wanted is None else wanted + [col for col, _, _ in where if col not in wanted]
+    df = pd.read_csv(path, usecols=usecols, dtype={c: t for c, t in _csv_dtypes(types).items()
+                                                   if usecols is None or c in usecols})
+    if where:
+        df = df[_mask(df, where)].reset_index(drop=True)
+    return df[wanted] if wanted is not None else df
+
+
+def load_clusters(path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    return load(path, "clusters", columns)
+
+
+def load_inventory(path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    return load(path, "inventory", columns)
+
+
+def query_clusters(path: str, min_people: int = 0, max_distance: float = float("inf"),
+                   columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """No_of_People >= min_people AND Distance_from_Inventory_km <= max_distance, pushed down."""
+    where: List[Predicate] = [("No_of_People", ">=", min_people)]
+    if max_distance != float("inf"):
+        where.append(("Distance_from_Inventory_km", "<=", max_distance))
+    return load(path, "clusters", columns, where)
+
+
+# ---- benchmark: CSV vs Parquet at N rows, each case in a fresh process for peak RSS (Linux) ----
+
+def _peak_rss_kib() -> int:
+    # VmHWM belongs to this address space; ru_maxrss would carry over the parent's peak
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+
+
+def _measure(case: str, path: str, min_people: int, max_distance: float):
+    import pyarrow  # noqa: F401  (import cost outside the measurement, same as pandas)
+    base = _peak_rss_kib()
+    t0 = time.perf_counter()
+    info = ""
+    if case == "csv full":
+        df = pd.read_csv(path)
+    elif case == "csv typed":
+        df = load(path)
+    elif case == "csv + filter":
+        # What main.py / simulator do today: read everything, filter in memory
+        df = pd.read_csv(path)
+        df = df[(df["No_of_People"] >= min_people) & (df["Distance_from_Inventory_km"] <= max_distance)]
+    elif case == "parquet full":
+        df = load(path)
+    else:
+        columns = ["Cluster_ID", "No_of_People", "Distance_from_Inventory_km"] if case.endswith("columns") else None
+        where = [("No_of_People", ">=", min_people), ("Distance_from_Inventory_km", "<=", max_distance)]
+        df, stats = scan(path, columns, where)
+        info = f"{stats.row_groups_read}/{stats.row_groups} row groups, {stats.columns_read} cols, {stats.rows_read:,} rows decoded"
+    elapsed = time.perf_counter() - t0
+    peak = _peak_rss_kib() - base
+    return elapsed, peak / 1024, df.memory_usage(deep=True).sum() / 2 ** 20, len(df), info
+
+
+def _bench(n: int, min_people: int = 50, max_distance: float = 20.0):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    from synthetic_data import synth_clusters
+    df = synth_clusters(n, seed=0)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path, pq_path = os.path.join(tmp, "clusters.csv"), os.path.join(tmp, "clusters.parquet")
+        df.to_csv(csv_path, index=False)
+        save(df, pq_path)
+        print(f"{n:,} cluster rows: CSV {os.path.getsize(csv_path) / 2 ** 20:.1f} MiB, "
+              f"Parquet {os.path.getsize(pq_path) / 2 ** 20:.1f} MiB ({COMPRESSION}, {ROW_GROUP_ROWS:,}-row groups)")
+        print(f"query: No_of_People >= {min_people} AND Distance_from_Inventory_km <= {max_distance}\n")
+        print(f"{'case':<26} {'seconds':>8} {'peak RSS MiB':>13} {'frame MiB':>10} {'rows':>10}")
+        cases = [("csv full", csv_path), ("csv typed", csv_path), ("csv + filter", csv_path),
+                 ("parquet full", pq_path), ("parquet pushdown", pq_path), ("parquet pushdown + columns", pq_path)]
+        ctx = multiprocessing.get_context("spawn")
+        for case, path in cases:
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                seconds, peak, frame, rows, info = pool.submit(_measure, case, path, min_people, max_distance).result()
+            print(f"{case:<26} {seconds:>8.3f} {peak:>13.1f} {frame:>10.1f} {rows:>10,}  {info}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Typed Parquet snapshots for clusters / inventory")
+    ap.add_argument("command", nargs="?", choices=("convert", "query"))
+    ap.add_argument("src", nargs="?")
+    ap.add_argument("dst", nargs="?")
+    ap.add_argument("--kind", choices=tuple(KINDS), default=None,
+                    help="schema to apply (default: inferred from the columns)")
+    ap.add_argument("--min-people", type=int, default=0)
+    ap.add_argument("--max-distance", type=float, default=float("inf"))
+    ap.add_argument("--columns", help="comma-separated columns to print (query)")
+    ap.add_argument("--bench", type=int, metavar="N", help="compare CSV and Parquet loads at N rows")
+    args = ap.parse_args(argv)
+    if args.bench:
+        _bench(args.bench)
+        return 0
+    if args.command == "query" and args.src:
+        columns = args.columns.split(",") if args.columns else None
+        query_clusters(args.src, args.min_people, args.max_distance, columns).to_csv(sys.stdout, index=False)
+        return 0
+    if args.command != "convert" or not (args.src and args.dst):
+        ap.error("usage: convert SRC DST [--kind clusters|inventory] | query SRC [--min-people N] "
+                 "[--max-distance KM] [--columns a,b] (or --bench N)")
+    df = pd.read_csv(args.src) if not is_parquet(args.src) else pd.read_parquet(args.src)
+    kind = args.kind or ("clusters" if set(CLUSTER_COLUMNS) <= set(df.columns) else "inventory")
+    save(df, args.dst, kind)
+    print(f"{len(df):,} {kind} rows -> {args.dst}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
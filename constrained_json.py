@@ -0,0 +1,180 @@
+# constrained_json.py
+# Grammar-constrained decoding of a recommendation object for a local causal LM.
+#
+# The answer grammar is fixed by the retrieved items:  {"<item 1>": <int>, ..., "<item k>": <int>}
+# with every key present once, in retrieval order, and each value an integer in [0, available].
+# Only the integers are decoded; the JSON scaffolding between them is forced, and each forced run is
+# fed to the model in a single forward pass on the KV cache. Digits that would break the bound or
+# add a leading zero are masked out, and decoding stops at the last value, so the output always
+# parses and no tokens are spent after the closing brace.
+#
+# With a PrefixKVCache the prompt's fixed instruction prefix is not re-run: the first pass covers
+# only the situation suffix + first scaffold, and generate_batch prefills several requests' first
+# passes together before decoding each one's values.
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+
+@dataclass
+class DecodeStats:
+    prompt_tokens: int = 0
+    cached_tokens: int = 0      # prompt tokens served from the prefix cache (not re-run)
+    forced_tokens: int = 0      # scaffolding fed in bulk: braces, quotes, keys, separators
+    generated_tokens: int = 0   # digit/stop decisions that needed a model step each
+    forward_passes: int = 0
+    cpu_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    first_token_seconds: float = 0.0  # wall time until the first value's logits were ready
+    text: str = ""
+    values: Dict[str, int] = field(default_factory=dict)
+
+
+class ConstrainedJSONDecoder:
+    """Decode {item: qty} for a fixed set of keys with bounded integer values.
+
+    Works with any transformers causal LM + tokenizer pair. The digit vocabulary (tokens that
+    decode to 1+ ASCII digits, with or without a leading space) is scanned once per tokenizer.
+    """
+
+    def __init__(self, model, tokenizer, temperature: float = 0.0, seed: Optional[int] = None,
+                 prefix_cache=None):
+        import torch
+        self.torch = torch
+        self.model = model
+        self.tokenizer = tokenizer
+        self.prefix_cache = prefix_cache  # optional prefix_cache.PrefixKVCache over the same model
+        self.temperature = temperature
+        self._gen = torch.Generator().manual_seed(seed) if seed is not None else None
+        self._digits: Dict[int, str] = {}
+        self._stops: List[int] = []  # tokens that would end a number: ',', '}', ' ,', ...
+        for tid in range(len(tokenizer)):
+            text = tokenizer.decode([tid])
+            core = text.lstrip(" ")
+            if core and core.isascii() and core.isdigit() and len(text) - len(core) <= 1:
+                self._digits[tid] = core
+            elif text.strip() in (",", "}", "},"):
+                self._stops.append(tid)
+        if not self._digits or not self._stops:
+            raise ValueError("tokenizer has no digit or ',' / '}' tokens; cannot decode the grammar")
+        self._stop_ids = torch.tensor(self._stops, dtype=torch.long)
+
+    # ---- model plumbing ----
+
+    def _feed(self, ids: List[int], past, stats: DecodeStats):
+        torch = self.torch
+        out = self.model(input_ids=torch.tensor([ids], dtype=torch.long), past_key_values=past, use_cache=True)
+        stats.forward_passes += 1
+        return out.logits[0, -1].float(), out.past_key_values
+
+    def _encode(self, text: str) -> List[int]:
+        return self.tokenizer(text, add_special_tokens=False)["input_ids"]
+
+    def _pick(self, logits, candidates: List[int]) -> int:
+        torch = self.torch
+        idx = torch.tensor(candidates, dtype=torch.long)
+        scores = logits[idx]
+        if self.temperature <= 0:
+            return candidates[int(scores.argmax())]
+        probs = torch.softmax(scores / self.temperature, dim=-1)
+        return candidates[int(torch.multinomial(probs, 1, generator=self._gen))]
+
+    # ---- grammar ----
+
+    def _allowed_digits(self, current: str, upper: int) -> List[int]:
+        if current == "0":
+            return []  # no leading zeros
+        out = []
+        for tid, digits in self._digits.items():
+            text = current + digits
+            if (len(text) > 1 and text[0] == "0") or int(text) > upper:
+                continue
+            out.append(tid)
+        return out
+
+    def _value(self, logits, past, upper: int, stats: DecodeStats) -> Tuple[int, object, List[int]]:
+        """Decode one bounded integer. Returns (value, past, pending): pending holds a final digit
+        not yet fed, which rides along with the next scaffold instead of costing its own pass."""
+        current = ""
+        while True:
+            digits = self._allowed_digits(current, upper)
+            if not digits:
+                return int(current or 0), past, []
+            if current:
+                # Stopping competes with continuing: best stop token vs each allowed digit
+                stop = int(self._stop_ids[logits[self._stop_ids].argmax()])
+                choice = self._pick(logits, digits + [stop])
+                stats.generated_tokens += 1
+                if choice == stop:
+                    return int(current), past, []
+            else:
+                choice = self._pick(logits, digits)
+                stats.generated_tokens += 1
+            current += self._digits[choice]
+            if not self._allowed_digits(current, upper):
+                # Bound reached: the number must end here, no need to ask the model
+                return int(current), past, [choice]
+            logits, past = self._feed([choice], past, stats)
+
+    def generate(self, prompt: str, fields: Dict[str, int]) -> DecodeStats:
+        """fields: key -> inclusive upper bound. Returns stats with .values and the JSON .text."""
+        return self.generate_batch([(prompt, fields)])[0]
+
+    def generate_batch(self, requests: List[Tuple[str, Dict[str, int]]]) -> List[DecodeStats]:
+        """Decode several (prompt, fields) requests. Their first passes (prompt suffix + first
+        scaffold) run batched through the prefix cache; values are then decoded per request.
+        CPU time of the shared pass is split evenly across the requests in it."""
+        results = [DecodeStats() for _ in requests]
+        wall0 = time.perf_counter()
+        cpu0 = time.process_time()
+        starts, groups = {}, {}
+        for n, (prompt, fields) in enumerate(requests):
+            if not fields:
+                results[n].text = "{}"
+                continue
+            prefix, pending = self._split(prompt)
+            results[n].prompt_tokens = len(pending) + self._cached(prefix)
+            results[n].cached_tokens = self._cached(prefix)
+            scaffold = self._encode("{" + json.dumps(next(iter(fields))) + ": ")
+            results[n].forced_tokens += len(scaffold)
+            groups.setdefault(prefix, []).append((n, pending + scaffold))
+        with self.torch.inference_mode():
+            for prefix, rows in groups.items():
+                if self.prefix_cache is not None:
+                    outs = self.prefix_cache.prefill([ids for _, ids in rows], prefix)
+                    for n, _ in rows:
+                        results[n].forward_passes += 1
+                else:
+                    outs = [self._feed(ids, None, results[n]) for n, ids in rows]
+                starts.update((n, out) for (n, _), out in zip(rows, outs))
+            first = time.perf_counter() - wall0
+            shared_cpu = (time.process_time() - cpu0) / max(1, len(starts))
+            for n, (logits, past) in starts.items():
+                stats = results[n]
+                cpu1, wall1 = time.process_time(), time.perf_counter()
+                stats.first_token_seconds = first
+                self._decode(requests[n][1], logits, past, stats)
+                stats.cpu_seconds = shared_cpu + time.process_time() - cpu1
+                stats.wall_seconds = first + time.perf_counter() - wall1
+        return results
+
+    def _split(self, prompt: str) -> Tuple[Optional[str], List[int]]:
+        if self.prefix_cache is not None:
+            return self.prefix_cache.split(prompt)
+        return None, self.tokenizer(prompt)["input_ids"]  # special tokens as the pipeline adds them
+
+    def _cached(self, prefix: Optional[str]) -> int:
+        return self.prefix_cache.prefix_tokens(prefix) if prefix is not None else 0
+
+    def _decode(self, fields: Dict[str, int], logits, past, stats: DecodeStats):
+        pending: List[int] = []
+        for i, (key, upper) in enumerate(fields.items()):
+            if i:
+                scaffold = self._encode(", " + json.dumps(key) + ": ")
+                stats.forced_tokens += len(scaffold)
+                # The previous value's last digit (if still pending) goes in with the scaffold
+                logits, past = self._feed(pending + scaffold, past, stats)
+            stats.values[key], past, pending = self._value(logits, past, max(0, int(upper)), stats)
+        # Closing brace is implied by the grammar; nothing is generated after the last value
+        stats.text = json.dumps(stats.values)
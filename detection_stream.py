@@ -0,0 +1,323 @@
+# detection_stream.py
+# Online clustering of raw drone person-detections into drone_data.csv-shaped cluster rows.
+#
+# Detections are hashed onto a grid of ~eps-sized cells. DBSCAN-style with eps = cell size: cells
+# holding at least min_cell people are core, touching core cells (8-neighbourhood) form one cluster,
+# and sparse cells next to a core join it as border; isolated stray hits stay noise. Each batch
+# is aggregated per cell in NumPy, so Python only touches the cells a batch hit. Hits on cells
+# already inside an emitted cluster only add to that cluster's running sums; flush() re-walks a
+# component only when its shape can have changed (new cell, core/sparse flip, expiry). Cluster IDs are stable: a grown cluster keeps its ID, a merge keeps the
+# larger side's ID (the other is removed), a split gives the new parts fresh IDs.
+#
+#   python detection_stream.py detections.csv --out /mnt/data/drone_data.csv
+#   python detection_stream.py --bench 2000000
+import sys
+import time
+import argparse
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from cluster_store import CLUSTER_COLUMNS
+from columnar_store import is_parquet, save
+from geo import DEPOT, haversine_km
+
+EPS_M = 150.0           # cell edge; detections closer than this usually share or touch a cell
+MIN_PEOPLE = 3          # smaller groups are treated as noise and not emitted
+MIN_CELL = 2            # people in a cell for it to be core
+M_PER_DEG_LAT = 111_320.0
+_STRIDE = 1 << 32       # cell key = row * _STRIDE + (col + _OFFSET)
+_OFFSET = 1 << 31
+_NEIGHBOURS = [di * _STRIDE + dj for di in (-1, 0, 1) for dj in (-1, 0, 1) if di or dj]
+
+# Cell record layout (plain lists are the cheapest mutable record in CPython)
+PEOPLE, DETECTIONS, SUM_LAT, SUM_LON, LAST_SEEN = range(5)
+
+
+class DetectionClusterer:
+    """Incremental grid-hash clusterer for lat/lon person detections.
+
+    headcount="sum" treats every detection as a distinct person (deduplicated detector output).
+    headcount="peak" treats each ingest() call as one frame/pass over the area and keeps the
+    largest per-frame count seen in each cell, so re-observing the same people doesn't inflate
+    the headcount. With ttl_s set, cells not re-observed for that long expire and their
+    clusters shrink, split or disappear on the next flush.
+    """
+
+    def __init__(self, eps_m: float = EPS_M, min_people: int = MIN_PEOPLE, min_cell: int = MIN_CELL, headcount: str = "sum",
+                 ttl_s: Optional[float] = None, ref_lat: float = DEPOT[0], depot: Tuple[float, float] = DEPOT,
+                 id_prefix: str = "D"):
+        if headcount not in ("sum", "peak"):
+            raise ValueError(f"headcount must be 'sum' or 'peak', got {headcount!r}")
+        self.dlat = eps_m / M_PER_DEG_LAT
+        self.dlon = eps_m / (M_PER_DEG_LAT * np.cos(np.radians(ref_lat)))
+        self.min_people = min_people
+        self.min_cell = min_cell
+        self.peak = headcount == "peak"
+        self.ttl_s = ttl_s
+        self.depot = depot
+        self.id_prefix = id_prefix
+        self._cells: Dict[int, list] = {}
+        self._cell_cid: Dict[int, str] = {}     # cell -> cluster it was last emitted under
+        self._rows: Dict[str, Dict[str, Any]] = {}  # last emitted row per cluster
+        self._aggs: Dict[str, list] = {}        # cluster -> [people, detections, sum_lat, sum_lon]
+        self._members: Dict[str, List[int]] = {}  # cluster -> its cells as of the last flush
+        self._dirty: set = set()                # cells whose component must be re-walked
+        self._changed: set = set()              # clusters whose sums moved without a shape change
+        self._next_id = 1
+        self.detections = 0
+
+    # ---- ingest ----
+
+    def ingest(self, lat, lon, t: Optional[float] = None) -> int:
+        """Add a batch (one frame in peak mode) of detections; returns the number of cells touched."""
+        lat = np.asarray(lat, dtype=np.float64).ravel()
+        lon = np.asarray(lon, dtype=np.float64).ravel()
+        if not len(lat):
+            return 0
+        t = time.time() if t is None else float(t)
+        keys = np.floor(lat / self.dlat).astype(np.int64) * _STRIDE + (np.floor(lon / self.dlon).astype(np.int64) + _OFFSET)
+        uniq, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        sum_lat = np.bincount(inverse, weights=lat, minlength=len(uniq))
+        sum_lon = np.bincount(inverse, weights=lon, minlength=len(uniq))
+        cells, cell_cid, aggs, peak, min_cell = self._cells, self._cell_cid, self._aggs, self.peak, self.min_cell
+        dirty, changed = self._dirty, self._changed
+        for key, n, slat, slon in zip(uniq.tolist(), counts.tolist(), sum_lat.tolist(), sum_lon.tolist()):
+            cell = cells.get(key)
+            if cell is None:
+                cells[key] = [n, n, slat, slon, t]
+                dirty.add(key)
+                continue
+            before = cell[PEOPLE]
+            after = cell[PEOPLE] = max(before, n) if peak else before + n
+            cell[DETECTIONS] += n
+            cell[SUM_LAT] += slat
+            cell[SUM_LON] += slon
+            cell[LAST_SEEN] = t
+            cid = cell_cid.get(key)
+            if cid is None or (before >= min_cell) != (after >= min_cell):
+                dirty.add(key)
+            else:
+                agg = aggs[cid]
+                agg[0] += after - before
+                agg[1] += n
+                agg[2] += slat
+                agg[3] += slon
+                changed.add(cid)
+        self.detections += len(lat)
+        return len(uniq)
+
+    def ingest_frame(self, df: pd.DataFrame, t: Optional[float] = None) -> int:
+        """Frame with lat/lon (or Latitude/Longitude) columns."""
+        lat_col = "lat" if "lat" in df.columns else "Latitude"
+        lon_col = "lon" if "lon" in df.columns else "Longitude"
+        return self.ingest(df[lat_col].to_numpy(), df[lon_col].to_numpy(), t)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Drop cells not seen within ttl_s; their neighbours are re-clustered on the next flush."""
+        if self.ttl_s is None:
+            return 0
+        cutoff = (time.time() if now is None else now) - self.ttl_s
+        stale = [key for key, cell in self._cells.items() if cell[LAST_SEEN] < cutoff]
+        for key in stale:
+            del self._cells[key]
+            self._dirty.add(key)
+            self._dirty.update(key + d for d in _NEIGHBOURS)
+        return len(stale)
+
+    # ---- clustering ----
+
+    def _component(self, start: int, seen: set) -> List[int]:
+        """Core cells reachable from a core start cell, plus the border cells they own."""
+        cells, min_cell = self._cells, self.min_cell
+        comp, queue = [start], deque([start])
+        seen.add(start)
+        while queue:
+            key = queue.popleft()
+            for d in _NEIGHBOURS:
+                nb = key + d
+                if nb in seen:
+                    continue
+                cell = cells.get(nb)
+                if cell is None:
+                    continue
+                if cell[PEOPLE] >= min_cell:
+                    queue.append(nb)
+                elif self._owner(nb) != key:
+                    continue
+                seen.add(nb)
+                comp.append(nb)
+        return comp
+
+    def _owner(self, key: int) -> int:
+        # A border cell touching several clusters joins the one holding its lowest-keyed core
+        # neighbour: fixed by the core layout alone, so the result doesn't depend on walk order
+        cells, min_cell = self._cells, self.min_cell
+        return min(nb for nb in (key + d for d in _NEIGHBOURS) if nb in cells and cells[nb][PEOPLE] >= min_cell)
+
+    def _core_starts(self, key: int) -> List[int]:
+        """A changed core cell starts its own walk; a changed sparse cell re-walks its core neighbours."""
+        cells, min_cell = self._cells, self.min_cell
+        cell = cells.get(key)
+        if cell is not None and cell[PEOPLE] >= min_cell:
+            return [key]
+        return [nb for nb in (key + d for d in _NEIGHBOURS) if nb in cells and cells[nb][PEOPLE] >= min_cell]
+
+    def _new_id(self) -> str:
+        cid = f"{self.id_prefix}{self._next_id:05d}"
+        self._next_id += 1
+        return cid
+
+    def flush(self, now: Optional[float] = None) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Re-cluster what changed since the last flush.
+
+        Returns (upserts in drone_data.csv schema, removed Cluster_IDs), ready for
+        ClusterTable.upsert/remove or main.py's POST /api/clusters body.
+        """
+        self.expire(now)
+        dirty, self._dirty = self._dirty, set()
+        cells, cell_cid, members = self._cells, self._cell_cid, self._members
+        seen: set = set()
+        summaries = []
+        # Every cluster that had a cell in play may have grown, merged, split or vanished, and
+        # is re-walked whole, so none of its cells keeps a stale ID
+        affected = {cell_cid[key] for key in dirty if key in cell_cid}
+        pending = list(affected)
+        starts = [start for key in dirty for start in self._core_starts(key)]
+        while starts or pending:
+            if not starts:
+                starts = [k for k in members.get(pending.pop(), ()) if k in cells and cells[k][PEOPLE] >= self.min_cell]
+                continue
+            start = starts.pop()
+            if start in seen:
+                continue
+            comp = self._component(start, seen)
+            votes: Dict[str, int] = {}
+            for k in comp:
+                cid = cell_cid.get(k)
+                if cid is not None:
+                    votes[cid] = votes.get(cid, 0) + cells[k][PEOPLE]
+                    if cid not in affected:
+                        affected.add(cid)
+                        pending.append(cid)
+            summaries.append((sum(cells[k][PEOPLE] for k in comp), comp, votes))
+        for cid in affected:
+            for k in members.pop(cid, ()):
+                if cell_cid.get(k) == cid:
+                    del cell_cid[k]
+
+        claimed = set()
+        # Largest components pick first, so a merge keeps the bigger side's ID
+        summaries.sort(key=lambda s: -s[0])
+        for people, comp, votes in summaries:
+            if people < self.min_people:
+                continue
+            cid = next((c for c, _ in sorted(votes.items(), key=lambda kv: (-kv[1], kv[0])) if c not in claimed), None)
+            cid = cid or self._new_id()
+            claimed.add(cid)
+            for k in comp:
+                cell_cid[k] = cid
+            members[cid] = comp
+            self._aggs[cid] = [people, sum(cells[k][DETECTIONS] for k in comp),
+                               sum(cells[k][SUM_LAT] for k in comp), sum(cells[k][SUM_LON] for k in comp)]
+        removals = sorted(affected - claimed)
+        for cid in removals:
+            self._rows.pop(cid, None)
+            self._aggs.pop(cid, None)
+
+        upserts = []
+        for cid in claimed | (self._changed - affected):
+            people, n_det, slat, slon = self._aggs[cid]
+            row = {"Cluster_ID": cid, "No_of_People": int(people),
+                   "Latitude": round(slat / n_det, 6), "Longitude": round(slon / n_det, 6)}
+            prev = self._rows.get(cid)
+            if prev is None or any(prev[c] != row[c] for c in ("No_of_People", "Latitude", "Longitude")):
+                upserts.append(row)
+        self._changed = set()
+        if upserts:
+            dist = haversine_km(self.depot[0], self.depot[1],
+                                np.array([r["Latitude"] for r in upserts]), np.array([r["Longitude"] for r in upserts]))
+            for row, d in zip(upserts, dist.tolist()):
+                row["Distance_from_Inventory_km"] = round(d, 2)
+                self._rows[row["Cluster_ID"]] = row
+        upserts.sort(key=lambda r: r["Cluster_ID"])
+        return upserts, removals
+
+    # ---- views ----
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Current clusters as of the last flush."""
+        return list(self._rows.values())
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.rows(), columns=CLUSTER_COLUMNS)
+
+    def stats(self) -> Dict[str, int]:
+        return {"detections": self.detections, "cells": len(self._cells), "clusters": len(self._rows),
+                "pending_cells": len(self._dirty), "pending_clusters": len(self._changed)}
+
+
+def apply(table, upserts: Iterable[Dict[str, Any]], removals: Iterable[str]) -> int:
+    """Push one flush into a ClusterTable (or SharedClusterTable); returns its version."""
+    version = table.upsert(upserts)
+    removals = list(removals)
+    if removals:
+        version = table.remove(removals)
+    return version
+
+
+def _bench(n: int, batch: int, flush_every: int):
+    from synthetic_data import synth_detections
+    lat, lon = synth_detections(n, seed=0)
+    dc = DetectionClusterer()
+    t0 = time.perf_counter()
+    for b, i in enumerate(range(0, n, batch)):
+        dc.ingest(lat[i:i + batch], lon[i:i + batch], t=float(b))
+        if (b + 1) % flush_every == 0:
+            dc.flush(now=float(b))
+    dc.flush()
+    elapsed = time.perf_counter() - t0
+    print(f"{n:,} detections in {elapsed:.2f}s = {n / elapsed:,.0f}/s "
+          f"(batch {batch}, flush every {flush_every} batches) -> {dc.stats()}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Cluster raw detections into drone_data.csv rows")
+    ap.add_argument("detections", nargs="?", help="CSV with lat/lon (or Latitude/Longitude) columns; optional t/frame column")
+    ap.add_argument("--out", default="detected_clusters.csv",
+                    help="drone_data.csv-schema output (what ingest.py and main.py load); .parquet writes a typed snapshot")
+    ap.add_argument("--eps-m", type=float, default=EPS_M)
+    ap.add_argument("--min-people", type=int, default=MIN_PEOPLE)
+    ap.add_argument("--min-cell", type=int, default=MIN_CELL)
+    ap.add_argument("--headcount", choices=("sum", "peak"), default="sum")
+    ap.add_argument("--bench", type=int, metavar="N", help="time N synthetic detections instead")
+    ap.add_argument("--batch", type=int, default=5000)
+    args = ap.parse_args(argv)
+
+    if args.bench:
+        _bench(args.bench, args.batch, flush_every=10)
+        return 0
+    if not args.detections:
+        ap.error("detections CSV required (or --bench N)")
+    df = pd.read_csv(args.detections)
+    dc = DetectionClusterer(eps_m=args.eps_m, min_people=args.min_people, min_cell=args.min_cell,
+                           headcount=args.headcount)
+    group = "frame" if "frame" in df.columns else ("t" if "t" in df.columns else None)
+    if group:
+        for key, part in df.groupby(group, sort=True):
+            dc.ingest_frame(part, t=float(key) if group == "t" else None)
+    else:
+        for i in range(0, len(df), args.batch):
+            dc.ingest_frame(df.iloc[i:i + args.batch])
+    dc.flush()
+    if is_parquet(args.out):
+        save(dc.frame(), args.out, "clusters")
+    else:
+        dc.frame().to_csv(args.out, index=False)
+    print(f"{dc.detections:,} detections -> {len(dc.rows())} clusters in {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
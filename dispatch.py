@@ -0,0 +1,405 @@
+# dispatch.py
+# Packs plan allocations onto boat/truck teams: multi-stop trips that respect each team's
+# max_load per trip and max_minutes per shift (capacitated VRP heuristic), then local search.
+#
+# Trips are built once for the whole fleet (sweep around the depot, capacity of the smallest
+# vehicle so any team can run any trip), improved with 2-opt inside trips and relocate moves
+# between neighbouring trips, then handed to teams in priority order. New clusters are
+# inserted incrementally with Dispatcher.insert() instead of re-solving.
+#
+# Legs are straight-line km (DETOUR_FACTOR and team speed applied per team). When depot_km is
+# given -- road-graph depot legs from routing.depot_etas, as straight-line-equivalent km -- the
+# legs to and from the depot use it instead, so trips and ETAs agree with fill_routes.
+import os
+import math
+import heapq
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+from geo import DEPOT, EARTH_RADIUS_KM
+from routing import DETOUR_FACTOR, DEFAULT_SPEED_KMH, Router, _nearest, depot_etas
+
+SERVICE_MINUTES = float(os.getenv("DISPATCH_SERVICE_MINUTES", "10"))
+DEFAULT_TEAMS = int(os.getenv("DISPATCH_TEAMS", "10"))
+DEFAULT_MAX_LOAD = int(os.getenv("DISPATCH_MAX_LOAD", "500"))
+DEFAULT_MAX_MINUTES = 360
+NEIGHBOURS = 8
+LOCAL_SEARCH_PASSES = 3
+
+
+@dataclass
+class Team:
+    name: str
+    max_load: int = DEFAULT_MAX_LOAD
+    max_minutes: float = DEFAULT_MAX_MINUTES
+    speed_kmh: float = DEFAULT_SPEED_KMH["road"]
+
+
+@dataclass
+class Stop:
+    cluster_id: str
+    lat: float
+    lon: float
+    demand: int
+    priority: float = 0.0
+
+
+@dataclass
+class Trip:
+    stops: List[int] = field(default_factory=list)  # indices into Dispatcher.stops
+    load: int = 0
+    km: float = 0.0
+    team: Optional[str] = None
+    start_minutes: float = 0.0
+
+
+def teams_from_constraints(constraints, n_default: int = DEFAULT_TEAMS) -> List[Team]:
+    """Teams from Plan constraints ({"type": "team", "team", "max_load", "max_minutes"});
+    a {"type": "time"} constraint sets the shift length. Falls back to n_default teams."""
+    shift = next((c.max_minutes for c in constraints if c.type == "time" and c.max_minutes), DEFAULT_MAX_MINUTES)
+    teams = [
+        Team(c.team, c.max_load or DEFAULT_MAX_LOAD, c.max_minutes or shift,
+             DEFAULT_SPEED_KMH["water"] if "boat" in c.team.lower() else DEFAULT_SPEED_KMH["road"])
+        for c in constraints if c.type == "team" and c.team
+    ]
+    return teams or [Team(f"Team-{i + 1}", max_minutes=shift) for i in range(n_default)]
+
+
+class Dispatcher:
+    """Trips for a set of stops and their assignment to teams."""
+
+    def __init__(self, teams: Sequence[Team], depot: Tuple[float, float] = DEPOT,
+                 depot_km: Optional[Dict[str, float]] = None):
+        if not teams:
+            raise ValueError("Dispatcher needs at least one team")
+        self.teams = {t.name: t for t in teams}
+        self.depot = depot
+        self.depot_km = depot_km or {}
+        # Any trip must fit any team: smallest vehicle, and every (speed, shift) pair in the fleet
+        self.capacity = min(t.max_load for t in teams)
+        self._shifts = list({(t.speed_kmh, t.max_minutes): t for t in teams}.values())
+        self.stops: List[Stop] = []
+        self.trips: List[Trip] = []
+        self.unassigned: List[int] = []
+        self._where: Dict[int, int] = {}  # stop -> trip index
+        self._booked: Dict[str, float] = {name: 0.0 for name in self.teams}  # shift minutes per team
+        self._rad: List[Tuple[float, float, float]] = []  # (lat, lon, cos lat) in radians
+        self._home: List[Optional[float]] = []  # depot leg per stop from depot_km, None -> straight line
+        lat = math.radians(depot[0])
+        self._depot_rad = (lat, math.radians(depot[1]), math.cos(lat))
+
+    # ---- distances (straight-line km; DETOUR_FACTOR and speed applied per team) ----
+
+    def _add_stop(self, stop: Stop) -> int:
+        lat, lon = math.radians(stop.lat), math.radians(stop.lon)
+        self.stops.append(stop)
+        self._rad.append((lat, lon, math.cos(lat)))
+        self._home.append(self.depot_km.get(stop.cluster_id))
+        return len(self.stops) - 1
+
+    def _km(self, a: int, b: int) -> float:
+        # a or b == -1 is the depot
+        if a < 0 <= b and self._home[b] is not None:
+            return self._home[b]
+        if b < 0 <= a and self._home[a] is not None:
+            return self._home[a]
+        la, oa, ca = self._rad[a] if a >= 0 else self._depot_rad
+        lb, ob, cb = self._rad[b] if b >= 0 else self._depot_rad
+        h = math.sin((lb - la) / 2) ** 2 + ca * cb * math.sin((ob - oa) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+    def _trip_km(self, stops: List[int]) -> float:
+        if not stops:
+            return 0.0
+        path = [-1] + stops + [-1]
+        return sum(self._km(a, b) for a, b in zip(path, path[1:]))
+
+    def _minutes(self, km: float, n_stops: int, team: Team) -> float:
+        return km * DETOUR_FACTOR / team.speed_kmh * 60 + n_stops * SERVICE_MINUTES
+
+    def _fits(self, load: int, km: float, n_stops: int) -> bool:
+        # Driving plus SERVICE_MINUTES per stop must fit every team's shift
+        return load <= self.capacity and all(self._minutes(km, n_stops, t) <= t.max_minutes for t in self._shifts)
+
+    # ---- full solve ----
+
+    def solve(self, stops: Sequence[Stop]) -> "Dispatcher":
+        self.stops, self._rad, self._home, self.trips, self.unassigned, self._where = [], [], [], [], [], {}
+        self._booked = {name: 0.0 for name in self.teams}
+        for s in stops:
+            # Demand beyond one vehicle is split into several visits to the same cluster
+            remaining = max(0, int(s.demand))
+            while True:
+                part = min(remaining, self.capacity)
+                self._add_stop(Stop(s.cluster_id, s.lat, s.lon, part, s.priority))
+                remaining -= part
+                if remaining <= 0:
+                    break
+        self._sweep()
+        self._local_search()
+        self._assign_teams()
+        return self
+
+    def _sweep(self):
+        """Stops in polar-angle order around the depot, cut into trips at capacity/range."""
+        if not self.stops:
+            return
+        lat = np.array([s.lat for s in self.stops])
+        lon = np.array([s.lon for s in self.stops])
+        angle = np.arctan2(lat - self.depot[0], (lon - self.depot[1]) * math.cos(math.radians(self.depot[0])))
+        trip = Trip()
+        for i in np.argsort(angle, kind="stable").tolist():
+            demand = self.stops[i].demand
+            last = trip.stops[-1] if trip.stops else -1
+            km = trip.km - self._km(last, -1) + self._km(last, i) + self._km(i, -1)
+            if trip.stops and not self._fits(trip.load + demand, km, len(trip.stops) + 1):
+                self._close(trip)
+                trip = Trip()
+                km = self._km(-1, i) + self._km(i, -1)
+            if not self._fits(demand, km, 1):
+                self.unassigned.append(i)  # out of range even as a single-stop trip
+                continue
+            trip.stops.append(i)
+            trip.load += demand
+            trip.km = km
+        if trip.stops:
+            self._close(trip)
+
+    def _close(self, trip: Trip):
+        self.trips.append(trip)
+        for s in trip.stops:
+            self._where[s] = len(self.trips) - 1
+
+    def _two_opt(self, trip: Trip) -> bool:
+        improved, stops = False, trip.stops
+        n = len(stops)
+        if n < 3:
+            return False
+        path = [-1] + stops + [-1]
+        for i in range(1, n):
+            for j in range(i + 1, n + 1):
+                a, b, c, d = path[i - 1], path[i], path[j], path[j + 1]
+                delta = self._km(a, c) + self._km(b, d) - self._km(a, b) - self._km(c, d)
+                if delta < -1e-9:
+                    path[i:j + 1] = path[i:j + 1][::-1]
+                    improved = True
+        if improved:
+            trip.stops = path[1:-1]
+            trip.km = self._trip_km(trip.stops)
+        return improved
+
+    def _relocate(self, s: int, candidates: Sequence[int]) -> bool:
+        """Move stop s next to one of its spatial neighbours in another trip if that is shorter overall."""
+        src = self.trips[self._where[s]]
+        pos = src.stops.index(s)
+        prev = src.stops[pos - 1] if pos > 0 else -1
+        nxt = src.stops[pos + 1] if pos + 1 < len(src.stops) else -1
+        saving = self._km(prev, s) + self._km(s, nxt) - self._km(prev, nxt)
+        best = None
+        for n in candidates:
+            t = self._where.get(n)
+            if t is None or t == self._where[s]:
+                continue
+            dst = self.trips[t]
+            load = dst.load + self.stops[s].demand
+            if load > self.capacity:
+                continue
+            k = dst.stops.index(n)
+            for at in (k, k + 1):
+                a = dst.stops[at - 1] if at > 0 else -1
+                b = dst.stops[at] if at < len(dst.stops) else -1
+                cost = self._km(a, s) + self._km(s, b) - self._km(a, b)
+                if cost < saving - 1e-9 and self._fits(load, dst.km + cost, len(dst.stops) + 1) \
+                        and (best is None or cost < best[0]):
+                    best = (cost, t, at)
+        if best is None:
+            return False
+        cost, t, at = best
+        dst = self.trips[t]
+        src.stops.pop(pos)
+        src.load -= self.stops[s].demand
+        src.km -= saving
+        dst.stops.insert(at, s)
+        dst.load += self.stops[s].demand
+        dst.km += cost
+        self._where[s] = t
+        return True
+
+    def _local_search(self, passes: int = LOCAL_SEARCH_PASSES):
+        if len(self.stops) < 2:
+            return
+        lat = np.array([s.lat for s in self.stops])
+        lon = np.array([s.lon for s in self.stops])
+        nbrs = _nearest(lat, lon, lat, lon, min(NEIGHBOURS, len(self.stops) - 1), exclude_self=True).tolist()
+        for _ in range(passes):
+            moved = False
+            for trip in self.trips:
+                moved |= self._two_opt(trip)
+            for s in range(len(self.stops)):
+                if s in self._where:
+                    moved |= self._relocate(s, nbrs[s])
+            if not moved:
+                break
+        # Drop trips emptied by relocations
+        self.trips = [t for t in self.trips if t.stops]
+        self._where = {s: i for i, t in enumerate(self.trips) for s in t.stops}
+
+    def _assign_teams(self):
+        """Most urgent trips first, each to the team that can start it earliest within its shift."""
+        order = sorted(range(len(self.trips)), key=lambda i: -max(self.stops[s].priority for s in self.trips[i].stops))
+        free = [(0.0, name) for name in self.teams]  # (minutes already booked, team)
+        heapq.heapify(free)
+        longest_shift = max(t.max_minutes for t in self.teams.values())
+        for i in order:
+            trip = self.trips[i]
+            trip.team = None
+            fastest = min(self._minutes(trip.km, len(trip.stops), t) for t in self.teams.values())
+            skipped = []
+            # Teams come off the heap least-booked first: once even the fastest can't finish in
+            # the longest shift, no later team can either
+            while free and free[0][0] + fastest <= longest_shift:
+                booked, name = heapq.heappop(free)
+                team = self.teams[name]
+                end = booked + self._minutes(trip.km, len(trip.stops), team)
+                if end <= team.max_minutes:
+                    trip.team, trip.start_minutes = name, booked
+                    heapq.heappush(free, (end, name))
+                    break
+                skipped.append((booked, name))
+            for item in skipped:
+                heapq.heappush(free, item)
+            if trip.team is None:
+                self.unassigned.extend(trip.stops)
+        self._booked = {name: 0.0 for name in self.teams}
+        for booked, name in free:
+            self._booked[name] = booked
+
+    # ---- incremental ----
+
+    def insert(self, stop: Stop) -> Optional[str]:
+        """Cheapest feasible insertion next to the nearest existing stops; opens a new trip on the
+        least-booked team otherwise. Returns the team, or None if nothing can take it."""
+        s = self._add_stop(stop)
+        placed = [i for i in self._where]
+        if placed:
+            lat = np.array([self.stops[i].lat for i in placed])
+            lon = np.array([self.stops[i].lon for i in placed])
+            near = _nearest(lat, lon, np.array([stop.lat]), np.array([stop.lon]), min(NEIGHBOURS, len(placed)))[0]
+            best = None
+            for n in (placed[j] for j in near.tolist()):
+                t = self._where[n]
+                trip = self.trips[t]
+                if trip.team is None or trip.load + stop.demand > self.capacity:
+                    continue
+                team = self.teams[trip.team]
+                k = trip.stops.index(n)
+                for at in (k, k + 1):
+                    a = trip.stops[at - 1] if at > 0 else -1
+                    b = trip.stops[at] if at < len(trip.stops) else -1
+                    cost = self._km(a, s) + self._km(s, b) - self._km(a, b)
+                    extra = self._minutes(cost, 1, team)
+                    if self._fits(trip.load + stop.demand, trip.km + cost, len(trip.stops) + 1) \
+                            and self._booked[trip.team] + extra <= team.max_minutes and (best is None or cost < best[0]):
+                        best = (cost, t, at)
+            if best is not None:
+                cost, t, at = best
+                trip = self.trips[t]
+                trip.stops.insert(at, s)
+                trip.load += stop.demand
+                trip.km += cost
+                self._where[s] = t
+                self._two_opt(trip)
+                self._reschedule(trip.team)
+                return trip.team
+        # New single-stop trip on whichever team has the most shift left
+        km = self._km(-1, s) + self._km(s, -1)
+        if not self._fits(stop.demand, km, 1):
+            self.unassigned.append(s)
+            return None
+        for name in sorted(self.teams, key=self._booked.get):
+            team = self.teams[name]
+            booked = self._booked[name]
+            if booked + self._minutes(km, 1, team) <= team.max_minutes:
+                self.trips.append(Trip([s], stop.demand, km, name, booked))
+                self._booked[name] = booked + self._minutes(km, 1, team)
+                self._where[s] = len(self.trips) - 1
+                return name
+        self.unassigned.append(s)
+        return None
+
+    def _reschedule(self, name: str):
+        # Later trips of the team start later once an earlier one got longer
+        clock, team = 0.0, self.teams[name]
+        for trip in sorted((t for t in self.trips if t.team == name), key=lambda t: t.start_minutes):
+            trip.start_minutes = clock
+            clock += self._minutes(trip.km, len(trip.stops), team)
+        self._booked[name] = clock
+
+    # ---- results ----
+
+    def arrivals(self) -> Dict[str, Tuple[str, float]]:
+        """cluster_id -> (team, minutes from shift start to first arrival)."""
+        out: Dict[str, Tuple[str, float]] = {}
+        for trip in self.trips:
+            if trip.team is None:
+                continue
+            team = self.teams[trip.team]
+            clock, prev = trip.start_minutes, -1
+            for s in trip.stops:
+                clock += self._minutes(self._km(prev, s), 0, team)
+                cid = self.stops[s].cluster_id
+                if cid not in out or clock < out[cid][1]:
+                    out[cid] = (trip.team, clock)
+                clock += SERVICE_MINUTES
+                prev = s
+        return out
+
+    def stats(self) -> Dict[str, float]:
+        used = [t for t in self.trips if t.team]
+        return {
+            "stops": len(self.stops),
+            "trips": len(used),
+            "teams_used": len({t.team for t in used}),
+            "unassigned_stops": len(set(self.unassigned)),
+            "total_km": round(sum(t.km for t in used) * DETOUR_FACTOR, 1),
+            "mean_load": round(sum(t.load for t in used) / len(used), 1) if used else 0.0,
+        }
+
+
+def assign_teams(plan, cluster_coords: Dict[str, Tuple[float, float]], teams: Optional[Sequence[Team]] = None,
+                 depot: Tuple[float, float] = DEPOT, router: Optional[Router] = None) -> Dispatcher:
+    """Sets assigned_team and eta_minutes (scheduled first arrival) on a validated Plan.
+
+    With a router, depot legs are the road-graph minutes fill_routes used, and clusters it
+    found unreachable (route None) are left without a team.
+    """
+    teams = list(teams) if teams else teams_from_constraints(plan.constraints)
+    allocs = [a for a in plan.allocations if a.cluster_id in cluster_coords]
+    depot_km = None
+    if router is not None and allocs:
+        _, _, minutes = depot_etas(router, [cluster_coords[a.cluster_id] for a in allocs], depot)
+        # Road minutes as straight-line-equivalent km, so _minutes() turns them back into minutes
+        # at road speed and scales them for faster or slower teams
+        to_km = DEFAULT_SPEED_KMH["road"] / 60 / DETOUR_FACTOR
+        depot_km = {a.cluster_id: m * to_km for a, m in zip(allocs, minutes.tolist()) if math.isfinite(m)}
+        for a in allocs:
+            if a.cluster_id not in depot_km:
+                a.assigned_team = None
+        allocs = [a for a in allocs if a.cluster_id in depot_km]
+    stops = [
+        Stop(a.cluster_id, *cluster_coords[a.cluster_id], sum(it.qty for it in a.items), a.priority)
+        for a in allocs
+    ]
+    dispatcher = Dispatcher(teams, depot, depot_km).solve(stops)
+    arrivals = dispatcher.arrivals()
+    for alloc in allocs:
+        hit = arrivals.get(alloc.cluster_id)
+        if hit:
+            alloc.assigned_team, alloc.eta_minutes = hit[0], int(round(hit[1]))
+        else:
+            alloc.assigned_team = None
+    unassigned = sorted({dispatcher.stops[s].cluster_id for s in dispatcher.unassigned})
+    if unassigned:
+        plan.assumptions.append(f"No team capacity left this shift for {len(unassigned)} clusters: {', '.join(unassigned[:20])}")
+    return dispatcher
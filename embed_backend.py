@@ -0,0 +1,274 @@
+# embed_backend.py
+# Selectable CPU backend for the MiniLM embedder: PyTorch (SentenceTransformer) or an exported
+# ONNX graph run by onnxruntime, optionally with dynamic int8 weight quantization.
+#
+#   EMBED_BACKEND=torch | onnx | onnx-int8     (default torch)
+#   ONNX_DIR=models/onnx                       export location (one sub-directory per model)
+#   ONNX_THREADS=<n>                           intra-op threads (default: CPUs this process may use)
+#
+#   python embed_backend.py export [model]     writes model.onnx and model.int8.onnx
+#   python embed_backend.py parity [model]     cosine vs the PyTorch vectors on sample texts
+import os
+import sys
+import json
+import inspect
+import logging
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+BACKENDS = ("torch", "onnx", "onnx-int8")
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+ONNX_DIR = os.getenv("ONNX_DIR", "models/onnx")
+MAX_SEQ_LENGTH = 256  # all-MiniLM-L6-v2's sentence-transformers max_seq_length
+# Below this the int8 graph is not a drop-in for the fp32 one
+PARITY_MIN_COSINE = 0.99
+
+
+def _threads() -> int:
+    env = os.getenv("ONNX_THREADS")
+    if env:
+        return int(env)
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _full_name(model: str) -> str:
+    return model if "/" in model else f"sentence-transformers/{model}"
+
+
+def onnx_paths(model: str = DEFAULT_MODEL, onnx_dir: str = ONNX_DIR) -> Dict[str, str]:
+    base = os.path.join(onnx_dir, _full_name(model).split("/")[-1])
+    return {"dir": base, "onnx": os.path.join(base, "model.onnx"), "onnx-int8": os.path.join(base, "model.int8.onnx")}
+
+
+def cache_model_name(model: str, backend: Optional[str] = None) -> str:
+    """EmbeddingCache key: quantized vectors differ slightly, so they don't share entries with fp32."""
+    backend = backend or EMBED_BACKEND
+    return model if backend == "torch" else f"{model}@{backend}"
+
+
+# ---- Export ----
+
+def export_onnx(model: str = DEFAULT_MODEL, onnx_dir: str = ONNX_DIR, quantize: bool = True, opset: int = 14) -> Dict[str, str]:
+    """Export the transformer to ONNX (dynamic batch/sequence axes), fuse attention for onnxruntime,
+    and write a dynamically int8-quantized copy. Pooling and normalization stay in NumPy."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    paths = onnx_paths(model, onnx_dir)
+    os.makedirs(paths["dir"], exist_ok=True)
+    name = _full_name(model)
+    tokenizer = AutoTokenizer.from_pretrained(name)
+    # Eager attention exports the MatMul/Softmax pattern onnxruntime's fusion recognizes (SDPA doesn't)
+    hf = AutoModel.from_pretrained(name, attn_implementation="eager").eval()
+    tokenizer.save_pretrained(paths["dir"])
+
+    class Encoder(torch.nn.Module):
+        # Keyword call: positional order of forward() differs across transformers versions
+        def __init__(self, m):
+            super().__init__()
+            self.m = m
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.m(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids).last_hidden_state
+
+    sample = tokenizer(["export sample", "a somewhat longer export sample sentence"], padding=True, return_tensors="pt")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    axes = {n: {0: "batch", 1: "sequence"} for n in names}
+    axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    # TorchScript exporter: dynamic_axes as-is, no onnxscript dependency (newer torch defaults to dynamo)
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(Encoder(hf), tuple(sample[n] for n in names), paths["onnx"], input_names=names,
+                          output_names=["last_hidden_state"], dynamic_axes=axes, opset_version=opset, **legacy)
+
+    try:
+        # Attention/LayerNorm/GELU fusion; MiniLM-L6 is BERT-shaped (12 heads, hidden 384)
+        from onnxruntime.transformers import optimizer
+        fused = optimizer.optimize_model(paths["onnx"], model_type="bert", num_heads=hf.config.num_attention_heads,
+                                         hidden_size=hf.config.hidden_size)
+        fused.save_model_to_file(paths["onnx"])
+    except Exception as e:  # the plain graph still works, just slower
+        logger.warning(f"ONNX graph fusion skipped: {e}")
+
+    if quantize:
+        from onnx import TensorProto
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        # Weights to int8 ahead of time, activations quantized per batch at run time. Shape
+        # inference can't type the fused com.microsoft ops' outputs, hence DefaultTensorType.
+        quantize_dynamic(paths["onnx"], paths["onnx-int8"], weight_type=QuantType.QInt8, per_channel=True,
+                         extra_options={"DefaultTensorType": TensorProto.FLOAT})
+    with open(os.path.join(paths["dir"], "export.json"), "w") as f:
+        json.dump({"model": name, "opset": opset, "quantized": quantize}, f)
+    return paths
+
+
+# ---- Inference ----
+
+class OnnxEmbedder:
+    """SentenceTransformer-compatible encode() over an exported MiniLM graph.
+
+    Also answers run(text=...) like SentenceTransformersTextEmbedder and run(documents=...) like
+    SentenceTransformersDocumentEmbedder, so it drops into raag*.py, the batcher and haystack code.
+    """
+
+    def __init__(self, model: str = DEFAULT_MODEL, quantized: bool = True, onnx_dir: str = ONNX_DIR,
+                 threads: Optional[int] = None, batch_size: int = 32, max_seq_length: int = MAX_SEQ_LENGTH):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        paths = onnx_paths(model, onnx_dir)
+        path = paths["onnx-int8" if quantized else "onnx"]
+        if not os.path.exists(path):
+            logger.info(f"No ONNX export at {path}; exporting {model}")
+            export_onnx(model, onnx_dir, quantize=quantized)
+        self.backend = "onnx-int8" if quantized else "onnx"
+        self.model = cache_model_name(model, self.backend)
+        self.batch_size = batch_size
+        self.max_seq_length = max_seq_length
+        self.tokenizer = AutoTokenizer.from_pretrained(paths["dir"])
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # One request at a time through the graph; parallelism goes into the matmuls
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.intra_op_num_threads = threads or _threads()
+        opts.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+    def warm_up(self):
+        self.encode(["warm up"])
+
+    def _forward(self, texts: List[str]) -> np.ndarray:
+        enc = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np")
+        feed = {k: v.astype(np.int64) for k, v in enc.items() if k in self._inputs}
+        hidden = self.session.run(None, feed)[0]
+        # sentence-transformers Pooling(mean) + Normalize
+        mask = enc["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(self, sentences: Union[str, Sequence[str]], batch_size: Optional[int] = None,
+               convert_to_numpy: bool = True, **_: Any) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, 384), dtype=np.float32)
+        batch_size = batch_size or self.batch_size
+        # Length-sorted batches pad less; results go back in the caller's order
+        order = np.argsort([len(t) for t in texts], kind="stable")
+        parts = [self._forward([texts[j] for j in order[i:i + batch_size]]) for i in range(0, len(texts), batch_size)]
+        out = np.empty((len(texts), parts[0].shape[1]), dtype=np.float32)
+        out[order] = np.concatenate(parts)
+        return out[0] if single else out
+
+    def run(self, text: Optional[str] = None, documents: Optional[list] = None) -> Dict[str, Any]:
+        if documents is not None:
+            vecs = self.encode([d.content or "" for d in documents])
+            for doc, vec in zip(documents, vecs):
+                doc.embedding = vec.tolist()
+            return {"documents": documents}
+        return {"embedding": self.encode(text).tolist()}
+
+
+# ---- Backend selection ----
+
+def load_embedder(model: str = DEFAULT_MODEL, backend: Optional[str] = None):
+    """Object with SentenceTransformer.encode semantics for the chosen backend."""
+    backend = backend or EMBED_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"EMBED_BACKEND must be one of {BACKENDS}, got {backend!r}")
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model)
+    return OnnxEmbedder(model, quantized=backend == "onnx-int8")
+
+
+def batch_encoder(model: str = DEFAULT_MODEL, backend: Optional[str] = None) -> Callable[[List[str]], np.ndarray]:
+    """texts -> (n, dim) array, for BatchingEmbedder."""
+    emb = load_embedder(model, backend)
+    return lambda texts: emb.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+
+
+def text_embedder(model: str = DEFAULT_MODEL, backend: Optional[str] = None):
+    """SentenceTransformersTextEmbedder, or the ONNX embedder with the same run(text=...) contract."""
+    backend = backend or EMBED_BACKEND
+    if backend == "torch":
+        from haystack.components.embedders import SentenceTransformersTextEmbedder
+        return SentenceTransformersTextEmbedder(model=model)
+    return load_embedder(model, backend)
+
+
+def document_embedder(model: str = DEFAULT_MODEL, backend: Optional[str] = None):
+    """SentenceTransformersDocumentEmbedder, or the ONNX embedder with the same run(documents=...)
+    contract. Call warm_up() before run()."""
+    backend = backend or EMBED_BACKEND
+    if backend == "torch":
+        from haystack.components.embedders import SentenceTransformersDocumentEmbedder
+        return SentenceTransformersDocumentEmbedder(model=model)
+    return load_embedder(model, backend)
+
+
+# ---- Parity ----
+
+PARITY_TEXTS = [
+    "There are 12 people suffering from injuries and severe dehydration in a remote area.",
+    "Flash flood victims need immediate shelter and food for 25 people including 8 children.",
+    "Emergency medical situation with 5 people requiring first aid and antibiotics.",
+    "Medical Kit medical emergency relief supply",
+    "Water Bottles water emergency relief supply",
+    "Cluster C017: 83 people at (18.65350, 73.37731); distance 52.65 km from depot.",
+    "Inventory: Rescue Boats = 12 units at depot (18.5204, 73.8567).",
+    "Follow triage: stabilize airway, stop bleeding, prioritize elderly/children; floods: beware electric lines.",
+    "20 people need water near Sinhagad Rd; approach by boat; road to depot blocked.",
+    "blankets",
+]
+
+
+def parity(model: str = DEFAULT_MODEL, backend: str = "onnx-int8", texts: Optional[List[str]] = None) -> Dict[str, float]:
+    """Cosine similarity of backend vectors against the PyTorch vectors, plus whether nearest
+    neighbours (each text against all others) come out the same."""
+    texts = texts or PARITY_TEXTS
+    ref = np.asarray(load_embedder(model, "torch").encode(texts, convert_to_numpy=True), dtype=np.float32)
+    got = np.asarray(load_embedder(model, backend).encode(texts), dtype=np.float32)
+    ref /= np.linalg.norm(ref, axis=1, keepdims=True)
+    got /= np.linalg.norm(got, axis=1, keepdims=True)
+    cos = (ref * got).sum(axis=1)
+    sim_ref, sim_got = ref @ ref.T, got @ got.T
+    np.fill_diagonal(sim_ref, -1)
+    np.fill_diagonal(sim_got, -1)
+    return {
+        "texts": len(texts),
+        "min_cosine": float(cos.min()),
+        "mean_cosine": float(cos.mean()),
+        "nn_agreement": float((sim_ref.argmax(axis=1) == sim_got.argmax(axis=1)).mean()),
+        "ok": bool(cos.min() >= PARITY_MIN_COSINE),
+    }
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    cmd = argv[0] if argv else "parity"
+    model = argv[1] if len(argv) > 1 else DEFAULT_MODEL
+    if cmd == "export":
+        print(json.dumps(export_onnx(model), indent=2))
+        return 0
+    if cmd == "parity":
+        ok = True
+        for backend in ("onnx", "onnx-int8"):
+            result = parity(model, backend)
+            ok &= result["ok"]
+            print(f"{backend:<10} " + " ".join(f"{k}={v:.4f}" if isinstance(v, float) else f"{k}={v}" for k, v in result.items()))
+        return 0 if ok else 1
+    print(f"unknown command {cmd!r}; use export or parity")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+# embed_batcher.py
+import asyncio
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Sequence
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def sentence_transformer_encoder(model: str = DEFAULT_MODEL) -> Callable[[List[str]], np.ndarray]:
+    from sentence_transformers import SentenceTransformer
+    st = SentenceTransformer(model)
+    return lambda texts: st.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+
+
+class BatchingEmbedder:
+    """Collects concurrent embed requests for up to max_wait_ms and encodes them in one call.
+
+    All encoding happens on a single dedicated thread, so callers (including the asyncio
+    event loop via aembed) never run the model themselves; they just wait on a Future.
+    """
+
+    def __init__(self, encode_batch: Optional[Callable[[List[str]], Sequence]] = None, model: str = DEFAULT_MODEL,
+                 max_batch: int = 64, max_wait_ms: float = 5.0):
+        self.model = model
+        self._encode_batch = encode_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+
+    def warm_up(self):
+        with self._start_lock:
+            if self._encode_batch is None:
+                # EMBED_BACKEND picks PyTorch or the ONNX/int8 graph
+                from embed_backend import batch_encoder
+                self._encode_batch = batch_encoder(self.model)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="embed-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        if self._thread is None:
+            self.warm_up()
+        fut: Future = Future()
+        self._queue.put((text, fut))
+        return fut
+
+    def run(self, text: str) -> Dict[str, List[float]]:
+        """Blocking, SentenceTransformersTextEmbedder-compatible entry point."""
+        return {"embedding": np.asarray(self.submit(text).result()).tolist()}
+
+    async def aembed(self, text: str) -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        # Window opens when the first request arrives
+        end = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = end - time.monotonic()
+            try:
+                # Past the window, still take whatever is already queued
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            batch = [(t, f) for t, f in batch if f.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            # Identical texts in one window are encoded once
+            unique = list(dict.fromkeys(t for t, _ in batch))
+            try:
+                vectors = self._encode_batch(unique)
+            except Exception as e:
+                logger.error(f"Batch embedding failed: {e}")
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            by_text = {t: np.asarray(v, dtype=np.float32) for t, v in zip(unique, vectors)}
+            for text, fut in batch:
+                fut.set_result(by_text[text])
+            self.batches += 1
+            self.requests += len(batch)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
@@ -0,0 +1,141 @@
+# embed_cache.py
+import os
+import re
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+# Set EMBED_CACHE_PATH to a sqlite file to keep embeddings across restarts
+DEFAULT_DISK_PATH = os.getenv("EMBED_CACHE_PATH")
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """all-MiniLM-L6-v2 uses an uncased tokenizer, so case and whitespace don't change the vector."""
+    return _WS.sub(" ", text).strip().lower()
+
+
+class EmbeddingCache:
+    """Bounded LRU of normalized query text -> embedding, with an optional sqlite tier on disk."""
+
+    def __init__(self, model: str, max_entries: int = DEFAULT_MAX_ENTRIES, disk_path: Optional[str] = DEFAULT_DISK_PATH):
+        self.model = model
+        self.max_entries = max_entries
+        self._mem: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._db = None
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS emb (key TEXT PRIMARY KEY, vec BLOB)")
+            self._db.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model}\x00{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vec: np.ndarray):
+        self._mem[key] = vec
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self._key(text)
+        with self._lock:
+            vec = self._mem.get(key)
+            if vec is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return vec
+            if self._db is not None:
+                row = self._db.execute("SELECT vec FROM emb WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    vec = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, vec)
+                    self.disk_hits += 1
+                    return vec
+            self.misses += 1
+            return None
+
+    def put(self, text: str, vec) -> np.ndarray:
+        key = self._key(text)
+        vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+        vec.setflags(write=False)
+        with self._lock:
+            self._remember(key, vec)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO emb (key, vec) VALUES (?, ?)", (key, vec.tobytes()))
+                self._db.commit()
+        return vec
+
+    def get_or_compute(self, text: str, compute: Callable[[str], object]) -> np.ndarray:
+        """Returns a read-only float32 vector; compute(text) runs only on a miss."""
+        vec = self.get(text)
+        if vec is None:
+            vec = self.put(text, compute(text))
+        return vec
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._mem),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+
+_shared: Dict[str, EmbeddingCache] = {}
+_shared_lock = threading.Lock()
+
+
+def get_cache(model: str) -> EmbeddingCache:
+    """One process-wide cache per embedding model, shared by api.py, retrieve.py and the RAG classes."""
+    # "all-MiniLM-L6-v2" and "sentence-transformers/all-MiniLM-L6-v2" are the same model
+    model = model.split("/")[-1]
+    with _shared_lock:
+        if model not in _shared:
+            _shared[model] = EmbeddingCache(model)
+        return _shared[model]
+
+
+def all_stats() -> Dict[str, Dict[str, float]]:
+    with _shared_lock:
+        caches = dict(_shared)
+    return {model: cache.stats() for model, cache in caches.items()}
+
+
+class CachedTextEmbedder:
+    """Drop-in wrapper for SentenceTransformersTextEmbedder (same run(text=...) -> {"embedding"} shape)."""
+
+    def __init__(self, embedder, cache: Optional[EmbeddingCache] = None):
+        self.embedder = embedder
+        self.cache = cache or get_cache(embedder.model)
+
+    def warm_up(self):
+        if hasattr(self.embedder, "warm_up"):
+            self.embedder.warm_up()
+
+    def run(self, text: str) -> Dict[str, List[float]]:
+        vec = self.cache.get_or_compute(text, lambda t: self.embedder.run(text=t)["embedding"])
+        return {"embedding": vec.tolist()}
+
+    async def aembed(self, text: str) -> np.ndarray:
+        """Async variant for embedders that expose aembed (e.g. BatchingEmbedder)."""
+        vec = self.cache.get(text)
+        if vec is None:
+            vec = self.cache.put(text, await self.embedder.aembed(text))
+        return vec
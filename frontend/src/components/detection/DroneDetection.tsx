@@ -1,6 +1,7 @@
 import React, { useEffect, useState, useRef } from "react";
 import type { DroneData } from "../../types";
 import { AlertCircle, ChevronDown, MapPin } from "lucide-react";
+import { getClusters, subscribeLiveFeed } from "../../services/api";
 
 interface Props {
   onRecommend: (data: DroneData) => void;
@@ -14,54 +15,47 @@ const DroneDetection: React.FC<Props> = ({ onRecommend, onLocate }) => {
   const videoRef = useRef<HTMLVideoElement>(null);
 
   useEffect(() => {
-    const fetchDroneData = async () => {
+    let active = true;
+    // Snapshot (or since=<version> delta) from the backend's cluster table
+    const loadClusters = async () => {
       try {
-        const response = await fetch("/src/assets/drone_data2.csv");
-        const text = await response.text();
-        const rows = text
-          .split("\n")
-          .filter((row) => row.trim()) // Remove empty rows
-          .slice(1); // Skip header row
-
-        const parsed = rows
-          .map((row) => {
-            const [
-              Cluster_ID,
-              No_of_People,
-              Latitude,
-              Longitude,
-              Distance_from_Inventory_km,
-            ] = row.split(",").map((item) => item.trim());
-
-            // Validate coordinates
-            const lat = parseFloat(Latitude);
-            const lng = parseFloat(Longitude);
-
-            if (isNaN(lat) || isNaN(lng)) {
-              console.error(`Invalid coordinates for Cluster ${Cluster_ID}`);
-              return null;
-            }
-
-            return {
-              Cluster_ID,
-              No_of_People: parseInt(No_of_People) || 0,
-              Latitude: lat,
-              Longitude: lng,
-              Distance_from_Inventory_km:
-                parseFloat(Distance_from_Inventory_km) || 0,
-            };
-          })
-          .filter((data): data is NonNullable<typeof data> => data !== null);
-
-        setDroneData(parsed);
+        const clusters = await getClusters();
+        if (active) {
+          setDroneData(clusters);
+        }
       } catch (error) {
         console.error("Error loading drone data:", error);
       } finally {
-        setLoading(false);
+        if (active) {
+          setLoading(false);
+        }
       }
     };
 
-    fetchDroneData();
+    loadClusters();
+    // Detections and edits arrive as pushed upserts/removals instead of a re-read
+    const unsubscribe = subscribeLiveFeed({
+      onCluster: (event) => {
+        setDroneData((prev) => {
+          if (event.op === "remove") {
+            return prev.filter((data) => data.Cluster_ID !== event.Cluster_ID);
+          }
+          const cluster = event.cluster;
+          if (!cluster) {
+            return prev;
+          }
+          const index = prev.findIndex((data) => data.Cluster_ID === cluster.Cluster_ID);
+          return index < 0
+            ? [...prev, cluster]
+            : prev.map((data, i) => (i === index ? cluster : data));
+        });
+      },
+      onResync: loadClusters,
+    });
+    return () => {
+      active = false;
+      unsubscribe();
+    };
   }, []);
 
   const showMore = () => {
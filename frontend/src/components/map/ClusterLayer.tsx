@@ -0,0 +1,108 @@
+import React, { useCallback, useEffect, useRef, useState } from "react";
+import { CircleMarker, Popup, Tooltip, useMap, useMapEvents } from "react-leaflet";
+import type { LatLngBounds } from "leaflet";
+import { getMapClusters, type MapCluster } from "../../services/api";
+
+// Cluster markers aggregated by the backend for the current zoom and view: one circle per
+// occupied ~32 px cell instead of one Leaflet marker per cluster, so the map stays responsive
+// however many clusters there are. Unchanged views revalidate to a 304.
+
+interface ClusterLayerProps {
+  refreshSeconds?: number;
+}
+
+// Round the view outward so small pans reuse the same URL (and server tiles / ETag)
+const viewportBBox = (bounds: LatLngBounds): string => {
+  const down = (v: number) => Math.floor(v * 1000) / 1000;
+  const up = (v: number) => Math.ceil(v * 1000) / 1000;
+  return [
+    Math.max(-180, down(bounds.getWest())),
+    Math.max(-85, down(bounds.getSouth())),
+    Math.min(180, up(bounds.getEast())),
+    Math.min(85, up(bounds.getNorth())),
+  ].join(",");
+};
+
+const priorityColor = (priority: number, top: number) => {
+  if (top <= 0) return "#f59e0b";
+  const share = priority / top;
+  if (share >= 0.66) return "#dc2626";
+  if (share >= 0.33) return "#f97316";
+  return "#f59e0b";
+};
+
+const ClusterLayer: React.FC<ClusterLayerProps> = ({ refreshSeconds = 5 }) => {
+  const map = useMap();
+  const [cells, setCells] = useState<MapCluster[]>([]);
+  const pending = useRef<AbortController | null>(null);
+
+  const load = useCallback(async () => {
+    pending.current?.abort();
+    const controller = new AbortController();
+    pending.current = controller;
+    try {
+      const items = await getMapClusters(
+        Math.round(map.getZoom()),
+        viewportBBox(map.getBounds()),
+        controller.signal
+      );
+      if (!controller.signal.aborted) {
+        setCells(items);
+      }
+    } catch {
+      // Aborted by a newer view, or logged by getMapClusters; keep the last markers
+    }
+  }, [map]);
+
+  useMapEvents({ moveend: load });
+
+  useEffect(() => {
+    load();
+    const timer = window.setInterval(load, refreshSeconds * 1000);
+    return () => {
+      window.clearInterval(timer);
+      pending.current?.abort();
+    };
+  }, [load, refreshSeconds]);
+
+  const top = cells.reduce((m, c) => Math.max(m, c.max_priority), 0);
+
+  return (
+    <>
+      {cells.map((cell) => (
+        <CircleMarker
+          key={cell.Cluster_ID ?? `${cell.lat},${cell.lon}`}
+          center={[cell.lat, cell.lon]}
+          radius={cell.count > 1 ? 8 + 4 * Math.log10(cell.people + 1) : 7}
+          pathOptions={{
+            color: priorityColor(cell.max_priority, top),
+            fillColor: priorityColor(cell.max_priority, top),
+            fillOpacity: 0.6,
+            weight: 1,
+          }}
+          eventHandlers={
+            cell.count > 1
+              ? { click: () => map.flyTo([cell.lat, cell.lon], Math.min(map.getZoom() + 2, map.getMaxZoom())) }
+              : undefined
+          }
+        >
+          {cell.count > 1 && (
+            <Tooltip>
+              {cell.count} clusters, {cell.people} people
+            </Tooltip>
+          )}
+          {cell.count === 1 && (
+            <Popup>
+              <div className="text-sm">
+                <p className="font-semibold">Cluster {cell.Cluster_ID}</p>
+                <p>People affected: {cell.people}</p>
+              </div>
+            </Popup>
+          )}
+        </CircleMarker>
+      ))}
+    </>
+  );
+};
+
+export default ClusterLayer;
@@ -3,6 +3,7 @@ import { MapPin, Clock } from "lucide-react";
 import { MapContainer, TileLayer, Marker, Popup, useMap } from "react-leaflet";
 import L from "leaflet";
 import "leaflet/dist/leaflet.css";
+import ClusterLayer from "./ClusterLayer";
 
 // Create custom marker icons
 const clusterIcon = new L.Icon({
@@ -105,21 +106,20 @@ const MapAndTimeline: React.FC<MapAndTimelineProps> = ({
             </Popup>
           </Marker>
 
-          {/* Cluster Markers */}
-          {markers.map((marker) => (
-            <Marker
-              key={marker.id}
-              position={marker.position}
-              icon={clusterIcon}
-            >
+          {/* Cluster markers, aggregated per zoom level by the backend */}
+          <ClusterLayer />
+
+          {/* Cluster the user located from the detection list */}
+          {activeMarker && (
+            <Marker position={activeMarker.position} icon={clusterIcon}>
               <Popup>
                 <div className="text-sm">
-                  <p className="font-semibold">Cluster {marker.id}</p>
-                  <p>People affected: {marker.people}</p>
+                  <p className="font-semibold">Cluster {activeMarker.id}</p>
+                  <p>People affected: {activeMarker.people}</p>
                 </div>
               </Popup>
             </Marker>
-          ))}
+          )}
 
           {activeMarker && (
             <MapController
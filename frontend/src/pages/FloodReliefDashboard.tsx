@@ -1,9 +1,10 @@
-import React, { useState, useEffect, useRef } from "react";
+import React, { useEffect, useState, useRef } from "react";
 import Header from "../components/layout/Header";
 import InventoryCard from "../components/inventory/InventoryCard";
 import DroneDetection from "../components/detection/DroneDetection";
 import AllocationRecommendation from "../components/recommendation/AllocationRecommendation";
 import MapAndTimeline from "../components/map/MapAndTimeline";
+import ClusterLayer from "../components/map/ClusterLayer";
 import AddInventoryDialog from "../components/inventory/AddInventoryDialog";
 import fs from "fs/promises";
 import path from "path";
@@ -26,6 +27,12 @@ import { MapContainer, TileLayer, Marker, Popup } from "react-leaflet";
 import "leaflet/dist/leaflet.css";
 import L from "leaflet";
 import LiveFeed from "../components/detection/LiveFeed";
+import {
+  getRecommendations,
+  subscribeLiveFeed,
+  toAllocationRecommendation,
+} from "../services/api";
+import type { DroneRecommendation } from "../services/api";
 
 const FloodReliefDashboard: React.FC = () => {
   const mapRef = useRef<HTMLDivElement>(null);
@@ -92,6 +99,32 @@ const FloodReliefDashboard: React.FC = () => {
       timestamp: "2 minutes ago",
     });
 
+  // The card follows the backend's top recommendation until a row's Recommend is clicked
+  const followTopRecommendation = useRef(true);
+
+  useEffect(() => {
+    let active = true;
+    const showTop = (recs: DroneRecommendation[]) => {
+      if (active && followTopRecommendation.current && recs.length) {
+        setRecommendation(toAllocationRecommendation(recs[0]));
+      }
+    };
+    const loadRecommendations = () =>
+      getRecommendations()
+        .then(showTop)
+        .catch(() => undefined); // already logged; the card keeps what it shows
+
+    loadRecommendations();
+    const unsubscribe = subscribeLiveFeed({
+      onRecommendations: (event) => showTop(event.recommendations),
+      onResync: loadRecommendations,
+    });
+    return () => {
+      active = false;
+      unsubscribe();
+    };
+  }, []);
+
   const [timelineEvents] = useState<TimelineEvent[]>([
     {
       id: "1",
@@ -126,49 +159,6 @@ const FloodReliefDashboard: React.FC = () => {
     popupAnchor: [0, -32],
   });
 
-  // Load all markers when component mounts
-  useEffect(() => {
-    const loadAllMarkers = async () => {
-      try {
-        const response = await fetch("/src/assets/drone_data2.csv");
-        const text = await response.text();
-        const rows = text
-          .split("\n")
-          .filter((row) => row.trim())
-          .slice(1); // Skip header
-
-        const markers = rows
-          .map((row) => {
-            const [Cluster_ID, No_of_People, Latitude, Longitude] = row
-              .split(",")
-              .map((item) => item.trim());
-            const lat = parseFloat(Latitude);
-            const lng = parseFloat(Longitude);
-
-            if (isNaN(lat) || isNaN(lng)) {
-              console.error(`Invalid coordinates for Cluster ${Cluster_ID}`);
-              return null;
-            }
-
-            return {
-              id: Cluster_ID,
-              position: [lat, lng] as [number, number],
-              people: parseInt(No_of_People) || 0,
-            };
-          })
-          .filter(
-            (marker): marker is NonNullable<typeof marker> => marker !== null
-          );
-
-        setMapMarkers(markers);
-      } catch (error) {
-        console.error("Error loading markers:", error);
-      }
-    };
-
-    loadAllMarkers();
-  }, []);
-
   const handleAddInventory = async (itemName: string, quantity: number) => {
     // Update inventory state
     const updatedInventory = inventory.map((item) => {
@@ -201,6 +191,7 @@ const FloodReliefDashboard: React.FC = () => {
   };
 
   const handleRecommendation = (data: DroneData) => {
+    followTopRecommendation.current = false;
     // Update recommendation state or trigger API call
     const newRecommendation: AllocationRecommendationType = {
       id: data.Cluster_ID,
@@ -304,7 +295,10 @@ const FloodReliefDashboard: React.FC = () => {
         </Popup>
       </Marker>
 
-      {/* Cluster Markers */}
+      {/* Cluster markers, aggregated per zoom level by the backend */}
+      <ClusterLayer />
+
+      {/* Clusters located from the detection list */}
       {mapMarkers.map((marker) => (
         <Marker key={marker.id} position={marker.position} icon={icon}>
           <Popup>
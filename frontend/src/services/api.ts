@@ -16,16 +16,61 @@ export interface DroneRecommendation {
   };
 }
 
+export interface DroneCluster {
+  Cluster_ID: string;
+  No_of_People: number;
+  Latitude: number;
+  Longitude: number;
+  Distance_from_Inventory_km: number;
+}
+
 const API_BASE_URL = 'http://localhost:5000/api';
 
+// Last response per URL, revalidated with If-None-Match / since=<version>
+interface VersionedEntry<T> {
+  etag: string | null;
+  version: number;
+  items: T[];
+}
+
+const recommendationCache = new Map<string, VersionedEntry<DroneRecommendation>>();
+let clusterCache: VersionedEntry<DroneCluster> | null = null;
+
+const conditionalFetch = async (url: string, etag: string | null | undefined) => {
+  const headers: Record<string, string> = {};
+  if (etag) {
+    headers['If-None-Match'] = etag;
+  }
+  return fetch(url, { headers });
+};
+
+const mergeDelta = <T extends { Cluster_ID: string }>(
+  items: T[],
+  delta: { added: T[]; changed: T[]; removed: string[]; order?: string[] }
+): T[] => {
+  const byId = new Map(items.map((item) => [item.Cluster_ID, item]));
+  delta.removed.forEach((id) => byId.delete(id));
+  [...delta.added, ...delta.changed].forEach((item) => byId.set(item.Cluster_ID, item));
+  if (delta.order) {
+    return delta.order.map((id) => byId.get(id)).filter((item): item is T => item !== undefined);
+  }
+  return Array.from(byId.values());
+};
+
 export const getRecommendations = async (
   minPeople: number = 0,
   maxDistance: number = 100
 ): Promise<DroneRecommendation[]> => {
   try {
-    const response = await fetch(
-      `${API_BASE_URL}/recommendations?min_people=${minPeople}&max_distance=${maxDistance}`
-    );
+    const key = `min_people=${minPeople}&max_distance=${maxDistance}`;
+    const cached = recommendationCache.get(key);
+    const since = cached ? `&since=${cached.version}` : '';
+    const response = await conditionalFetch(`${API_BASE_URL}/recommendations?${key}${since}`, cached?.etag);
+
+    if (response.status === 304 && cached) {
+      return cached.items;
+    }
+
     const data = await response.json();
     
     if (!response.ok) {
@@ -33,7 +78,11 @@ export const getRecommendations = async (
     }
     
     if (data.success) {
-      return data.recommendations;
+      const items: DroneRecommendation[] = data.delta && cached
+        ? mergeDelta(cached.items, data)
+        : data.recommendations;
+      recommendationCache.set(key, { etag: response.headers.get('ETag'), version: data.version, items });
+      return items;
     }
     
     throw new Error('Invalid response format');
@@ -43,6 +92,105 @@ export const getRecommendations = async (
   }
 };
 
+// Backend recommendation -> the dashboard's recommendation card (boats: one per 20 people)
+export const toAllocationRecommendation = (rec: DroneRecommendation): AllocationRecommendationType => ({
+  id: rec.Cluster_ID,
+  location: `Cluster ${rec.Cluster_ID} (${rec.Latitude.toFixed(4)}, ${rec.Longitude.toFixed(4)})`,
+  foodKits: rec.recommended_resources['Food Packets'],
+  medicalKits: rec.recommended_resources['Medical Kits'],
+  rescueBoats: Math.ceil(rec.No_of_People / 20),
+  blankets: rec.recommended_resources['Blankets'],
+  priority: rec.No_of_People > 50 ? 'Critical' : 'Medium',
+  reason: `Highest priority cluster: ${rec.No_of_People} people at ${rec.Distance_from_Inventory_km.toFixed(2)} km from inventory.`,
+  timestamp: new Date().toLocaleString(),
+});
+
+export const getClusters = async (): Promise<DroneCluster[]> => {
+  try {
+    const since = clusterCache ? `?since=${clusterCache.version}` : '';
+    const response = await conditionalFetch(`${API_BASE_URL}/clusters${since}`, clusterCache?.etag);
+
+    if (response.status === 304 && clusterCache) {
+      return clusterCache.items;
+    }
+
+    const data = await response.json();
+
+    if (!response.ok) {
+      throw new Error(data.error || 'Failed to fetch clusters');
+    }
+
+    if (data.success) {
+      const items: DroneCluster[] = data.delta && clusterCache
+        ? mergeDelta(clusterCache.items, data)
+        : data.clusters;
+      clusterCache = { etag: response.headers.get('ETag'), version: data.version, items };
+      return items;
+    }
+
+    throw new Error('Invalid response format');
+  } catch (error) {
+    console.error('Error fetching clusters:', error);
+    throw error;
+  }
+};
+
+// One marker per occupied map cell, aggregated server-side (GET /api/map/clusters)
+export interface MapCluster {
+  lat: number;
+  lon: number;
+  count: number;
+  people: number;
+  max_priority: number;
+  Cluster_ID?: string;
+}
+
+// Last response per viewport; panning back or polling revalidates with If-None-Match
+const mapClusterCache = new Map<string, { etag: string | null; items: MapCluster[] }>();
+const MAP_CLUSTER_CACHE_ENTRIES = 64;
+
+export const getMapClusters = async (
+  zoom: number,
+  bbox: string,
+  signal?: AbortSignal
+): Promise<MapCluster[]> => {
+  try {
+    const url = `${API_BASE_URL}/map/clusters?zoom=${zoom}&bbox=${bbox}`;
+    const cached = mapClusterCache.get(url);
+    const headers: Record<string, string> = {};
+    if (cached?.etag) {
+      headers['If-None-Match'] = cached.etag;
+    }
+    const response = await fetch(url, { headers, signal });
+
+    if (response.status === 304 && cached) {
+      return cached.items;
+    }
+
+    const data = await response.json();
+
+    if (!response.ok) {
+      throw new Error(data.error || 'Failed to fetch map clusters');
+    }
+
+    if (data.success) {
+      mapClusterCache.delete(url);
+      mapClusterCache.set(url, { etag: response.headers.get('ETag'), items: data.clusters });
+      if (mapClusterCache.size > MAP_CLUSTER_CACHE_ENTRIES) {
+        mapClusterCache.delete(mapClusterCache.keys().next().value as string);
+      }
+      return data.clusters;
+    }
+
+    throw new Error('Invalid response format');
+  } catch (error) {
+    if ((error as Error).name !== 'AbortError') {
+      console.error('Error fetching map clusters:', error);
+    }
+    throw error;
+  }
+};
+
 export const updateInventory = async (
   itemName: string,
   quantity: number
@@ -68,4 +216,65 @@ export const updateInventory = async (
     console.error('Error updating inventory:', error);
     throw error;
   }
-};
\ No newline at end of file
+};
+export interface LiveFeedHandlers {
+  onCluster?: (event: { version: number; op: 'upsert' | 'remove'; cluster?: DroneCluster; Cluster_ID?: string }) => void;
+  onRecommendations?: (event: { version: number; recommendations: DroneRecommendation[] }) => void;
+  onInventory?: (event: { version: number; item: string; quantity: number }) => void;
+  // Sent instead of individual updates when this client fell too far behind; refetch with since=<version>
+  onResync?: () => void;
+}
+
+// Server-sent events replace polling; the server coalesces to at most one batch per interval.
+// Every component shares one EventSource per tab, since the server caps concurrent streams.
+const LIVE_FEED_RETRY_MS = 10000;
+const liveFeedHandlers = new Set<LiveFeedHandlers>();
+let liveFeedSource: EventSource | null = null;
+let liveFeedRetry: ReturnType<typeof setTimeout> | null = null;
+
+const openLiveFeed = () => {
+  const source = new EventSource(`${API_BASE_URL}/stream`);
+  const dispatch = <K extends keyof LiveFeedHandlers>(event: string, key: K) => {
+    source.addEventListener(event, (e) => {
+      const data = JSON.parse((e as MessageEvent).data);
+      liveFeedHandlers.forEach((h) => (h[key] as ((data: unknown) => void) | undefined)?.(data));
+    });
+  };
+  dispatch('clusters', 'onCluster');
+  dispatch('recommendations', 'onRecommendations');
+  dispatch('inventory', 'onInventory');
+  source.addEventListener('resync', () => liveFeedHandlers.forEach((h) => h.onResync?.()));
+  source.onerror = () => {
+    // EventSource retries dropped connections itself, but gives up on an error response
+    // (503 when the server is at its subscriber limit); reopen later and resync meanwhile
+    if (source.readyState === EventSource.CLOSED && liveFeedSource === source) {
+      liveFeedSource = null;
+      liveFeedRetry = setTimeout(() => {
+        liveFeedRetry = null;
+        if (liveFeedHandlers.size) {
+          liveFeedSource = openLiveFeed();
+          liveFeedHandlers.forEach((h) => h.onResync?.());
+        }
+      }, LIVE_FEED_RETRY_MS);
+    }
+  };
+  return source;
+};
+
+export const subscribeLiveFeed = (handlers: LiveFeedHandlers): (() => void) => {
+  liveFeedHandlers.add(handlers);
+  if (!liveFeedSource && !liveFeedRetry) {
+    liveFeedSource = openLiveFeed();
+  }
+  return () => {
+    liveFeedHandlers.delete(handlers);
+    if (!liveFeedHandlers.size) {
+      liveFeedSource?.close();
+      liveFeedSource = null;
+      if (liveFeedRetry) {
+        clearTimeout(liveFeedRetry);
+        liveFeedRetry = null;
+      }
+    }
+  };
+};
@@ -0,0 +1,13 @@
+# geo.py
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+# Depot location from inventory_data.csv (Inventory_Latitude / Inventory_Longitude)
+DEPOT = (18.5204, 73.8567)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; accepts scalars or NumPy arrays (broadcasts)."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(h))
@@ -0,0 +1,80 @@
+# hybrid_retrieve.py
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import Dict, List, Optional, Any
+from haystack import Document
+from haystack.components.retrievers import InMemoryBM25Retriever, InMemoryEmbeddingRetriever
+
+# Standard RRF damping constant (Cormack et al.); keeps a single top-1 hit from dominating
+RRF_K = 60
+MODES = ("dense", "bm25", "hybrid")
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List[Document]], k: int = RRF_K,
+                           top_k: Optional[int] = None) -> List[Document]:
+    """Fuse several ranked document lists: score(d) = sum(1 / (k + rank))."""
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranked in ranked_lists:
+        for rank, d in enumerate(ranked, start=1):
+            scores[d.id] = scores.get(d.id, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(d.id, d)
+    order = sorted(scores, key=scores.get, reverse=True)
+    if top_k:
+        order = order[:top_k]
+    return [replace(docs[doc_id], score=scores[doc_id]) for doc_id in order]
+
+
+class HybridRetriever:
+    """BM25 + dense retrieval over one document store, fused with RRF.
+
+    mode="dense" (the default) matches the old embed -> InMemoryEmbeddingRetriever pipeline,
+    mode="bm25" is keyword only (exact ids like C017 / RP1022),
+    mode="hybrid" runs both concurrently and fuses the rankings.
+    """
+
+    def __init__(self, document_store, embedder, top_k: int = 10, candidate_k: Optional[int] = None,
+                 rrf_k: int = RRF_K):
+        if top_k < 1:
+            raise ValueError(f"top_k must be >= 1, got {top_k}")
+        self.top_k = top_k
+        # Each side fetches a few more than top_k so fusion has something to reorder
+        self.candidate_k = candidate_k or 2 * top_k
+        self.rrf_k = rrf_k
+        self.embedder = embedder
+        if hasattr(self.embedder, "warm_up"):
+            self.embedder.warm_up()
+        self.bm25 = InMemoryBM25Retriever(document_store=document_store, top_k=self.candidate_k)
+        self.dense = InMemoryEmbeddingRetriever(document_store=document_store, top_k=self.candidate_k)
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hybrid")
+
+    def embed_query(self, query: str) -> List[float]:
+        return self.embedder.run(text=query)["embedding"]
+
+    def _dense_search(self, query: str, top_k: int, filters: Optional[Dict[str, Any]],
+                      query_embedding: Optional[List[float]] = None) -> List[Document]:
+        q_emb = query_embedding if query_embedding is not None else self.embed_query(query)
+        return self.dense.run(query_embedding=q_emb, filters=filters, top_k=top_k)["documents"]
+
+    def _bm25_search(self, query: str, top_k: int, filters: Optional[Dict[str, Any]]) -> List[Document]:
+        return self.bm25.run(query=query, filters=filters, top_k=top_k)["documents"]
+
+    def run(self, query: str, mode: str = "dense", top_k: Optional[int] = None,
+            filters: Optional[Dict[str, Any]] = None,
+            query_embedding: Optional[List[float]] = None) -> List[Document]:
+        """query_embedding lets callers that fan out over several stores embed the query once."""
+        if mode not in MODES:
+            raise ValueError(f"Unknown retrieval mode '{mode}', expected one of {MODES}")
+        top_k = self.top_k if top_k is None else top_k
+        if top_k < 1:
+            raise ValueError(f"top_k must be >= 1, got {top_k}")
+        if mode == "dense":
+            return self._dense_search(query, top_k, filters, query_embedding)
+        if mode == "bm25":
+            return self._bm25_search(query, top_k, filters)
+
+        candidate_k = max(self.candidate_k, top_k)
+        # BM25 is cheap and runs while the query is being embedded
+        bm25_future = self._pool.submit(self._bm25_search, query, candidate_k, filters)
+        dense_future = self._pool.submit(self._dense_search, query, candidate_k, filters, query_embedding)
+        return reciprocal_rank_fusion([dense_future.result(), bm25_future.result()], k=self.rrf_k, top_k=top_k)
@@ -1,21 +1,27 @@
 # ingest.py
+import os
 from datetime import datetime
-import pandas as pd
 from haystack import Document
 from haystack.document_stores import FAISSDocumentStore
 from haystack.components.preprocessors import DocumentSplitter
-from haystack.components.embedders import SentenceTransformersTextEmbedder
 from haystack.components.writers import DocumentWriter
+from sharded_retrieve import KINDS, split_by_kind, shard_index_path
+from embed_backend import document_embedder
+from columnar_store import load_clusters, load_inventory
 
 # 1) Init stores & components
 store = FAISSDocumentStore(embedding_dim=384, faiss_index_factory_str="Flat")
 splitter = DocumentSplitter(split_by="word", split_length=180, split_overlap=40)
-embedder = SentenceTransformersTextEmbedder(model="sentence-transformers/all-MiniLM-L6-v2")
+# Embedding dominates ingest CPU; EMBED_BACKEND=onnx-int8 runs the quantized ONNX graph instead of PyTorch
+embedder = document_embedder("sentence-transformers/all-MiniLM-L6-v2")
+embedder.warm_up()
 writer = DocumentWriter(document_store=store)
+# One small sub-index per document kind for FanOutRetriever
+shard_stores = {kind: FAISSDocumentStore(embedding_dim=384, faiss_index_factory_str="Flat") for kind in KINDS}
 
-# 2) Load CSVs you already created
-clusters = pd.read_csv("/mnt/data/drone_data.csv")
-inv = pd.read_csv("/mnt/data/inventory_data.csv")
+# 2) Load the snapshots you already created (.csv or typed .parquet from columnar_store.py)
+clusters = load_clusters(os.getenv("CLUSTERS_PATH", "/mnt/data/drone_data.csv"))
+inv = load_inventory(os.getenv("INVENTORY_PATH", "/mnt/data/inventory_data.csv"), columns=["Resource", "Quantity"])
 now = datetime.utcnow().isoformat() + "Z"
 
 # 3) Build documents
@@ -64,8 +70,14 @@ all_docs = protocol_docs + report_docs + situation_docs + inv_docs
 
 # 4) Split → Embed → Write
 chunks = splitter.run(all_docs)["documents"]
-emb = embedder.run(chunks)
+emb = embedder.run(documents=chunks)
 emb_docs = emb["documents"]
 writer.run(emb_docs)
 
+# 5) Per-kind shards (same embedded chunks, no re-embedding)
+for kind, docs in split_by_kind(emb_docs).items():
+    DocumentWriter(document_store=shard_stores[kind]).run(docs)
+    shard_stores[kind].save(index_path=shard_index_path(kind))
+    print(f"  {kind}: {len(docs)} chunks -> {shard_index_path(kind)}")
+
 print(f"Indexed {len(emb_docs)} chunks")
\ No newline at end of file
@@ -0,0 +1,99 @@
+# inventory_snapshot.py
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+import pandas as pd
+import orjson
+
+
+class InventorySnapshot:
+    """Inventory table plus its serialized forms, cached per version.
+
+    Stock changes far less often than plans are requested, so the JSON bytes for API
+    responses and the CSV text for the planner prompt are rendered once per version
+    and reused until the next update.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self._df = df.reset_index(drop=True)
+        self._lock = threading.Lock()
+        self._cache: Dict[str, tuple] = {}
+        self.version = 0
+
+    @classmethod
+    def from_csv(cls, path: str) -> "InventorySnapshot":
+        return cls(pd.read_csv(path))
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """Read-only view; mutate through set_quantity/adjust/replace so the version moves."""
+        return self._df
+
+    def _state(self) -> Tuple[int, pd.DataFrame]:
+        return self.version, self._df
+
+    def snapshot(self) -> Tuple[int, pd.DataFrame]:
+        """(version, frame) read together; the frame is the one that version refers to."""
+        with self._lock:
+            return self._state()
+
+    def _cached(self, name: str, render: Callable[[pd.DataFrame], Any]) -> Tuple[int, Any]:
+        with self._lock:
+            version, df = self._state()
+            hit = self._cache.get(name)
+            if hit is not None and hit[0] == version:
+                return hit
+        value = render(df)
+        with self._lock:
+            # Don't let a render of an older frame overwrite a newer entry
+            if self.version == version:
+                self._cache[name] = (version, value)
+        return version, value
+
+    def records(self) -> List[Dict[str, Any]]:
+        return self._cached("records", lambda df: df.to_dict(orient="records"))[1]
+
+    def json_snapshot(self) -> Tuple[int, bytes]:
+        """(version, JSON bytes of that version), for responses that report both."""
+        return self._cached("json", lambda df: orjson.dumps(df.to_dict(orient="records"), option=orjson.OPT_SERIALIZE_NUMPY))
+
+    def json_bytes(self) -> bytes:
+        return self.json_snapshot()[1]
+
+    def csv_text(self) -> str:
+        return self._cached("csv", lambda df: df.to_csv(index=False))[1]
+
+    def _commit(self, df: pd.DataFrame) -> int:
+        # Callers hold self._lock
+        self._df = df
+        self.version += 1
+        self._cache.clear()
+        return self.version
+
+    def set_quantity(self, resource: str, quantity: int) -> int:
+        if int(quantity) < 0:
+            raise ValueError(f"Quantity for {resource} must be >= 0, got {quantity}")
+        with self._lock:
+            mask = self._df["Resource"] == resource
+            if not mask.any():
+                raise KeyError(f"Unknown resource: {resource}")
+            if int(self._df.loc[mask, "Quantity"].iloc[0]) == int(quantity):
+                return self.version
+            df = self._df.copy()
+            df.loc[mask, "Quantity"] = int(quantity)
+            return self._commit(df)
+
+    def adjust(self, resource: str, delta: int) -> int:
+        """Add (restock) or subtract (allocate) units; stock never goes below zero."""
+        with self._lock:
+            mask = self._df["Resource"] == resource
+            if not mask.any():
+                raise KeyError(f"Unknown resource: {resource}")
+            if delta == 0:
+                return self.version
+            df = self._df.copy()
+            df.loc[mask, "Quantity"] = max(0, int(df.loc[mask, "Quantity"].iloc[0]) + int(delta))
+            return self._commit(df)
+
+    def replace(self, df: pd.DataFrame) -> int:
+        with self._lock:
+            return self._commit(df.reset_index(drop=True))
@@ -0,0 +1,154 @@
+# live_feed.py
+import json
+import time
+import select
+import socket
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+TOPICS = ("clusters", "recommendations", "inventory")
+
+
+class TooManySubscribers(RuntimeError):
+    """The feed is at max_subscribers; the client should retry later."""
+
+
+def peer_closed(sock: socket.socket) -> bool:
+    """True once the client has closed its end. An SSE client sends nothing after its request,
+    so a readable socket with nothing to peek at means EOF."""
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b""
+    except ValueError:
+        return False  # TLS sockets refuse MSG_PEEK; fall back to noticing on the next write
+    except OSError:
+        return True
+
+
+class Subscriber:
+    """One connected client. Pending updates are coalesced by (topic, key): a newer payload
+    for the same key replaces the older one, so a client only ever sees the latest state.
+    """
+
+    def __init__(self, topics: Set[str], interval: float, max_pending: int):
+        self.topics = topics
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[Tuple[str, Hashable], Any]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._last_sent = 0.0
+        self.resync = False
+        self.dropped = 0
+
+    def offer(self, topic: str, key: Hashable, payload: Any):
+        if topic not in self.topics:
+            return
+        with self._cond:
+            if self.resync:
+                self.dropped += 1
+                return
+            self._pending[(topic, key)] = payload
+            self._pending.move_to_end((topic, key))
+            if len(self._pending) > self.max_pending:
+                # Slow consumer: stop buffering and tell it to refetch (since=<version>) instead
+                self.dropped += len(self._pending)
+                self._pending.clear()
+                self.resync = True
+            self._cond.notify()
+
+    def next_batch(self, timeout: float) -> Optional[List[Tuple[str, Any]]]:
+        """Blocks until there is something to send and the coalescing interval has passed.
+        Returns None on timeout (caller sends a keep-alive)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._pending and not self.resync:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+        # At most one batch per interval; anything arriving meanwhile is coalesced into it
+        wait = self._last_sent + self.interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        with self._cond:
+            if self.resync:
+                self.resync = False
+                batch = [("resync", {"reason": "client too slow, refetch with since=<version>"})]
+            else:
+                batch = [(topic, payload) for (topic, _), payload in self._pending.items()]
+            self._pending.clear()
+        self._last_sent = time.monotonic()
+        return batch
+
+
+class LiveFeed:
+    """Fan-out of change events to SSE subscribers. publish() never blocks on clients.
+
+    Each streaming client holds a server thread, so max_subscribers (0 = unlimited) bounds
+    them; stream() checks for a gone client every poll seconds rather than at the next write.
+    """
+
+    def __init__(self, interval: float = 1.0, max_pending: int = 1000, keepalive: float = 15.0,
+                 max_subscribers: int = 0, poll: float = 1.0):
+        self.interval = interval
+        self.max_pending = max_pending
+        self.keepalive = keepalive
+        self.max_subscribers = max_subscribers
+        self.poll = poll
+        self._subs: Set[Subscriber] = set()
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def subscribe(self, topics: Optional[Iterable[str]] = None, interval: Optional[float] = None) -> Subscriber:
+        topics = set(topics or TOPICS) & set(TOPICS)
+        # Clients may slow their own stream down, never speed it up past the server interval
+        interval = max(self.interval, interval or 0)
+        sub = Subscriber(topics, interval, self.max_pending)
+        with self._lock:
+            if self.max_subscribers and len(self._subs) >= self.max_subscribers:
+                raise TooManySubscribers(f"live feed is at its limit of {self.max_subscribers} subscribers")
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        with self._lock:
+            self._subs.discard(sub)
+
+    def publish(self, topic: str, key: Hashable, payload: Any):
+        with self._lock:
+            subs = list(self._subs)
+        for sub in subs:
+            sub.offer(topic, key, payload)
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subs)
+
+    def stream(self, sub: Subscriber, disconnected: Optional[Callable[[], bool]] = None) -> Iterator[str]:
+        """SSE frames for one subscriber; unsubscribes when the client goes away.
+
+        Without `disconnected` a dead client is only noticed when a keep-alive write fails."""
+        try:
+            yield "retry: 3000\n\n"
+            last_write = time.monotonic()
+            while True:
+                batch = sub.next_batch(timeout=self.keepalive if disconnected is None else min(self.poll, self.keepalive))
+                if batch is None:
+                    if disconnected is not None and disconnected():
+                        return
+                    if time.monotonic() - last_write >= self.keepalive:
+                        yield ": keep-alive\n\n"
+                        last_write = time.monotonic()
+                    continue
+                frames = []
+                for topic, payload in batch:
+                    with self._lock:
+                        self._seq += 1
+                        seq = self._seq
+                    frames.append(f"id: {seq}\nevent: {topic}\ndata: {json.dumps(payload, default=str)}\n\n")
+                yield "".join(frames)
+                last_write = time.monotonic()
+        finally:
+            self.unsubscribe(sub)
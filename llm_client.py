@@ -0,0 +1,49 @@
+# llm_client.py
+import os
+from typing import Any, Dict, Optional
+import httpx
+
+# Hugging Face Inference API protocol: {"inputs": ...} -> [{"generated_text": ...}]
+# Unset PLANNER_LLM_URL keeps /plan in retrieval-only mode.
+PLANNER_LLM_URL = os.getenv("PLANNER_LLM_URL")
+hf_token = os.getenv("HF_TOKEN")
+HEADERS = {"Authorization": f"Bearer {hf_token}"} if hf_token else {}
+# text-generation echoes the prompt by default; callers parse the completion only
+DEFAULT_PARAMETERS = {"return_full_text": False}
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(headers=HEADERS, timeout=httpx.Timeout(120.0, connect=5.0))
+    return _client
+
+
+def extract_generated_text(raw: Any) -> str:
+    if isinstance(raw, list) and raw and isinstance(raw[0], dict) and "generated_text" in raw[0]:
+        return raw[0]["generated_text"]
+    return str(raw)
+
+
+async def agenerate(prompt: str, url: Optional[str] = None, parameters: Optional[Dict[str, Any]] = None) -> str:
+    """Awaitable LLM call; cancelling the awaiting task closes the HTTP request."""
+    url = url or PLANNER_LLM_URL
+    if not url:
+        raise RuntimeError("PLANNER_LLM_URL is not set")
+    parameters = {**DEFAULT_PARAMETERS, **(parameters or {})}
+    resp = await _get_client().post(url, json={"inputs": prompt, "parameters": parameters})
+    resp.raise_for_status()
+    text = extract_generated_text(resp.json())
+    # Some endpoints ignore return_full_text and echo the prompt anyway
+    if not parameters["return_full_text"] and text.startswith(prompt):
+        text = text[len(prompt):]
+    return text
+
+
+async def aclose():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -1,47 +1,80 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from haystack.document_stores import InMemoryDocumentStore
-from haystack.nodes import BM25Retriever
-from haystack import Document
-import pandas as pd
-import numpy as np
+import os
+import threading
+from cluster_store import etag_matches, diff_records
+from shm_store import open_clusters, open_inventory
+from live_feed import LiveFeed, TooManySubscribers, peer_closed
+from detection_stream import DetectionClusterer
+from map_tiles import TileIndex, parse_bbox
+from columnar_store import load_clusters
+from rec_cache import RecommendationCache
+from allocation import compute_recommendations
+from metrics import REGISTRY, PROMETHEUS_CONTENT_TYPE, stage, stats_collector
 
 app = Flask(__name__)
-CORS(app)
-
-# Initialize Haystack
-document_store = InMemoryDocumentStore()
-
-# Load and process drone data
-def load_drone_data():
-    df = pd.read_csv('drone_data.csv')
-    docs = []
-    for _, row in df.iterrows():
-        content = f"""Cluster ID: {row['Cluster_ID']}
-        People: {row['No_of_People']}
-        Location: {row['Latitude']}, {row['Longitude']}
-        Distance: {row['Distance_from_Inventory_km']} km"""
-        
-        doc = Document(
-            content=content,
-            meta={
-                'cluster_id': row['Cluster_ID'],
-                'people': row['No_of_People'],
-                'latitude': row['Latitude'],
-                'longitude': row['Longitude'],
-                'distance': row['Distance_from_Inventory_km']
-            }
-        )
-        docs.append(doc)
-    
-    document_store.write_documents(docs)
-    return df
+# ETag must be exposed for the dashboard's conditional requests
+CORS(app, expose_headers=['ETag'])
+
+# Versioned cluster table (DRONE_DATA may point at a typed .parquet snapshot instead); every
+# change bumps the version used for ETags and deltas. With SHM_TABLES set, workers attach to
+# the table in shared memory and never parse DRONE_DATA themselves.
+clusters = open_clusters(lambda: load_clusters(os.getenv('DRONE_DATA', 'drone_data.csv')))
+
+# Results by (quantized min_people/max_distance, cluster-table version). Older versions stay
+# until evicted so since=<version> requests can be answered as a diff.
+recommendation_cache = RecommendationCache(compute_recommendations, max_entries=int(os.getenv('REC_CACHE_SIZE', '256')))
+REGISTRY.register_collector(stats_collector('recommendation_cache', recommendation_cache.stats, counters=('precomputed',)))
+
+# Map markers pre-aggregated per zoom/tile; brought up to the cluster table's version on read,
+# so changes from any worker (or POST /api/clusters) only re-stamp the tiles they touch
+map_tiles = TileIndex()
+map_tiles.sync(clusters)
+REGISTRY.register_collector(stats_collector('map_tiles', map_tiles.stats, counters=('rebuilds', 'applied')))
+
+def not_modified(etag):
+    return '', 304, {'ETag': etag}
+
+INVENTORY_CSV = os.getenv('INVENTORY_CSV', 'frontend/src/assets/inventory_data.csv')
+inventory = open_inventory(INVENTORY_CSV)
 
-# Initialize retriever
-retriever = BM25Retriever(document_store=document_store)
+# Push channel for the dashboard: at most one coalesced batch per client per interval. Under the
+# threaded dev server every stream pins a thread, hence the cap; for many dashboards run it on
+# gevent workers (gunicorn -k gevent main:app), where a stream costs a greenlet.
+live_feed = LiveFeed(
+    interval=float(os.getenv('LIVE_FEED_INTERVAL', '1.0')),
+    keepalive=float(os.getenv('LIVE_FEED_KEEPALIVE', '15')),
+    max_subscribers=int(os.getenv('LIVE_FEED_MAX_SUBSCRIBERS', '64')),
+)
+# Parameters the dashboard uses for its recommendation panel
+DEFAULT_MIN_PEOPLE, DEFAULT_MAX_DISTANCE = 0, 100.0
 
-# Load data on startup
-drone_df = load_drone_data()
+def candidate_rows(min_people, max_distance):
+    """Loader for recommendation_cache: only the rows compute_recommendations keeps, filtered
+    in place on the (possibly shared) table. They are never older than the version asked for."""
+    def load():
+        return clusters.select(lambda c: (c['No_of_People'] >= min_people) &
+                                         (c['Distance_from_Inventory_km'] <= max_distance))[1]
+    return load
+
+def precompute_defaults():
+    recommendation_cache.precompute(DEFAULT_MIN_PEOPLE, DEFAULT_MAX_DISTANCE, clusters.version,
+                                    candidate_rows(DEFAULT_MIN_PEOPLE, DEFAULT_MAX_DISTANCE))
+
+precompute_defaults()
+
+def publish_cluster_changes(version, upserts, removals):
+    for row in upserts:
+        live_feed.publish('clusters', row['Cluster_ID'], {'version': version, 'op': 'upsert', 'cluster': row})
+    for cid in removals:
+        live_feed.publish('clusters', cid, {'version': version, 'op': 'remove', 'Cluster_ID': cid})
+    # The dashboard's default query is answered from cache on the next poll or push
+    precompute_defaults()
+    if live_feed.subscriber_count:
+        version = clusters.version
+        recs = recommendation_cache.get(DEFAULT_MIN_PEOPLE, DEFAULT_MAX_DISTANCE, version,
+                                        candidate_rows(DEFAULT_MIN_PEOPLE, DEFAULT_MAX_DISTANCE))
+        live_feed.publish('recommendations', 'default', {'version': version, 'recommendations': recs})
 
 @app.route('/api/recommendations', methods=['GET'])
 def get_recommendations():
@@ -49,39 +82,74 @@ def get_recommendations():
         # Get query parameters
         min_people = int(request.args.get('min_people', 0))
         max_distance = float(request.args.get('max_distance', 100))
+        since = request.args.get('since', type=int)
         
-        # Filter clusters based on criteria
-        filtered_df = drone_df[
-            (drone_df['No_of_People'] >= min_people) & 
-            (drone_df['Distance_from_Inventory_km'] <= max_distance)
-        ]
+        version = clusters.version
+        etag = f'"r{version}"'
+        # Unchanged data: answer from the version alone, no recomputation
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return not_modified(etag)
         
-        # Sort by priority (more people, closer distance)
-        filtered_df['priority_score'] = (
-            filtered_df['No_of_People'] / filtered_df['No_of_People'].max() -
-            filtered_df['Distance_from_Inventory_km'] / filtered_df['Distance_from_Inventory_km'].max()
-        )
+        with stage('get_recommendations', 'filter_score_allocate'):
+            recommendations = recommendation_cache.get(min_people, max_distance, version,
+                                                       candidate_rows(min_people, max_distance))
         
-        filtered_df = filtered_df.sort_values('priority_score', ascending=False)
+        if since is not None:
+            previous = recommendation_cache.peek(min_people, max_distance, since)
+            if previous is not None:
+                return jsonify({
+                    'success': True,
+                    'version': version,
+                    'since': since,
+                    'delta': True,
+                    'order': [rec['Cluster_ID'] for rec in recommendations],
+                    **diff_records(previous, recommendations)
+                }), 200, {'ETag': etag}
         
-        # Get top 5 recommendations
-        recommendations = filtered_df.head(5).to_dict('records')
+        return jsonify({
+            'success': True,
+            'version': version,
+            'recommendations': recommendations
+        }), 200, {'ETag': etag}
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/clusters', methods=['GET'])
+def get_clusters():
+    try:
+        since = request.args.get('since', type=int)
+        version = clusters.version
+        etag = f'"c{version}"'
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return not_modified(etag)
         
-        # Calculate resource allocations
-        for rec in recommendations:
-            people = rec['No_of_People']
-            rec['recommended_resources'] = {
-                'Medical Kits': int(people * 0.2),
-                'Food Packets': int(people * 1),
-                'Water Bottles': int(people * 3),
-                'Blankets': int(people * 1),
-                'Emergency Kits': int(people * 0.5)
-            }
+        changes = clusters.changes_since(since) if since is not None else None
+        if changes is not None:
+            # Only the touched rows are copied out of the table
+            _, touched = clusters.select(ids=changes['added'] | changes['changed'])
+            rows = touched.to_dict('records')
+            return jsonify({
+                'success': True,
+                'version': version,
+                'since': since,
+                'delta': True,
+                'added': [r for r in rows if r['Cluster_ID'] in changes['added']],
+                'changed': [r for r in rows if r['Cluster_ID'] in changes['changed']],
+                'removed': sorted(changes['removed'])
+            }), 200, {'ETag': etag}
         
+        # No since, or since is older than the change log: full snapshot
+        version, df = clusters.snapshot()
+        etag = f'"c{version}"'
         return jsonify({
             'success': True,
-            'recommendations': recommendations
-        })
+            'version': version,
+            'clusters': df.to_dict('records')
+        }), 200, {'ETag': etag}
     
     except Exception as e:
         return jsonify({
@@ -89,5 +157,158 @@ def get_recommendations():
             'error': str(e)
         }), 500
 
+def apply_cluster_changes(upserts, removals):
+    version = clusters.upsert(upserts)
+    if removals:
+        version = clusters.remove(removals)
+    publish_cluster_changes(version, upserts, removals)
+    return version
+
+@app.route('/api/clusters', methods=['POST'])
+def update_clusters():
+    """Body: {"upsert": [rows in drone_data.csv schema], "remove": ["C017", ...]}"""
+    try:
+        body = request.get_json(force=True) or {}
+        version = apply_cluster_changes(body.get('upsert', []), body.get('remove', []))
+        return jsonify({'success': True, 'version': version})
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+# Raw person detections -> clusters. State lives in this process, so point all drones at one
+# worker (or run detection_stream.py as the feeder and POST its flushes to /api/clusters).
+detections = DetectionClusterer(
+    eps_m=float(os.getenv('DETECTION_EPS_M', '150')),
+    headcount=os.getenv('DETECTION_HEADCOUNT', 'sum'),
+    ttl_s=float(os.getenv('DETECTION_TTL_S')) if os.getenv('DETECTION_TTL_S') else None,
+)
+REGISTRY.register_collector(stats_collector('detections', detections.stats))
+# The clusterer is not thread-safe and flushes must reach the table in order
+detections_lock = threading.Lock()
+
+@app.route('/api/detections', methods=['POST'])
+def ingest_detections():
+    """Body: {"lat": [...], "lon": [...], "t": optional frame time} or {"detections": [{"lat":, "lon":}, ...]}.
+    Clusters that changed are upserted like POST /api/clusters (IDs D00001...)."""
+    try:
+        body = request.get_json(force=True) or {}
+        if 'detections' in body:
+            lat = [d['lat'] for d in body['detections']]
+            lon = [d['lon'] for d in body['detections']]
+        else:
+            lat, lon = body.get('lat', []), body.get('lon', [])
+        if len(lat) != len(lon):
+            raise ValueError('lat and lon must have the same length')
+        with detections_lock:
+            with stage('detections', 'cluster'):
+                detections.ingest(lat, lon, body.get('t'))
+                upserts, removals = detections.flush(body.get('t'))
+            version = apply_cluster_changes(upserts, removals) if upserts or removals else clusters.version
+        return jsonify({'success': True, 'version': version, 'upserted': len(upserts), 'removed': removals})
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/map/clusters', methods=['GET'])
+def get_map_clusters():
+    """?zoom=12&bbox=west,south,east,north -> one marker per occupied ~32 px cell of the view:
+    centroid, cluster count, headcount sum, max priority (Cluster_ID when count is 1)."""
+    try:
+        zoom = request.args.get('zoom', type=int)
+        if zoom is None:
+            raise ValueError('zoom is required')
+        bbox = parse_bbox(request.args.get('bbox', ''))
+        version = map_tiles.sync(clusters)
+        etag = f'"m{map_tiles.viewport_stamp(zoom, bbox)}"'
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return not_modified(etag)
+        with stage('map_clusters', 'tiles'):
+            _, cells = map_tiles.viewport(zoom, bbox)
+        return jsonify({'success': True, 'version': version, 'zoom': zoom, 'clusters': cells}), 200, {'ETag': etag}
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/map/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+def get_map_tile(z, x, y):
+    """Same markers for one slippy-map tile; the ETag only changes when a cluster inside it does."""
+    try:
+        version = map_tiles.sync(clusters)
+        etag = f'"t{map_tiles.stamp(z, x, y)}"'
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return not_modified(etag)
+        _, cells = map_tiles.tile(z, x, y)
+        return jsonify({'success': True, 'version': version, 'z': z, 'x': x, 'y': y, 'clusters': cells}), 200, {'ETag': etag}
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+
+@app.route('/api/inventory', methods=['GET'])
+def get_inventory():
+    etag = f'"i{inventory.version}"'
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return not_modified(etag)
+    version, body = inventory.json_snapshot()
+    return Response(body, mimetype='application/json', headers={'ETag': f'"i{version}"'})
+
+@app.route('/api/inventory/update', methods=['POST'])
+def update_inventory():
+    try:
+        body = request.get_json(force=True) or {}
+        quantity = int(body['quantity'])
+        if quantity < 0:
+            raise ValueError('quantity must be >= 0')
+        version = inventory.set_quantity(body['item'], quantity)
+        live_feed.publish('inventory', body['item'], {'version': version, 'item': body['item'], 'quantity': quantity})
+        return jsonify({'success': True, 'version': version})
+    
+    except (KeyError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/stream', methods=['GET'])
+def stream():
+    """Server-sent events: clusters, recommendations and inventory changes.
+    ?topics=clusters,inventory limits the feed; ?interval=5 coalesces over a longer window."""
+    topics = request.args.get('topics')
+    try:
+        sub = live_feed.subscribe(
+            topics=topics.split(',') if topics else None,
+            interval=request.args.get('interval', type=float)
+        )
+    except TooManySubscribers as e:
+        return jsonify({'success': False, 'error': str(e)}), 503, {'Retry-After': '10'}
+    # werkzeug exposes the client socket, so a closed tab is noticed within live_feed.poll
+    # seconds instead of at the next keep-alive; other servers fall back to the write failing
+    sock = request.environ.get('werkzeug.socket')
+    disconnected = (lambda: peer_closed(sock)) if sock is not None else None
+    return Response(
+        stream_with_context(live_feed.stream(sub, disconnected)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(REGISTRY.render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.route('/api/metrics/recommendation-cache', methods=['GET'])
+def recommendation_cache_metrics():
+    return jsonify(recommendation_cache.stats())
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    app.run(debug=True, port=5000, threaded=True)
\ No newline at end of file
@@ -0,0 +1,384 @@
+# map_tiles.py
+# Pre-aggregated map markers: clusters binned on a Web-Mercator quadtree aligned with the
+# slippy-map tiles Leaflet requests (z/x/y).
+#
+# A tile at zoom z is split into 2^CELL_BITS x 2^CELL_BITS cells (8x8 = ~32 px each by default);
+# a cell is a quadtree node at zoom z + CELL_BITS and carries cluster count, headcount sum,
+# position sums (for the centroid) and max priority. Coarser cells are the union of their four
+# children, so every level is derived from the same integer cell coordinates by a shift. Above
+# MAX_CLUSTER_ZOOM tiles list the individual clusters.
+#
+# Changes are applied per cluster: its old contribution is subtracted from one cell per level,
+# the new one added, and only the tiles containing the old/new position (one per zoom) are
+# dropped from the tile cache and re-stamped. Stamps are cluster-table versions, so a tile's ETag
+# only changes when something inside it did.
+#
+#   python map_tiles.py --bench 1000000
+import os
+import sys
+import time
+import argparse
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Tuple
+import numpy as np
+
+from allocation import cluster_priority
+
+CELL_BITS = int(os.getenv("MAP_CELL_BITS", "3"))
+MAX_CLUSTER_ZOOM = int(os.getenv("MAP_MAX_CLUSTER_ZOOM", "16"))  # above this, tiles hold raw clusters
+MAX_ZOOM = 20
+TILE_CACHE_SIZE = int(os.getenv("MAP_TILE_CACHE", "4096"))
+MAX_VIEWPORT_TILES = 256
+MAX_LAT = 85.05112878  # Web-Mercator limit
+
+
+def mercator(lat, lon):
+    """(x, y) in [0, 1): fraction of the world width / height from the top-left corner.
+    Accepts scalars or NumPy arrays."""
+    lat = np.clip(lat, -MAX_LAT, MAX_LAT)
+    x = (np.asarray(lon, dtype=float) + 180.0) / 360.0
+    s = np.sin(np.radians(lat))
+    y = 0.5 - np.log((1 + s) / (1 - s)) / (4 * np.pi)
+    return np.clip(x, 0.0, 1 - 1e-12), np.clip(y, 0.0, 1 - 1e-12)
+
+
+def tile_range(zoom: int, west: float, south: float, east: float, north: float) -> Tuple[range, range]:
+    """Tile x / y ranges covering a lat/lon bounding box at a zoom level."""
+    n = 1 << zoom
+    x0, y0 = mercator(north, west)
+    x1, y1 = mercator(south, east)
+    return range(int(x0 * n), int(x1 * n) + 1), range(int(y0 * n), int(y1 * n) + 1)
+
+
+class TileIndex:
+    """Cluster table -> per-zoom cell aggregates + an LRU cache of built tiles.
+
+    sync(table) brings the index up to a ClusterTable's version (incrementally through
+    changes_since, or by a rebuild); tile(z, x, y) and viewport(...) serve from it.
+    """
+
+    def __init__(self, cell_bits: int = CELL_BITS, max_cluster_zoom: int = MAX_CLUSTER_ZOOM,
+                 cache_size: int = TILE_CACHE_SIZE):
+        self.cell_bits = cell_bits
+        self.max_cluster_zoom = max_cluster_zoom
+        self.fine_zoom = max_cluster_zoom + cell_bits
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self.version = -1
+        self._clusters: Dict[str, Tuple[float, float, int, float, float, float]] = {}  # lat, lon, people, priority, mx, my
+        # _levels[z][(cx, cy)] = [count, people, sum_lat, sum_lon, max_priority], cells at zoom z + cell_bits
+        self._levels: List[Dict[Tuple[int, int], List[float]]] = []
+        self._members: Dict[Tuple[int, int], set] = {}  # finest cells -> cluster ids
+        self._tiles: "OrderedDict[Tuple[int, int, int], List[Dict[str, Any]]]" = OrderedDict()
+        self._stamps: Dict[Tuple[int, int, int], int] = {}
+        self._base = 0
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self.applied = 0
+
+    # ---- keeping up with the cluster table ----
+
+    def sync(self, table) -> int:
+        """Catch up with a ClusterTable / SharedClusterTable; returns the version now indexed."""
+        if table.version == self.version:
+            return self.version
+        with self._lock:
+            version = table.version
+            if version == self.version:
+                return version
+            changes = table.changes_since(self.version) if self.version >= 0 else None
+            touched = len(changes["added"]) + len(changes["changed"]) + len(changes["removed"]) if changes else 0
+            if changes is None or touched > max(1000, len(self._clusters) // 4):
+                version, df = table.snapshot()
+                self._rebuild(df, version)
+            else:
+                # Only the touched rows are read. They may already carry writes made after
+                # `version`; those come round again in the next sync's changes_since
+                ids = changes["added"] | changes["changed"]
+                rows = table.select(ids=ids)[1].to_dict("records") if ids else []
+                self._apply(version, rows, changes["removed"])
+            return self.version
+
+    def rebuild(self, df, version: int):
+        with self._lock:
+            self._rebuild(df, version)
+
+    def apply(self, version: int, upserts: Iterable[Dict[str, Any]], removals: Iterable[str]):
+        """Apply one upsert/remove batch (drone_data.csv-schema rows) tagged with its table version."""
+        with self._lock:
+            self._apply(version, upserts, removals)
+
+    def _rebuild(self, df, version: int):
+        ids = df["Cluster_ID"].astype(str).to_numpy()
+        lat = df["Latitude"].to_numpy(dtype=float)
+        lon = df["Longitude"].to_numpy(dtype=float)
+        people = df["No_of_People"].to_numpy(dtype=np.int64)
+        prio = cluster_priority(people, df["Distance_from_Inventory_km"].to_numpy(dtype=float))
+        mx, my = mercator(lat, lon)
+        fx = (mx * (1 << self.fine_zoom)).astype(np.int64)
+        fy = (my * (1 << self.fine_zoom)).astype(np.int64)
+        self._clusters = dict(zip(ids.tolist(), zip(lat.tolist(), lon.tolist(), people.tolist(), prio.tolist(),
+                                                     mx.tolist(), my.tolist())))
+        self._levels = []
+        for z in range(self.max_cluster_zoom + 1):
+            shift = self.max_cluster_zoom - z
+            cells = (fx >> shift) << 32 | (fy >> shift)
+            keys, inv = np.unique(cells, return_inverse=True)
+            inv = inv.ravel()
+            peak = np.full(len(keys), -np.inf)
+            np.maximum.at(peak, inv, prio)
+            aggs = zip(np.bincount(inv).tolist(), np.bincount(inv, people).tolist(),
+                       np.bincount(inv, lat).tolist(), np.bincount(inv, lon).tolist(), peak.tolist())
+            self._levels.append({(k >> 32, k & 0xFFFFFFFF): list(a) for k, a in zip(keys.tolist(), aggs)})
+        self._members = {}
+        for cid, cx, cy in zip(ids.tolist(), fx.tolist(), fy.tolist()):
+            self._members.setdefault((cx, cy), set()).add(cid)
+        self._tiles.clear()
+        self._stamps.clear()
+        self._base = self.version = version
+        self.rebuilds += 1
+
+    def _apply(self, version: int, upserts: Iterable[Dict[str, Any]], removals: Iterable[str]):
+        for cid in removals:
+            self._remove(str(cid), version)
+        for row in upserts:
+            cid = str(row["Cluster_ID"])
+            lat, lon = float(row["Latitude"]), float(row["Longitude"])
+            people = int(row["No_of_People"])
+            prio = float(cluster_priority(people, float(row["Distance_from_Inventory_km"])))
+            old = self._clusters.get(cid)
+            if old is not None and old[:4] == (lat, lon, people, prio):
+                continue
+            self._remove(cid, version)
+            self._add(cid, lat, lon, people, prio, version)
+        self.version = max(self.version, version)
+        if len(self._stamps) > 16 * self.cache_size:
+            # Bound the stamp map; tiles stamped before now just get one spurious ETag change
+            self._stamps.clear()
+            self._base = self.version
+
+    def _fine(self, mx: float, my: float) -> Tuple[int, int]:
+        return int(mx * (1 << self.fine_zoom)), int(my * (1 << self.fine_zoom))
+
+    def _add(self, cid: str, lat: float, lon: float, people: int, prio: float, version: int):
+        mx, my = (float(v) for v in mercator(lat, lon))
+        self._clusters[cid] = (lat, lon, people, prio, mx, my)
+        fx, fy = self._fine(mx, my)
+        self._members.setdefault((fx, fy), set()).add(cid)
+        for z, level in enumerate(self._levels):
+            shift = self.max_cluster_zoom - z
+            agg = level.get((fx >> shift, fy >> shift))
+            if agg is None:
+                level[(fx >> shift, fy >> shift)] = [1, people, lat, lon, prio]
+            else:
+                agg[0] += 1
+                agg[1] += people
+                agg[2] += lat
+                agg[3] += lon
+                agg[4] = max(agg[4], prio)
+        self._invalidate(mx, my, version)
+        self.applied += 1
+
+    def _remove(self, cid: str, version: int):
+        old = self._clusters.pop(cid, None)
+        if old is None:
+            return
+        lat, lon, people, prio, mx, my = old
+        fx, fy = self._fine(mx, my)
+        members = self._members[(fx, fy)]
+        members.discard(cid)
+        if not members:
+            del self._members[(fx, fy)]
+        # Bottom-up so a coarser cell's max can be rebuilt from its (already fixed) children
+        for z in range(self.max_cluster_zoom, -1, -1):
+            level = self._levels[z]
+            shift = self.max_cluster_zoom - z
+            key = (fx >> shift, fy >> shift)
+            agg = level[key]
+            agg[0] -= 1
+            if agg[0] == 0:
+                del level[key]
+                continue
+            agg[1] -= people
+            agg[2] -= lat
+            agg[3] -= lon
+            if prio >= agg[4]:
+                agg[4] = self._max_below(z, key)
+        self._invalidate(mx, my, version)
+        self.applied += 1
+
+    def _max_below(self, z: int, key: Tuple[int, int]) -> float:
+        if z == self.max_cluster_zoom:
+            return max(self._clusters[c][3] for c in self._members[key])
+        finer = self._levels[z + 1]
+        cx, cy = key
+        return max(finer[k][4] for k in ((2 * cx, 2 * cy), (2 * cx + 1, 2 * cy), (2 * cx, 2 * cy + 1),
+                                         (2 * cx + 1, 2 * cy + 1)) if k in finer)
+
+    def _invalidate(self, mx: float, my: float, version: int):
+        for z in range(MAX_ZOOM + 1):
+            t = (z, int(mx * (1 << z)), int(my * (1 << z)))
+            self._tiles.pop(t, None)
+            self._stamps[t] = version
+
+    # ---- serving ----
+
+    def stamp(self, z: int, x: int, y: int) -> int:
+        """Table version of the last change inside tile z/x/y (its ETag)."""
+        return self._stamps.get((z, x, y), self._base)
+
+    def tile(self, z: int, x: int, y: int) -> Tuple[int, List[Dict[str, Any]]]:
+        """(stamp, cells) for one tile. Cells: lat/lon centroid, count, people, max_priority,
+        plus Cluster_ID when the cell holds a single cluster."""
+        if not (0 <= z <= MAX_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)):
+            raise ValueError(f"no tile {z}/{x}/{y}")
+        key = (z, x, y)
+        with self._lock:
+            cells = self._tiles.get(key)
+            if cells is not None:
+                self._tiles.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+                cells = self._build(z, x, y) if z <= self.max_cluster_zoom else self._raw(z, x, y)
+                self._tiles[key] = cells
+                if len(self._tiles) > self.cache_size:
+                    self._tiles.popitem(last=False)
+            return self.stamp(z, x, y), cells
+
+    def _build(self, z: int, x: int, y: int) -> List[Dict[str, Any]]:
+        level = self._levels[z] if self._levels else {}
+        bits = self.cell_bits
+        cells = []
+        for i in range(1 << bits):
+            for j in range(1 << bits):
+                key = ((x << bits) | i, (y << bits) | j)
+                agg = level.get(key)
+                if agg is None:
+                    continue
+                count = agg[0]
+                cell = {"lat": round(agg[2] / count, 6), "lon": round(agg[3] / count, 6), "count": count,
+                        "people": int(agg[1]), "max_priority": round(agg[4], 3)}
+                if count == 1:
+                    cell["Cluster_ID"] = self._single(z, key)
+                cells.append(cell)
+        return cells
+
+    def _single(self, z: int, key: Tuple[int, int]) -> str:
+        # A one-cluster cell has exactly one non-empty child per level down to the members map
+        cx, cy = key
+        for finer in self._levels[z + 1:]:
+            cx, cy = next(k for k in ((2 * cx, 2 * cy), (2 * cx + 1, 2 * cy), (2 * cx, 2 * cy + 1),
+                                      (2 * cx + 1, 2 * cy + 1)) if k in finer)
+        return next(iter(self._members[(cx, cy)]))
+
+    def _raw(self, z: int, x: int, y: int) -> List[Dict[str, Any]]:
+        if z <= self.fine_zoom:
+            span = 1 << (self.fine_zoom - z)
+            keys = [(cx, cy) for cx in range(x * span, (x + 1) * span) for cy in range(y * span, (y + 1) * span)]
+        else:
+            shift = z - self.fine_zoom
+            keys = [(x >> shift, y >> shift)]
+        n = 1 << z
+        cells = []
+        for key in keys:
+            for cid in self._members.get(key, ()):
+                lat, lon, people, prio, mx, my = self._clusters[cid]
+                if int(mx * n) == x and int(my * n) == y:
+                    cells.append({"lat": lat, "lon": lon, "count": 1, "people": people,
+                                  "max_priority": round(prio, 3), "Cluster_ID": cid})
+        return cells
+
+    def viewport_tiles(self, zoom: int, bbox: Tuple[float, float, float, float]) -> List[Tuple[int, int, int]]:
+        xs, ys = tile_range(zoom, *bbox)
+        if len(xs) * len(ys) > MAX_VIEWPORT_TILES:
+            raise ValueError(f"bbox spans {len(xs) * len(ys)} tiles at zoom {zoom} (max {MAX_VIEWPORT_TILES})")
+        return [(zoom, x, y) for x in xs for y in ys]
+
+    def viewport(self, zoom: int, bbox: Tuple[float, float, float, float]) -> Tuple[int, List[Dict[str, Any]]]:
+        """(newest stamp among the covering tiles, cells inside bbox = west, south, east, north)."""
+        west, south, east, north = bbox
+        stamp, cells = self._base, []
+        for t in self.viewport_tiles(zoom, bbox):
+            s, tile_cells = self.tile(*t)
+            stamp = max(stamp, s)
+            cells.extend(c for c in tile_cells if south <= c["lat"] <= north and west <= c["lon"] <= east)
+        return stamp, cells
+
+    def viewport_stamp(self, zoom: int, bbox: Tuple[float, float, float, float]) -> int:
+        return max([self._base] + [self.stamp(*t) for t in self.viewport_tiles(zoom, bbox)])
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "version": self.version,
+            "clusters": len(self._clusters),
+            "cells": sum(len(level) for level in self._levels),
+            "cached_tiles": len(self._tiles),
+            "hits": self.hits,
+            "misses": self.misses,
+            "rebuilds": self.rebuilds,
+            "applied": self.applied,
+        }
+
+
+def parse_bbox(text: str) -> Tuple[float, float, float, float]:
+    """"west,south,east,north" (Leaflet's LatLngBounds.toBBoxString order)."""
+    parts = [float(v) for v in text.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox must be west,south,east,north")
+    west, south, east, north = parts
+    if west > east or south > north:
+        raise ValueError("bbox must be west,south,east,north with west <= east and south <= north")
+    return west, south, east, north
+
+
+def _bench(n_people: int, zoom_levels=(8, 11, 13, 15, 17)):
+    from cluster_store import ClusterTable
+    from synthetic_data import synth_clusters, PEOPLE_RANGE
+    n = max(1, n_people * 2 // sum(PEOPLE_RANGE))  # ~n_people detected in total
+    table = ClusterTable(synth_clusters(n, seed=0))
+    index = TileIndex()
+    t0 = time.perf_counter()
+    index.sync(table)
+    print(f"{n:,} clusters / {int(table.df['No_of_People'].sum()):,} people: index built in "
+          f"{time.perf_counter() - t0:.2f}s, {index.stats()['cells']:,} cells over {index.max_cluster_zoom + 1} zooms")
+    # ~1280x800 px viewport centred on the synthetic area
+    for z in zoom_levels:
+        half_w, half_h = 2.5 * 360 / (1 << z), 1.5 * 360 / (1 << z)
+        bbox = (73.5 - half_w, 18.5 - half_h, 73.5 + half_w, 18.5 + half_h)
+        t0 = time.perf_counter()
+        _, cells = index.viewport(z, bbox)
+        cold = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        index.viewport(z, bbox)
+        warm = time.perf_counter() - t0
+        raw = int(((table.df["Longitude"].between(bbox[0], bbox[2])) & (table.df["Latitude"].between(bbox[1], bbox[3]))).sum())
+        print(f"  zoom {z:>2}: {len(cells):>6,} markers (vs {raw:>7,} clusters in view), "
+              f"cold {cold * 1000:7.1f} ms, cached {warm * 1000:6.2f} ms")
+    # Incremental: move / grow / drop 1000 clusters through the table's change log
+    rng = np.random.default_rng(1)
+    picked = table.df.sample(1000, random_state=1)
+    moved = picked.assign(No_of_People=picked["No_of_People"] + rng.integers(1, 10, len(picked)),
+                          Latitude=picked["Latitude"] + rng.normal(0, 0.001, len(picked)))
+    table.upsert(moved.to_dict("records"))
+    table.remove(picked["Cluster_ID"].head(100).tolist())
+    t0 = time.perf_counter()
+    index.sync(table)
+    elapsed = time.perf_counter() - t0
+    print(f"  1000 upserts + 100 removals applied in {elapsed * 1000:.1f} ms "
+          f"({elapsed / 1100 * 1e6:.0f} us per change); {index.stats()}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Map tile aggregation over drone_data.csv clusters")
+    ap.add_argument("--bench", type=int, metavar="PEOPLE", default=1_000_000,
+                    help="time build / viewport / incremental update for ~PEOPLE detected people")
+    args = ap.parse_args(argv)
+    _bench(args.bench)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+# metrics.py
+import os
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# METRICS_ENABLED=0 turns every timer into a shared no-op context (counters still count)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+# HDR-style log-linear buckets over integer microseconds: values < 2**SUB_BITS get exact
+# buckets, above that every power of two is split into 2**SUB_BITS linear sub-buckets,
+# so any recorded latency is off by at most 1/16 (6.25%) whatever its magnitude.
+SUB_BITS = 4
+_SUB = 1 << SUB_BITS
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+_NOOP = nullcontext()
+
+
+def _bucket_index(us: int) -> int:
+    if us < _SUB:
+        return us
+    shift = us.bit_length() - SUB_BITS - 1
+    return _SUB * (shift + 1) + ((us >> shift) - _SUB)
+
+
+def _bucket_bounds(idx: int) -> Tuple[int, int]:
+    if idx < _SUB:
+        return idx, idx
+    shift = idx // _SUB - 1
+    mantissa = _SUB + idx % _SUB
+    return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+
+def _labels_text(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class LatencyHistogram:
+    """Sparse HDR-style histogram of durations (recorded in seconds, stored in microseconds)."""
+
+    def __init__(self):
+        self._counts: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        idx = _bucket_index(max(0, int(seconds * 1e6)))
+        with self._lock:
+            self._counts[idx] = self._counts.get(idx, 0) + 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target = q * self.count
+            seen = 0
+            for idx in sorted(self._counts):
+                seen += self._counts[idx]
+                if seen >= target:
+                    lo, hi = _bucket_bounds(idx)
+                    return (lo + hi) / 2 / 1e6
+            return self.max
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n: int = 1):
+        with self._lock:
+            self.value += n
+
+
+class _Family:
+    def __init__(self, name: str, kind: str, help_text: str, factory):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self._factory = factory
+        self._children: Dict[Tuple[Tuple[str, str], ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._factory())
+        return child
+
+    def items(self):
+        with self._lock:
+            return list(self._children.items())
+
+
+class Registry:
+    def __init__(self):
+        self._families: Dict[str, _Family] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, str], float]]]] = []
+        self._lock = threading.Lock()
+
+    def _family(self, name: str, kind: str, help_text: str, factory) -> _Family:
+        with self._lock:
+            fam = self._families.get(name)
+            if fam is None:
+                fam = self._families[name] = _Family(name, kind, help_text, factory)
+            return fam
+
+    def counter(self, name: str, help_text: str = "") -> _Family:
+        return self._family(name, "counter", help_text, Counter)
+
+    def histogram(self, name: str, help_text: str = "") -> _Family:
+        return self._family(name, "summary", help_text, LatencyHistogram)
+
+    def register_collector(self, fn: Callable[[], Iterable[Tuple[str, str, str, Dict[str, str], float]]]):
+        """fn() yields (name, type, help, labels, value) at scrape time, e.g. cache hit counters."""
+        with self._lock:
+            self._collectors.append(fn)
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            families = list(self._families.values())
+            collectors = list(self._collectors)
+        for fam in families:
+            lines.append(f"# HELP {fam.name} {fam.help}")
+            lines.append(f"# TYPE {fam.name} {fam.kind}")
+            for labels, child in fam.items():
+                if isinstance(child, Counter):
+                    lines.append(f"{fam.name}{_labels_text(labels)} {child.value}")
+                    continue
+                for q in QUANTILES:
+                    lines.append(f"{fam.name}{_labels_text(labels + (('quantile', str(q)),))} {child.quantile(q):.6f}")
+                lines.append(f"{fam.name}_sum{_labels_text(labels)} {child.sum:.6f}")
+                lines.append(f"{fam.name}_count{_labels_text(labels)} {child.count}")
+        seen = set()
+        for collect in collectors:
+            for name, kind, help_text, labels, value in collect():
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{_labels_text(tuple(sorted(labels.items())))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.histogram("stage_seconds", "Wall time per pipeline stage")
+LLM_FALLBACKS = REGISTRY.counter("rag_llm_fallbacks_total", "recommend_aid answers built by _create_fallback_recommendations")
+PARSE_FAILURES = REGISTRY.counter("rag_parse_failures_total", "LLM responses with no parseable JSON")
+LLM_ERRORS = REGISTRY.counter("rag_llm_errors_total", "Remote LLM calls that failed, by reason (status code, connect, timeout)")
+LLM_TOKENS = REGISTRY.counter("rag_llm_tokens_total", "Local LLM tokens by kind (prompt, forced, generated)")
+LLM_CPU_SECONDS = REGISTRY.counter("rag_llm_cpu_seconds_total", "Process CPU time spent in local LLM decoding")
+
+
+@contextmanager
+def _timed(hist: LatencyHistogram):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        hist.record(time.perf_counter() - t0)
+
+
+def stage(component: str, name: str):
+    """with stage("recommend_aid", "encode"): ...  -- a no-op context when metrics are disabled."""
+    if not METRICS_ENABLED:
+        return _NOOP
+    return _timed(STAGE_SECONDS.labels(component=component, stage=name))
+
+
+# stats() keys with these endings only ever grow; they are exported as counters
+COUNTER_SUFFIXES = ("hits", "misses", "evictions", "total")
+
+
+def stats_collector(metric_prefix: str, stats_fn: Callable[[], Dict[str, float]], labels: Optional[Dict[str, str]] = None,
+                    counters: Iterable[str] = ()):
+    """Adapts a stats() dict (EmbeddingCache, RecommendationCache, ...) into samples.
+
+    Keys ending in COUNTER_SUFFIXES, plus any listed in `counters`, become `counter`
+    samples named <prefix>_<key>_total; everything else is a gauge.
+    """
+    labels = labels or {}
+    counters = frozenset(counters)
+
+    def collect():
+        for key, value in stats_fn().items():
+            if not isinstance(value, (int, float)):
+                continue
+            if key in counters or key.endswith(COUNTER_SUFFIXES):
+                name = f"{metric_prefix}_{key}" if key.endswith("total") else f"{metric_prefix}_{key}_total"
+                yield name, "counter", f"{metric_prefix} {key}", labels, value
+            else:
+                yield f"{metric_prefix}_{key}", "gauge", f"{metric_prefix} {key}", labels, value
+    return collect
@@ -0,0 +1,244 @@
+# mock_llm.py
+# Offline stand-in for the Hugging Face Inference API used by raag2.py and /plan.
+# Same protocol: POST {"inputs": prompt, "parameters": {...}} -> [{"generated_text": ...}]
+# (or a TGI-style SSE token stream when "stream": true).
+#
+#   python mock_llm.py --port 8081 --latency lognormal:800,0.5 --error-rate 0.02 --seed 7
+#   PLANNER_LLM_URL=http://127.0.0.1:8081/models/mock uvicorn api:app   (checked by test_plan_mock_llm.py)
+#   HF_API_URL=http://127.0.0.1:8081/models/mock python raag2.py
+#
+# Answers are built from the prompt itself: planner prompts (planner_prompt.USER_TEMPLATE) get a
+# schema-valid Plan within the inventory snapshot, raag*.py prompts get an {item: qty} object.
+import re
+import io
+import csv
+import json
+import asyncio
+import argparse
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from allocation import RESOURCES_PER_PERSON
+from planner_prompt import Plan
+
+LATENCY_KINDS = ("fixed", "uniform", "lognormal", "exp")
+
+
+class LatencyModel:
+    """"fixed:ms", "uniform:lo_ms,hi_ms", "lognormal:median_ms,sigma" or "exp:mean_ms"."""
+
+    def __init__(self, spec: str = "fixed:0"):
+        kind, _, args = spec.partition(":")
+        if kind not in LATENCY_KINDS:
+            raise ValueError(f"Unknown latency kind '{kind}', expected one of {LATENCY_KINDS}")
+        self.kind = kind
+        self.args = [float(a) for a in args.split(",") if a]
+
+    def sample_ms(self, rng: np.random.Generator) -> float:
+        if self.kind == "fixed":
+            return self.args[0] if self.args else 0.0
+        if self.kind == "uniform":
+            return float(rng.uniform(self.args[0], self.args[1]))
+        if self.kind == "lognormal":
+            return float(self.args[0] * np.exp(rng.normal(0.0, self.args[1])))
+        return float(rng.exponential(self.args[0]))
+
+
+class MockConfig:
+    def __init__(self, latency: str = "fixed:0", error_rate: float = 0.0, error_status: int = 503,
+                 token_ms: float = 5.0, malformed_rate: float = 0.0, seed: int = 0):
+        self.latency = LatencyModel(latency)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.token_ms = token_ms
+        # Fraction of answers returned as truncated JSON, to exercise parse failure / fallback paths
+        self.malformed_rate = malformed_rate
+        self.seed = seed
+
+
+# ---- Prompt parsing ----
+
+_INV_LINE = re.compile(r"^- (?P<name>.+?) \(Available: (?P<avail>\d+)(?:, Estimated Need: (?P<need>\d+))?")
+_CTX_HEADER = re.compile(r"^\[id=(?P<id>[^\]]*)\] \[index=(?P<index>[^\]]*)\] \[created_at=(?P<created>[^\]]*)\]")
+_CLUSTER = re.compile(r"Cluster(?: ID:)?\s*(?P<cid>C\d+)\D+?(?P<people>\d+)\s*people|Cluster ID: (?P<cid2>C\d+)\s+People: (?P<people2>\d+)")
+
+
+def _section(prompt: str, start: str, end: Optional[str]) -> str:
+    i = prompt.find(start)
+    if i == -1:
+        return ""
+    i += len(start)
+    j = prompt.find(end, i) if end else -1
+    return prompt[i:j if j != -1 else None].strip()
+
+
+def parse_planner_prompt(prompt: str) -> Tuple[Dict[str, int], List[Dict[str, Any]]]:
+    """Inventory {Resource: Quantity} and context blocks [{id, index, created_at, text}]."""
+    inv_csv = _section(prompt, "Inventory snapshot (CSV rows):", "Top-K retrieved context")
+    inventory = {}
+    for row in csv.DictReader(io.StringIO(inv_csv)):
+        try:
+            inventory[row["Resource"]] = int(float(row["Quantity"]))
+        except (KeyError, TypeError, ValueError):
+            continue
+    ctx = _section(prompt, "Top-K retrieved context (include meta.id/index/created_at):", None)
+    blocks = []
+    for chunk in ctx.split("\n\n"):
+        lines = chunk.strip().split("\n", 1)
+        m = _CTX_HEADER.match(lines[0])
+        if m:
+            blocks.append({"id": m["id"], "index": m["index"], "created_at": m["created"],
+                           "text": lines[1] if len(lines) > 1 else ""})
+    return inventory, blocks
+
+
+def build_plan(prompt: str, rng: np.random.Generator) -> Dict[str, Any]:
+    inventory, blocks = parse_planner_prompt(prompt)
+    clusters = []
+    for b in blocks:
+        m = _CLUSTER.search(b["text"])
+        if m:
+            clusters.append((m["cid"] or m["cid2"], int(m["people"] or m["people2"])))
+    max_people = max((p for _, p in clusters), default=1)
+    remaining = dict(inventory)
+    unmet: Dict[str, int] = {}
+    allocations = []
+    for cid, people in sorted(clusters, key=lambda c: -c[1]):
+        items = []
+        for name, ratio in RESOURCES_PER_PERSON.items():
+            need = int(people * ratio)
+            if name not in remaining or need <= 0:
+                continue
+            give = min(need, remaining[name])
+            remaining[name] -= give
+            if give:
+                items.append({"item": name, "qty": give})
+            if need > give:
+                unmet[name] = unmet.get(name, 0) + need - give
+        allocations.append({
+            "cluster_id": cid,
+            "priority": round(people / max_people, 3),
+            "items": items,
+            "assigned_team": f"BoatTeam-{int(rng.integers(1, 6))}",
+            "route": None,
+            "eta_minutes": int(rng.integers(15, 180)),
+        })
+    plan = {
+        "objective": "Deliver relief to the most affected clusters within stock limits.",
+        "assumptions": ["Generated by mock_llm from the prompt context."],
+        "constraints": [{"type": "time", "max_minutes": 360}],
+        "allocations": allocations,
+        "unmet_demand": [{"item": k, "qty": v} for k, v in unmet.items()],
+        "source_attributions": [{"source": f"{b['index']}:{b['id']}", "timestamp": b["created_at"] or None} for b in blocks],
+        "summary": f"{len(allocations)} clusters served from {len(inventory)} inventory lines.",
+    }
+    return Plan.model_validate(plan).model_dump()
+
+
+def build_item_answer(prompt: str) -> Dict[str, int]:
+    answer = {}
+    for line in prompt.splitlines():
+        m = _INV_LINE.match(line.strip())
+        if m:
+            avail = int(m["avail"])
+            need = int(m["need"]) if m["need"] else max(1, avail // 10)
+            if min(need, avail) > 0:
+                answer[m["name"]] = min(need, avail)
+    return answer
+
+
+def generate(prompt: str, rng: np.random.Generator, malformed: bool = False) -> str:
+    if "Inventory snapshot (CSV rows):" in prompt:
+        text = json.dumps(build_plan(prompt, rng))
+    else:
+        text = json.dumps(build_item_answer(prompt))
+    if malformed:
+        text = text[: max(1, len(text) // 2)]
+    return text
+
+
+# ---- Server ----
+
+def create_app(config: MockConfig) -> FastAPI:
+    app = FastAPI()
+    lock = threading.Lock()
+    state = {"requests": 0, "errors": 0, "streams": 0, "malformed": 0}
+
+    def request_rng() -> np.random.Generator:
+        # Request n always gets the same draws for a given --seed, whatever the concurrency
+        with lock:
+            n = state["requests"]
+            state["requests"] += 1
+        return np.random.default_rng([config.seed, n])
+
+    async def infer(request: Request, model: str = "mock"):
+        payload = await request.json()
+        prompt = payload.get("inputs", "")
+        params = payload.get("parameters") or {}
+        rng = request_rng()
+        await asyncio.sleep(config.latency.sample_ms(rng) / 1000.0)
+
+        if rng.uniform() < config.error_rate:
+            with lock:
+                state["errors"] += 1
+            return JSONResponse({"error": f"Model {model} is currently loading", "estimated_time": 20.0},
+                                status_code=config.error_status)
+
+        malformed = rng.uniform() < config.malformed_rate
+        if malformed:
+            with lock:
+                state["malformed"] += 1
+        text = generate(prompt, rng, malformed)
+        # The real API echoes the prompt unless told otherwise; llm_client sends return_full_text=false
+        full = prompt + text if params.get("return_full_text", True) else text
+
+        if payload.get("stream") or params.get("stream"):
+            with lock:
+                state["streams"] += 1
+            return StreamingResponse(_stream(text, full, config.token_ms), media_type="text/event-stream")
+        return [{"generated_text": full}]
+
+    app.post("/")(infer)
+    app.post("/models/{model:path}")(infer)
+
+    @app.get("/stats")
+    async def stats():
+        with lock:
+            return dict(state)
+
+    return app
+
+
+async def _stream(text: str, full: str, token_ms: float):
+    # TGI-style frames: one per token, the last one also carries generated_text
+    tokens = re.findall(r"\s*\S+", text) or [text]
+    for i, tok in enumerate(tokens):
+        await asyncio.sleep(token_ms / 1000.0)
+        last = i == len(tokens) - 1
+        frame = {"token": {"id": i, "text": tok, "logprob": 0.0, "special": False},
+                 "generated_text": full if last else None, "details": None}
+        yield f"data:{json.dumps(frame)}\n\n"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline mock of the HF Inference API")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--latency", default="fixed:0", help="fixed:ms | uniform:lo,hi | lognormal:median_ms,sigma | exp:mean_ms")
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--error-status", type=int, default=503)
+    ap.add_argument("--malformed-rate", type=float, default=0.0)
+    ap.add_argument("--token-ms", type=float, default=5.0, help="per-token delay when streaming")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    import uvicorn
+    config = MockConfig(args.latency, args.error_rate, args.error_status, args.token_ms, args.malformed_rate, args.seed)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
 # planner_prompt.py
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Mapping
+import re
 import json
 from datetime import datetime
-from pydantic import BaseModel, ValidationError, Field
+from pydantic import BaseModel, ValidationError, ValidationInfo, Field, model_validator
 
 # ---- Strict JSON schema (Pydantic) ----
 class ItemQty(BaseModel):
@@ -37,6 +38,21 @@ class Plan(BaseModel):
     source_attributions: List[Attribution]
     summary: str
 
+    @model_validator(mode="after")
+    def _within_stock(self, info: ValidationInfo):
+        # Only when validate_plan_json passes context={"stock": {...}}; plain validation is unchanged
+        stock = (info.context or {}).get("stock")
+        if stock is None:
+            return self
+        totals: Dict[str, int] = {}
+        for alloc in self.allocations:
+            for it in alloc.items:
+                totals[it.item] = totals.get(it.item, 0) + it.qty
+        over = [f"{item} {qty} > {stock.get(item, 0)}" for item, qty in totals.items() if qty > stock.get(item, 0)]
+        if over:
+            raise ValueError("allocations exceed inventory: " + ", ".join(over))
+        return self
+
 # ---- Prompts ----
 PLAN_SCHEMA_SNIPPET = {
   "objective": "string",
@@ -80,15 +96,17 @@ Top-K retrieved context (include meta.id/index/created_at):
 
 # ---- Helper to build the final prompt inputs ----
 def render_planner_prompt(inventory_df, retrieved_docs: List[Dict[str, Any]], user_query: str,
-                          time_window: str = "last 6 hours") -> Dict[str, str]:
-    inv_csv = inventory_df.to_csv(index=False)
+                          time_window: str = "last 6 hours", max_context: int | None = 10) -> Dict[str, str]:
+    # InventorySnapshot keeps the CSV rendered per stock version; plain DataFrames render each call
+    inv_csv = inventory_df.csv_text() if hasattr(inventory_df, "csv_text") else inventory_df.to_csv(index=False)
     ctx_lines = []
     for d in retrieved_docs:
         meta = d.get("meta", {}) or {k: d.get(k) for k in ("id","index","created_at")}
         ctx_lines.append(
             f"[id={meta.get('id')}] [index={meta.get('index')}] [created_at={meta.get('created_at')}]\n{d.get('text') or d.get('content')}"
         )
-    context_blocks = "\n\n".join(ctx_lines[:10])
+    # Fan-out retrieval already caps each kind, so callers pass max_context=None to keep them all
+    context_blocks = "\n\n".join(ctx_lines[:max_context])
     prompt = USER_TEMPLATE.format(
         user_query=user_query,
         time_window=time_window,
@@ -98,17 +116,111 @@ def render_planner_prompt(inventory_df, retrieved_docs: List[Dict[str, Any]], us
     return {"system": SYSTEM_PROMPT, "user": prompt}
 
 # ---- JSON validation for the LLM output ----
-def validate_plan_json(raw_text: str) -> Plan:
-    """Extract JSON from raw_text (if the model wrapped it) and validate against Plan schema."""
+# Repair is for the usual model slips (truncated output, trailing commas, single quotes,
+# Python literals), not for arbitrary text: past this many edits the output is rejected.
+MAX_REPAIR_EDITS = 64
+
+_DQ_STRING = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+# Everything repair leaves alone (complete strings, numbers, brackets, ordinary commas) is
+# matched as one run by the regex engine; only the slips below reach the Python loop.
+_REPAIR_TOKEN = re.compile(
+    rf"(?P<inert>(?:{_DQ_STRING}|[^\"',A-Za-z_]+|,(?!\s*[}}\]]))+)"
+    r'|(?P<dq_open>"[^"\\]*(?:\\.[^"\\]*)*)\\?$'
+    r"|'(?P<sq_body>[^'\\]*(?:\\.[^'\\]*)*)'?"
+    r"|(?P<comma>,)|[A-Za-z_]+"
+)
+_STRINGS = re.compile(_DQ_STRING)
+_BRACKETS = re.compile(r"[{}\[\]]")
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def repair_json(text: str, max_edits: int = MAX_REPAIR_EDITS) -> str:
+    """Linear-time fix-up of common LLM JSON slips; raises ValueError past max_edits."""
+    out: List[str] = []
+    edits = 0
+    for m in _REPAIR_TOKEN.finditer(text):
+        tok = m.group()
+        if m.group("inert") is not None:
+            out.append(tok)
+            continue
+        if m.group("dq_open") is not None:
+            out.append(m.group("dq_open") + '"')  # string cut off by truncation
+        elif m.group("sq_body") is not None:
+            out.append('"' + m.group("sq_body").replace("\\'", "'").replace('"', '\\"') + '"')
+        elif m.group("comma") is not None:
+            pass  # trailing comma before a closer, dropped
+        elif tok in _LITERALS:
+            out.append(_LITERALS[tok])
+        else:
+            out.append(tok)
+            continue
+        edits += 1
+        if edits > max_edits:
+            raise ValueError(f"LLM output needs more than {max_edits} JSON repairs")
+    fixed = "".join(out)
+
+    # Truncated output: finish the last value and close whatever is still open
+    stack: List[str] = []
+    for b in _BRACKETS.findall(_STRINGS.sub("", fixed)):
+        if b in _CLOSERS:
+            stack.append(b)
+        elif stack:
+            stack.pop()
+    if stack:
+        fixed = fixed.rstrip()
+        if fixed.endswith(","):
+            fixed = fixed[:-1]
+        if fixed.endswith(":"):
+            fixed += " null"
+        fixed += "".join(_CLOSERS[o] for o in reversed(stack))
+        edits += len(stack)
+    if edits > max_edits:
+        raise ValueError(f"LLM output needs more than {max_edits} JSON repairs")
+    return fixed
+
+
+def stock_levels(inventory) -> Dict[str, int]:
+    """{Resource: Quantity} from a mapping, an InventorySnapshot or an inventory DataFrame."""
+    if isinstance(inventory, Mapping):
+        return dict(inventory)
+    df = inventory.df if hasattr(inventory, "csv_text") else inventory
+    return dict(zip(df["Resource"], df["Quantity"].astype(int)))
+
+
+def _is_syntax_error(e: ValidationError) -> bool:
+    return any(err["type"] == "json_invalid" for err in e.errors())
+
+
+def validate_plan_json(raw_text: str, inventory=None, repair: bool = True,
+                       max_repair_edits: int = MAX_REPAIR_EDITS) -> Plan:
+    """Extract JSON from raw_text (if the model wrapped it) and validate against Plan schema.
+
+    The span is parsed and validated straight from the string by pydantic-core (no
+    intermediate dicts). Only if that fails on JSON syntax is repair_json tried. With
+    inventory given, allocation totals are checked against stock in the same validation.
+    """
     start = raw_text.find("{")
     end = raw_text.rfind("}")
-    if start == -1 or end == -1:
+    if start == -1:
         raise ValueError("No JSON object found in LLM output")
-    obj = json.loads(raw_text[start:end+1])
+    span = raw_text[start:end + 1] if end > start else raw_text[start:]
+    context = {"stock": stock_levels(inventory)} if inventory is not None else None
     try:
-        return Plan.model_validate(obj)
+        return Plan.model_validate_json(span, context=context)
     except ValidationError as e:
-        raise ValueError(f"Plan JSON failed validation: {e}")
+        if not (repair and _is_syntax_error(e)):
+            raise ValueError(f"Plan JSON failed validation: {e}")
+        error = e
+
+    # Wrapped output repairs cleanly from the span; truncated output needs everything after "{"
+    tail = raw_text[start:]
+    for candidate in (span, tail) if tail.rstrip() != span else (span,):
+        try:
+            return Plan.model_validate_json(repair_json(candidate, max_repair_edits), context=context)
+        except ValidationError as e:
+            error = e
+    raise ValueError(f"Plan JSON failed validation: {error}")
 
 # ---- Example usage (pseudo LLM call) ----
 if __name__ == "__main__":
@@ -0,0 +1,161 @@
+# prefix_cache.py
+# Key/value cache of fixed prompt prefixes for a local causal LM.
+#
+# Every raag.py prompt opens with the same instruction block; only the situation + inventory
+# suffix changes. The prefix is run through the model once and its per-layer K/V tensors are
+# kept; each request then starts from a cache object that *views* those tensors and only the
+# suffix tokens go through the model. Attention layers append with torch.cat, so the shared
+# prefix tensors are never written to and any number of requests can start from them.
+#
+# Several pending suffixes can be prefilled in one forward pass: rows are right-padded, the
+# prefix K/V is broadcast (expand, no copy) across the batch, and each row's cache is sliced
+# back to prefix + its own length. With right padding and causal attention no real token ever
+# attends to a pad, so no attention mask is needed and every row matches a solo prefill.
+# Batching buys throughput (one pass over the weights for N suffixes), not latency: on a
+# single core every row waits for the whole pass, so keep PREFIX_CACHE_BATCH small there.
+#
+# The prefix is tokenized on its own (special tokens included) and the suffix without special
+# tokens, so prefixes should end on a token boundary -- a newline is the safe choice.
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+PREFIX_CACHE_BATCH = int(os.getenv("PREFIX_CACHE_BATCH", "8"))  # max suffixes per prefill pass
+
+
+@dataclass
+class _Prefix:
+    text: str
+    ids: List[int]
+    kv: List[Tuple[object, object]]  # per layer (keys, values), shape (1, heads, len, dim)
+    logits: object                   # next-token logits after the prefix (for an empty suffix)
+    seconds: float
+
+
+def _layers(cache) -> List[Tuple[object, object]]:
+    if hasattr(cache, "layers"):  # transformers >= 4.56
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    if hasattr(cache, "key_cache"):
+        return list(zip(cache.key_cache, cache.value_cache))
+    return [tuple(layer[:2]) for layer in cache]  # legacy tuple-of-tuples
+
+
+def _cache(kv: Sequence[Tuple[object, object]]):
+    from transformers import DynamicCache
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(tuple(kv))
+    return DynamicCache(list(kv))
+
+
+class PrefixKVCache:
+    """Fixed prompt prefixes -> precomputed K/V, shared read-only by every request.
+
+    add(prefix) once at startup; split(prompt) finds the longest registered prefix the prompt
+    starts with and returns the suffix ids still to be run; prefill(...) runs those suffixes
+    (batched) on top of the cached prefix and returns per-row (next-token logits, past).
+    """
+
+    def __init__(self, model, tokenizer, max_batch: int = PREFIX_CACHE_BATCH):
+        import torch
+        self.torch = torch
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch = max(1, max_batch)
+        self.pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else 0
+        self._prefixes: Dict[str, _Prefix] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reused_tokens = 0
+        self.passes = 0
+
+    def add(self, prefix: str) -> int:
+        """Precompute the cache for a prefix (idempotent). Returns its token count."""
+        with self._lock:
+            entry = self._prefixes.get(prefix)
+            if entry is None:
+                torch = self.torch
+                ids = self.tokenizer(prefix)["input_ids"]  # special tokens as the pipeline adds them
+                t0 = time.perf_counter()
+                with torch.inference_mode():
+                    out = self.model(input_ids=torch.tensor([ids], dtype=torch.long), use_cache=True)
+                entry = _Prefix(prefix, ids, _layers(out.past_key_values), out.logits[0, -1].float(),
+                                time.perf_counter() - t0)
+                self._prefixes[prefix] = entry
+            return len(entry.ids)
+
+    def prefix_tokens(self, prefix: Optional[str]) -> int:
+        return len(self._prefixes[prefix].ids) if prefix is not None else 0
+
+    def split(self, prompt: str) -> Tuple[Optional[str], List[int]]:
+        """(matched prefix or None, ids still to run). Without a match the ids are the whole
+        prompt with special tokens, exactly what an uncached call would encode."""
+        best = None
+        for text in self._prefixes:
+            if prompt.startswith(text) and (best is None or len(text) > len(best)):
+                best = text
+        if best is None:
+            self.misses += 1
+            return None, self.tokenizer(prompt)["input_ids"]
+        self.hits += 1
+        self.reused_tokens += len(self._prefixes[best].ids)
+        return best, self.tokenizer(prompt[len(best):], add_special_tokens=False)["input_ids"]
+
+    def past(self, prefix: Optional[str]):
+        """A fresh cache positioned after the prefix (None without one). Views, not copies."""
+        return _cache(self._prefixes[prefix].kv) if prefix is not None else None
+
+    def prefill(self, rows: List[List[int]], prefix: Optional[str] = None) -> List[Tuple[object, object]]:
+        """Run each row's ids after the prefix; rows are batched up to max_batch per pass.
+        Returns [(next-token logits, past)] in row order."""
+        out: List[Tuple[object, object]] = []
+        for i in range(0, len(rows), self.max_batch):
+            out.extend(self._prefill(rows[i:i + self.max_batch], prefix))
+        return out
+
+    def _prefill(self, rows: List[List[int]], prefix: Optional[str]):
+        torch = self.torch
+        entry = self._prefixes[prefix] if prefix is not None else None
+        if len(rows) == 1 or not all(rows):
+            # Solo (or degenerate) rows: no padding, the prefix cache is used as-is
+            return [self._solo(row, entry) for row in rows]
+        n, width = len(rows), max(len(r) for r in rows)
+        ids = torch.full((n, width), self.pad_id, dtype=torch.long)
+        for b, row in enumerate(rows):
+            ids[b, :len(row)] = torch.tensor(row, dtype=torch.long)
+        past = None
+        if entry is not None:
+            past = _cache([(k.expand(n, -1, -1, -1), v.expand(n, -1, -1, -1)) for k, v in entry.kv])
+        with torch.inference_mode():
+            res = self.model(input_ids=ids, past_key_values=past, use_cache=True)
+        self.passes += 1
+        kv = _layers(res.past_key_values)
+        base = len(entry.ids) if entry is not None else 0
+        results = []
+        for b, row in enumerate(rows):
+            end = base + len(row)
+            results.append((res.logits[b, len(row) - 1].float(),
+                            _cache([(k[b:b + 1, :, :end], v[b:b + 1, :, :end]) for k, v in kv])))
+        return results
+
+    def _solo(self, row: List[int], entry: Optional[_Prefix]):
+        torch = self.torch
+        if not row and entry is not None:
+            return entry.logits, self.past(entry.text)
+        with torch.inference_mode():
+            res = self.model(input_ids=torch.tensor([row], dtype=torch.long),
+                             past_key_values=self.past(entry.text) if entry is not None else None, use_cache=True)
+        self.passes += 1
+        return res.logits[0, -1].float(), res.past_key_values
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "prefixes": len(self._prefixes),
+            "prefix_tokens": {p[:40]: len(e.ids) for p, e in self._prefixes.items()},
+            "hits": self.hits,
+            "misses": self.misses,
+            "reused_tokens": self.reused_tokens,
+            "prefill_passes": self.passes,
+        }
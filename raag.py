@@ -1,4 +1,3 @@
-from sentence_transformers import SentenceTransformer
 from transformers import pipeline, AutoTokenizer, AutoModelForCausalLM
 import faiss
 import numpy as np
@@ -8,6 +7,13 @@ import os
 import logging
 from typing import Dict, List, Tuple, Optional
 from dataclasses import dataclass
+from embed_cache import get_cache
+from metrics import stage, PARSE_FAILURES, LLM_TOKENS, LLM_CPU_SECONDS
+from constrained_json import ConstrainedJSONDecoder
+from prefix_cache import PrefixKVCache
+from planner_prompt import repair_json
+from stock_ledger import StockLedger
+from embed_backend import load_embedder, cache_model_name
 from huggingface_hub import login
 
 # Configure logging
@@ -23,6 +29,26 @@ hf_token = os.getenv("HF_TOKEN")
 # Replace with the specific model's API URL and your Hugging Face token
 API_URL = "https://api-inference.huggingface.co/models/meta-llama/Meta-Llama-3-8B-Instruct"
 HEADERS = {"Authorization": hf_token} # Replace YOUR_HUGGING_FACE_TOKEN
+CONSTRAINED_DECODING = os.getenv("RAAG_CONSTRAINED", "1") != "0"
+PREFIX_CACHING = os.getenv("RAAG_PREFIX_CACHE", "1") != "0"
+
+# Static part of every recommendation prompt. It comes first so its K/V cache can be computed
+# once (PrefixKVCache) and only the situation/inventory suffix is run per request.
+PROMPT_PREFIX = """You are an expert disaster relief coordinator. Analyze the situation and recommend supplies.
+
+INSTRUCTIONS:
+1. Recommend only items from the available inventory
+2. Consider priority: Medical > Water > Food > Shelter > Equipment
+3. Do not exceed available quantities
+4. Return ONLY a JSON object with item names as keys and quantities as values (0 if not needed)
+
+RESPONSE FORMAT (JSON only):
+{
+  "Item Name": quantity,
+  "Another Item": quantity
+}
+
+"""
 
 
 @dataclass
@@ -60,6 +86,8 @@ class DisasterReliefRAG:
             {"id": 9, "item": "Tents", "quantity": 10, "category": "shelter", "priority": 2},
             {"id": 10, "item": "Antibiotics", "quantity": 50, "category": "medical", "priority": 1},
         ]
+        # Running totals and low-stock alerts, updated on every allocation/restock
+        self.ledger = StockLedger(self.inventory)
         
         # Initialize models
         self._initialize_embedder()
@@ -69,8 +97,9 @@ class DisasterReliefRAG:
     def _initialize_embedder(self):
         """Initialize the sentence transformer model"""
         try:
-            self.embedder = SentenceTransformer(self.embedder_model)
+            self.embedder = load_embedder(self.embedder_model)
             self.embedding_dim = 384  # for all-MiniLM-L6-v2
+            self.query_cache = get_cache(cache_model_name(self.embedder_model))
             logger.info(f"Embedder initialized: {self.embedder_model}")
         except Exception as e:
             logger.error(f"Failed to initialize embedder: {e}")
@@ -101,6 +130,14 @@ class DisasterReliefRAG:
                 top_p=0.95,
                 pad_token_id=self.tokenizer.pad_token_id
             )
+            # Decode only the quantities of a fixed-key JSON object instead of free text
+            # (RAAG_CONSTRAINED=0 restores the sampling pipeline + _parse_llm_response)
+            # The instruction block's K/V is computed once here (RAAG_PREFIX_CACHE=0 disables)
+            self.prefix_cache = PrefixKVCache(self.model, self.tokenizer) if PREFIX_CACHING else None
+            if self.prefix_cache is not None:
+                self.prefix_cache.add(PROMPT_PREFIX)
+            self.decoder = (ConstrainedJSONDecoder(self.model, self.tokenizer, prefix_cache=self.prefix_cache)
+                            if CONSTRAINED_DECODING else None)
             logger.info(f"LLM initialized: {self.model_name}")
         except Exception as e:
             logger.error(f"Failed to initialize LLM: {e}")
@@ -152,6 +189,7 @@ class DisasterReliefRAG:
             self.index = faiss.read_index(self.index_path)
             with open(self.inventory_path, "rb") as f:
                 self.inventory, self.id_map = pickle.load(f)
+            self.ledger.reset(self.inventory)
             logger.info("Index and inventory loaded successfully")
         except Exception as e:
             logger.error(f"Failed to load index: {e}")
@@ -169,41 +207,29 @@ class DisasterReliefRAG:
             Tuple of (structured recommendations, retrieved items)
         """
         try:
-            # Enhance query for better retrieval
-            enhanced_query = f"disaster relief emergency: {query}"
-            
-            # Encode query and search
-            query_embedding = self.embedder.encode(enhanced_query, convert_to_numpy=True)
-            query_embedding = query_embedding.astype("float32").reshape(1, -1)
-            
-            distances, indices = self.index.search(query_embedding, min(top_k, len(self.inventory)))
-            
-            # Retrieve relevant items
-            retrieved_items = []
-            context_lines = []
-            
-            for idx, distance in zip(indices[0], distances[0]):
-                if idx < len(self.id_map):  # Ensure valid index
-                    inv_id = self.id_map[idx]
-                    item = next((i for i in self.inventory if i["id"] == inv_id), None)
-                    if item:
-                        retrieved_items.append(item)
-                        context_lines.append(
-                            f"- {item['item']} (Available: {item['quantity']}, "
-                            f"Category: {item.get('category', 'general')})"
-                        )
+            retrieved_items, context_lines = self._retrieve(query, top_k)
             
             # Generate LLM prompt with better structure
             prompt = self._create_prompt(query, context_lines)
             
-            # Get LLM response
-            response = self.llm(prompt)[0]["generated_text"]
-            
-            # Extract structured output
-            structured_output = self._parse_llm_response(response, prompt)
+            if self.decoder is not None and retrieved_items:
+                # Keys are the retrieved items, values bounded by stock: always parses
+                with stage("raag.recommend_aid", "llm_generate"):
+                    result = self.decoder.generate(prompt, {i["item"]: i["quantity"] for i in retrieved_items})
+                self._record_decode(result)
+                structured_output = result.values
+            else:
+                # Get LLM response
+                with stage("raag.recommend_aid", "llm_generate"):
+                    response = self.llm(prompt)[0]["generated_text"]
+
+                # Extract structured output
+                with stage("raag.recommend_aid", "parse"):
+                    structured_output = self._parse_llm_response(response, prompt)
             
             # Validate recommendations against inventory
-            validated_output = self._validate_recommendations(structured_output)
+            with stage("raag.recommend_aid", "validate"):
+                validated_output = self._validate_recommendations(structured_output)
             
             return validated_output, retrieved_items
             
@@ -211,32 +237,78 @@ class DisasterReliefRAG:
             logger.error(f"Failed to generate recommendations: {e}")
             return {}, []
     
+    def recommend_aid_batch(self, queries: List[str], top_k: int = 5) -> List[Tuple[Dict, List]]:
+        """recommend_aid for several pending queries at once: their prompt suffixes are prefilled
+        together on the cached instruction prefix. Falls back to one call per query when
+        constrained decoding is off."""
+        if self.decoder is None:
+            return [self.recommend_aid(q, top_k) for q in queries]
+        try:
+            retrieved = [self._retrieve(q, top_k) for q in queries]
+            requests = [
+                (self._create_prompt(q, lines), {i["item"]: i["quantity"] for i in items})
+                for q, (items, lines) in zip(queries, retrieved)
+            ]
+            with stage("raag.recommend_aid_batch", "llm_generate"):
+                results = self.decoder.generate_batch(requests)
+            out = []
+            for result, (items, _) in zip(results, retrieved):
+                self._record_decode(result)
+                out.append((self._validate_recommendations(result.values), items) if items else ({}, []))
+            return out
+        except Exception as e:
+            logger.error(f"Failed to generate batched recommendations: {e}")
+            return [({}, []) for _ in queries]
+
+    def _retrieve(self, query: str, top_k: int) -> Tuple[List[Dict], List[str]]:
+        """Top-k inventory items for the query, plus their prompt context lines"""
+        # Enhance query for better retrieval
+        enhanced_query = f"disaster relief emergency: {query}"
+        
+        # Encode query and search
+        # Repeated dispatch queries hit the shared cache instead of re-encoding
+        with stage("raag.recommend_aid", "encode"):
+            query_embedding = self.query_cache.get_or_compute(
+                enhanced_query, lambda t: self.embedder.encode(t, convert_to_numpy=True)
+            ).reshape(1, -1)
+        
+        with stage("raag.recommend_aid", "faiss_search"):
+            distances, indices = self.index.search(query_embedding, min(top_k, len(self.inventory)))
+        
+        # Retrieve relevant items
+        retrieved_items = []
+        context_lines = []
+        
+        for idx, distance in zip(indices[0], distances[0]):
+            if idx < len(self.id_map):  # Ensure valid index
+                inv_id = self.id_map[idx]
+                item = next((i for i in self.inventory if i["id"] == inv_id), None)
+                if item:
+                    retrieved_items.append(item)
+                    context_lines.append(
+                        f"- {item['item']} (Available: {item['quantity']}, "
+                        f"Category: {item.get('category', 'general')})"
+                    )
+        
+        return retrieved_items, context_lines
+
+    def _record_decode(self, result):
+        LLM_TOKENS.labels(component="raag", kind="prompt").inc(result.prompt_tokens)
+        LLM_TOKENS.labels(component="raag", kind="cached").inc(result.cached_tokens)
+        LLM_TOKENS.labels(component="raag", kind="forced").inc(result.forced_tokens)
+        LLM_TOKENS.labels(component="raag", kind="generated").inc(result.generated_tokens)
+        LLM_CPU_SECONDS.labels(component="raag").inc(result.cpu_seconds)
+
     def _create_prompt(self, query: str, context_lines: List[str]) -> str:
-        """Create an optimized prompt for the LLM"""
+        """Create an optimized prompt for the LLM: static PROMPT_PREFIX, then the per-request part"""
         context = "\n".join(context_lines) if context_lines else "No items available"
         
-        prompt = f"""You are an expert disaster relief coordinator. Analyze the situation and recommend supplies.
-
-SITUATION: {query}
+        return f"""{PROMPT_PREFIX}SITUATION: {query}
 
 AVAILABLE INVENTORY:
 {context}
 
-INSTRUCTIONS:
-1. Recommend only items from the available inventory
-2. Consider priority: Medical > Water > Food > Shelter > Equipment
-3. Do not exceed available quantities
-4. Return ONLY a JSON object with item names as keys and quantities as values
-
-RESPONSE FORMAT (JSON only):
-{{
-  "Item Name": quantity,
-  "Another Item": quantity
-}}
-
 RECOMMENDATION:"""
-        
-        return prompt
     
     def _parse_llm_response(self, response: str, prompt: str) -> Dict:
         """Parse LLM response to extract JSON"""
@@ -249,19 +321,21 @@ RECOMMENDATION:"""
             json_start = response.find("{")
             json_end = response.rfind("}") + 1
             
-            if json_start != -1 and json_end > json_start:
-                json_str = response[json_start:json_end]
-                # Clean up common issues
-                json_str = json_str.replace("'", '"')  # Replace single quotes
-                return json.loads(json_str)
+            if json_start != -1:
+                # Truncated answers have no closing brace; repair_json closes them
+                json_str = response[json_start:json_end] if json_end > json_start else response[json_start:]
+                return json.loads(repair_json(json_str))
             else:
+                PARSE_FAILURES.labels(component="raag").inc()
                 logger.warning("No valid JSON found in LLM response")
                 return {}
                 
         except json.JSONDecodeError as e:
+            PARSE_FAILURES.labels(component="raag").inc()
             logger.error(f"JSON parsing failed: {e}")
             return {}
         except Exception as e:
+            PARSE_FAILURES.labels(component="raag").inc()
             logger.error(f"Unexpected error parsing response: {e}")
             return {}
     
@@ -297,13 +371,12 @@ RECOMMENDATION:"""
         try:
             allocation_log = []
             
-            for item in self.inventory:
-                if item["item"] in updates:
-                    requested_qty = updates[item["item"]]
-                    
+            for name, requested_qty in updates.items():
+                item = self.ledger.get(name)
+                if item is not None:
                     if isinstance(requested_qty, int) and requested_qty > 0:
                         if item["quantity"] >= requested_qty:
-                            item["quantity"] -= requested_qty
+                            self.ledger.allocate(name, requested_qty)
                             allocation_log.append(
                                 f"✅ Allocated {requested_qty} {item['item']}(s). "
                                 f"Remaining: {item['quantity']}"
@@ -327,32 +400,15 @@ RECOMMENDATION:"""
             logger.error(f"Failed to update inventory: {e}")
             return False
     
+    def restock(self, item_name: str, qty: int) -> int:
+        """Add units back to stock; returns the new quantity"""
+        self.ledger.restock(item_name, qty)
+        self._save_index()
+        return self.ledger.quantity(item_name)
+
     def get_inventory_status(self) -> Dict:
-        """Get current inventory status summary"""
-        status = {
-            "total_items": len(self.inventory),
-            "categories": {},
-            "low_stock_items": [],
-            "total_quantity": 0
-        }
-        
-        for item in self.inventory:
-            category = item.get("category", "general")
-            if category not in status["categories"]:
-                status["categories"][category] = {"items": 0, "total_quantity": 0}
-            
-            status["categories"][category]["items"] += 1
-            status["categories"][category]["total_quantity"] += item["quantity"]
-            status["total_quantity"] += item["quantity"]
-            
-            # Flag low stock items (less than 10 units)
-            if item["quantity"] < 10:
-                status["low_stock_items"].append({
-                    "item": item["item"],
-                    "quantity": item["quantity"]
-                })
-        
-        return status
+        """Get current inventory status summary (maintained incrementally, free to poll)"""
+        return self.ledger.status()
 
 
 # Example usage and testing
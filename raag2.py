@@ -1,4 +1,3 @@
-from sentence_transformers import SentenceTransformer
 import faiss
 import numpy as np
 import pickle
@@ -7,15 +6,24 @@ import os
 import logging
 import requests
 import re
+import sys
 from typing import Dict, List, Tuple, Optional
 from dataclasses import dataclass
+from embed_cache import get_cache
+from metrics import stage, LLM_FALLBACKS, PARSE_FAILURES
+from planner_prompt import repair_json
+from stock_ledger import StockLedger
+from embed_backend import load_embedder, cache_model_name
 
 # Logging setup
 # logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-# logger = logging.getLogger(__name__)
+logger = logging.getLogger(__name__)
 
 # Hugging Face API config
-API_URL = "https://api-inference.huggingface.co/models/meta-llama/Meta-Llama-3-8B-Instruct"
+# HF_API_URL points the pipeline at another endpoint, e.g. mock_llm.py for offline runs
+API_URL = os.getenv("HF_API_URL", "https://api-inference.huggingface.co/models/meta-llama/Meta-Llama-3-8B-Instruct")
+hf_token = os.getenv("HF_TOKEN")
+HEADERS = {"Authorization": f"Bearer {hf_token}"} if hf_token else {}
 
 
 @dataclass
@@ -27,13 +35,16 @@ class InventoryItem:
     priority: Optional[int] = 1
 
 class DisasterReliefRAG:
-    def __init__(self, embedder_model: str = "sentence-transformers/all-MiniLM-L6-v2", index_path: str = "inventory.index", inventory_path: str = "inventory.pkl"):
+    def __init__(self, embedder_model: str = "sentence-transformers/all-MiniLM-L6-v2", index_path: str = "inventory.index", inventory_path: str = "inventory.pkl",
+                 inventory: Optional[List[Dict]] = None, embedder=None):
+        """inventory / embedder override the demo stock and the SentenceTransformer (benchmarks, simulations)."""
         self.embedder_model = embedder_model
         self.index_path = index_path
         self.inventory_path = inventory_path
+        self._embedder_override = embedder
 
         # Initial inventory with higher quantities for testing
-        self.inventory = [
+        self.inventory = inventory if inventory is not None else [
             {"id": 1, "item": "Medical Kit", "quantity": 50, "category": "medical", "priority": 1},
             {"id": 2, "item": "Emergency Food Pack", "quantity": 100, "category": "food", "priority": 2},
             {"id": 3, "item": "Water Bottles", "quantity": 300, "category": "water", "priority": 1},
@@ -46,15 +57,17 @@ class DisasterReliefRAG:
             {"id": 10, "item": "Antibiotics", "quantity": 150, "category": "medical", "priority": 1},
         ]
 
-        # Track initial inventory for comparison
-        self.initial_inventory = {item["item"]: item["quantity"] for item in self.inventory}
+        # Running totals, usage vs initial stock and low-stock alerts, updated per allocation/restock
+        self.ledger = StockLedger(self.inventory)
+        self.initial_inventory = self.ledger.initial
         
         self._initialize_embedder()
         self._build_index()
 
     def _initialize_embedder(self):
-        self.embedder = SentenceTransformer(self.embedder_model)
+        self.embedder = self._embedder_override or load_embedder(self.embedder_model)
         self.embedding_dim = 384
+        self.query_cache = get_cache(cache_model_name(self.embedder_model))
 
     def _build_index(self):
         self.index = faiss.IndexFlatL2(self.embedding_dim)
@@ -149,8 +162,12 @@ class DisasterReliefRAG:
 
     def recommend_aid(self, query: str, top_k: int = 5) -> Tuple[Dict, List, Dict]:
         enhanced_query = f"disaster relief emergency: {query}"
-        q_emb = self.embedder.encode(enhanced_query, convert_to_numpy=True).astype("float32").reshape(1, -1)
-        distances, indices = self.index.search(q_emb, min(top_k, len(self.inventory)))
+        with stage("raag2.recommend_aid", "encode"):
+            q_emb = self.query_cache.get_or_compute(
+                enhanced_query, lambda t: self.embedder.encode(t, convert_to_numpy=True)
+            ).reshape(1, -1)
+        with stage("raag2.recommend_aid", "faiss_search"):
+            distances, indices = self.index.search(q_emb, min(top_k, len(self.inventory)))
 
         retrieved_items = []
         for idx in indices[0]:
@@ -160,7 +177,8 @@ class DisasterReliefRAG:
                 retrieved_items.append(item)
 
         # Calculate estimated requirements
-        estimated_requirements = self._calculate_requirements(query, retrieved_items)
+        with stage("raag2.recommend_aid", "requirements"):
+            estimated_requirements = self._calculate_requirements(query, retrieved_items)
         
         # Build context with both availability and requirements
         context_lines = []
@@ -172,33 +190,35 @@ class DisasterReliefRAG:
 
         # Build LLM prompt
         prompt = self._create_prompt(query, context_lines, estimated_requirements)
-        response = requests.post(API_URL, headers=HEADERS, json={"inputs": prompt})
-        raw = response.json()
+        with stage("raag2.recommend_aid", "llm_http"):
+            response = requests.post(API_URL, headers=HEADERS, json={"inputs": prompt})
+            raw = response.json()
 
         if isinstance(raw, list) and "generated_text" in raw[0]:
             raw_text = raw[0]["generated_text"]
         else:
             raw_text = str(raw)
 
-        structured = self._parse_llm_response(raw_text, prompt)
+        with stage("raag2.recommend_aid", "parse"):
+            structured = self._parse_llm_response(raw_text, prompt)
         
         # If LLM doesn't provide recommendations, use estimated requirements
         if not structured:
+            LLM_FALLBACKS.labels(component="raag2").inc()
             structured = self._create_fallback_recommendations(estimated_requirements)
         
-        validated = self._validate_recommendations(structured)
+        with stage("raag2.recommend_aid", "validate"):
+            validated = self._validate_recommendations(structured)
         return validated, retrieved_items, estimated_requirements
 
     def _create_fallback_recommendations(self, estimated_requirements: Dict) -> Dict:
         """Create recommendations based on estimated requirements if LLM fails"""
         recommendations = {}
         for item_name, required_qty in estimated_requirements.items():
-            # Find the item in inventory
-            for item in self.inventory:
-                if item["item"] == item_name:
-                    # Recommend minimum of required and available
-                    recommendations[item_name] = min(required_qty, item["quantity"])
-                    break
+            item = self.ledger.get(item_name)
+            if item is not None:
+                # Recommend minimum of required and available
+                recommendations[item_name] = min(required_qty, item["quantity"])
         return recommendations
 
     def _create_prompt(self, query: str, context_lines: List[str], estimated_requirements: Dict) -> str:
@@ -242,14 +262,13 @@ RECOMMENDATION:"""
             start = response.find("{")
             end = response.rfind("}") + 1
             
-            if start != -1 and end > start:
-                json_str = response[start:end]
-                # Clean up the JSON string
-                json_str = json_str.replace("'", '"')
-                # Remove any trailing text after the JSON
-                json_str = re.sub(r'\}.*', '}', json_str, flags=re.DOTALL)
-                return json.loads(json_str)
+            if start != -1:
+                # Truncated answers have no closing brace; repair_json closes them
+                json_str = response[start:end] if end > start else response[start:]
+                return json.loads(repair_json(json_str))
+            PARSE_FAILURES.labels(component="raag2").inc()
         except Exception as e:
+            PARSE_FAILURES.labels(component="raag2").inc()
             logger.warning(f"Failed to parse LLM response: {e}")
             # Fallback: try to extract key-value pairs manually
             try:
@@ -294,26 +313,22 @@ RECOMMENDATION:"""
         
         for item_name, requested_qty in recommendations.items():
             # Find the exact inventory item
-            inventory_item = None
-            for item in self.inventory:
-                if item["item"] == item_name:
-                    inventory_item = item
-                    break
-            
+            inventory_item = self.ledger.get(item_name)
+
             if inventory_item:
                 available_qty = inventory_item["quantity"]
                 initial_qty = self.initial_inventory.get(item_name, 0)
                 
                 if available_qty >= requested_qty:
                     # Successful allocation
-                    inventory_item["quantity"] -= requested_qty
+                    self.ledger.allocate(item_name, requested_qty)
                     successfully_allocated[item_name] = requested_qty
                     logs.append(f"✅ Allocated {requested_qty} {item_name}")
                     logs.append(f"   Stock: {available_qty} → {inventory_item['quantity']} (Used: {initial_qty - inventory_item['quantity']} total)")
                 else:
                     # Partial allocation
                     if available_qty > 0:
-                        inventory_item["quantity"] = 0
+                        self.ledger.allocate(item_name, available_qty)
                         successfully_allocated[item_name] = available_qty
                         logs.append(f"⚠️ Partially allocated {available_qty} {item_name} (Requested: {requested_qty})")
                         logs.append(f"   Stock: {available_qty} → 0 (Exhausted)")
@@ -332,44 +347,47 @@ RECOMMENDATION:"""
         
         return logs
 
+    def restock(self, item_name: str, qty: int) -> int:
+        """Add units back to stock; returns the new quantity"""
+        self.ledger.restock(item_name, qty)
+        self._save_index()
+        return self.ledger.quantity(item_name)
+
+    def get_inventory_status(self) -> Dict:
+        """Totals, per-category usage and low-stock alerts; maintained incrementally, free to poll"""
+        return self.ledger.status()
+
     def display_inventory(self, show_usage: bool = False):
         print("\n📊 Current Inventory Status:")
         print("-" * 60)
-        
-        total_items = 0
-        total_used = 0
-        by_category = {}
-        
+
         for item in self.inventory:
             current_qty = item['quantity']
             initial_qty = self.initial_inventory.get(item['item'], 0)
             used_qty = initial_qty - current_qty
-            total_used += used_qty
-            
-            status = "✅" if current_qty > 10 else ("⚠️" if current_qty > 0 else "❌")
-            
+
+            status = "✅" if not self.ledger.is_low(item['item']) else ("⚠️" if current_qty > 0 else "❌")
+
             if show_usage and used_qty > 0:
                 print(f"{status} {item['item']}: {current_qty}/{initial_qty} units (Used: {used_qty})")
             else:
                 print(f"{status} {item['item']}: {current_qty} units (Category: {item.get('category', 'N/A')})")
-            
-            total_items += current_qty
-            
-            category = item.get('category', 'Other')
-            if category not in by_category:
-                by_category[category] = 0
-            by_category[category] += current_qty
-        
+
+        summary = self.ledger.status()
+        total_items = summary["total_quantity"]
         print("-" * 60)
         print(f"📈 Summary:")
         print(f"   Total remaining: {total_items} units")
         if show_usage:
-            print(f"   Total allocated: {total_used} units")
-        print(f"   Categories: {len(by_category)}")
-        
-        for cat, count in sorted(by_category.items()):
+            print(f"   Total allocated: {summary['total_used']} units")
+        print(f"   Categories: {len(summary['categories'])}")
+
+        for cat, agg in sorted(summary["categories"].items()):
+            count = agg["total_quantity"]
             percentage = (count / total_items * 100) if total_items > 0 else 0
             print(f"   - {cat.title()}: {count} items ({percentage:.1f}%)")
+        if summary["low_stock_items"]:
+            print(f"   ⚠️ Low stock: " + ", ".join(f"{i['item']} ({i['quantity']}/{i['threshold']})" for i in summary["low_stock_items"]))
 
 # Demo
 if __name__ == "__main__":
@@ -431,5 +449,6 @@ if __name__ == "__main__":
         # Add separator between scenarios
         if i < len(scenarios):
             print(f"\n{'🔄 Moving to next scenario...'}")
-            input("Press Enter to continue...")  # Optional: pause between scenarios
+            if "--pause" in sys.argv and sys.stdin.isatty():
+                input("Press Enter to continue...")  # opt-in; batch runs (simulator.py) must not block
             print("="*60)
\ No newline at end of file
@@ -0,0 +1,95 @@
+# rec_cache.py
+import math
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Distances in drone_data.csv have 2 decimals, so flooring max_distance to 0.01 km never
+# changes which clusters pass the filter, while 10, 10.0 and 10.001 share one entry.
+DISTANCE_QUANTUM = 0.01
+
+
+def quantize_params(min_people, max_distance) -> Tuple[int, float]:
+    # No_of_People is never negative, so every min_people <= 0 selects the same rows
+    min_people = max(0, int(min_people))
+    max_distance = math.floor(float(max_distance) / DISTANCE_QUANTUM + 1e-9) * DISTANCE_QUANTUM
+    return min_people, round(max_distance, 2)
+
+
+class RecommendationCache:
+    """Bounded LRU of recommendation results keyed by (quantized filters, cluster-table version).
+
+    Entries for older versions are kept until evicted so since=<version> deltas can diff
+    against them.
+    """
+
+    def __init__(self, compute: Callable[[Any, int, float], Any], max_entries: int = 256):
+        self._compute = compute
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, float, int], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.precomputed = 0
+        self.hit_seconds = 0.0
+        self.compute_seconds = 0.0
+
+    def get(self, min_people, max_distance, version: int, df) -> Any:
+        """df may be a zero-argument callable returning the frame, so hits never load rows."""
+        t0 = time.perf_counter()
+        key = (*quantize_params(min_people, max_distance), version)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                value = self._entries[key]
+                self.hit_seconds += time.perf_counter() - t0
+                return value
+            self.misses += 1
+        value = self._compute(df() if callable(df) else df, key[0], key[1])
+        with self._lock:
+            self.compute_seconds += time.perf_counter() - t0
+            self._store(key, value)
+        return value
+
+    def peek(self, min_people, max_distance, version: int) -> Optional[Any]:
+        """Lookup without computing or touching counters (used for deltas against old versions)."""
+        key = (*quantize_params(min_people, max_distance), version)
+        with self._lock:
+            return self._entries.get(key)
+
+    def precompute(self, min_people, max_distance, version: int, df):
+        """Fill the entry ahead of the first request (called on data change for default filters)."""
+        key = (*quantize_params(min_people, max_distance), version)
+        with self._lock:
+            if key in self._entries:
+                return
+        value = self._compute(df() if callable(df) else df, key[0], key[1])
+        with self._lock:
+            self._store(key, value)
+            self.precomputed += 1
+
+    def _store(self, key, value):
+        # Callers hold self._lock
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "precomputed": self.precomputed,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "mean_hit_ms": 1000 * self.hit_seconds / self.hits if self.hits else 0.0,
+                "mean_miss_ms": 1000 * self.compute_seconds / self.misses if self.misses else 0.0,
+            }
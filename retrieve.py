@@ -1,18 +1,15 @@
 # retrieve.py
+import sys
 from datetime import datetime, timedelta
-from haystack import Pipeline
-from haystack.components.retrievers import InMemoryEmbeddingRetriever
-from haystack.components.embedders import SentenceTransformersTextEmbedder
 from haystack.document_stores import FAISSDocumentStore
+from hybrid_retrieve import HybridRetriever
+from embed_cache import CachedTextEmbedder
+from embed_backend import text_embedder
 
 store = FAISSDocumentStore.load(index_path=None)  # or reuse the same instance
-embed = SentenceTransformersTextEmbedder(model="sentence-transformers/all-MiniLM-L6-v2")
-retriever = InMemoryEmbeddingRetriever(document_store=store, top_k=12)
-
-pipe = Pipeline()
-pipe.add_component("embed", embed)
-pipe.add_component("ret", retriever)
-pipe.connect("embed.documents", "ret.query_embedding")
+embed = CachedTextEmbedder(text_embedder("sentence-transformers/all-MiniLM-L6-v2"))  # EMBED_BACKEND=onnx-int8 for the quantized graph
+retriever = HybridRetriever(document_store=store, embedder=embed, top_k=12)
+mode = sys.argv[1] if len(sys.argv) > 1 else "dense"  # dense | bm25 | hybrid
 
 # Helper filter
 def meta_filter_recent_geo(hours=6, center=None, radius_km=None):
@@ -23,6 +20,6 @@ def meta_filter_recent_geo(hours=6, center=None, radius_km=None):
 
 # Run
 query = "urgent medical help for children near blocked roads; routes by boat"
-res = pipe.run(data={"embed": {"text": query}, "ret": {"filters": meta_filter_recent_geo(hours=24)}})
-for d in res["ret"]["documents"]:
+res = retriever.run(query, mode=mode, filters=meta_filter_recent_geo(hours=24))
+for d in res:
     print(d.meta.get("index"), d.content[:120], d.meta.get("created_at"))
\ No newline at end of file
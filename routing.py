@@ -0,0 +1,349 @@
+# routing.py
+# Shortest-time routes and ETAs over a road/waterway graph, used to fill Allocation.route and
+# Allocation.eta_minutes instead of leaving them to the LLM.
+#
+# Graph files (paths from ROAD_NODES_CSV / ROAD_EDGES_CSV):
+#   nodes: node_id,lat,lon
+#   edges: from,to[,length_km][,speed_kmh][,mode][,oneway]
+# Without them, load_graph() builds a k-nearest-neighbour graph over the depot and cluster
+# points (straight-line lengths stretched by DETOUR_FACTOR) so ETAs are still comparable.
+import os
+import heapq
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+
+from geo import DEPOT, haversine_km
+
+ROAD_NODES_CSV = os.getenv("ROAD_NODES_CSV", "road_nodes.csv")
+ROAD_EDGES_CSV = os.getenv("ROAD_EDGES_CSV", "road_edges.csv")
+DEFAULT_SPEED_KMH = {"road": 40.0, "water": 12.0}
+DETOUR_FACTOR = 1.3
+KNN_NEIGHBOURS = 6
+MAX_CACHED_TREES = 64
+_CHUNK = 1024
+
+
+def _unit_vectors(lat, lon) -> np.ndarray:
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=1)
+
+
+def _nearest(lat: np.ndarray, lon: np.ndarray, qlat: np.ndarray, qlon: np.ndarray, k: int = 1,
+             exclude_self: bool = False) -> np.ndarray:
+    """Indices of the k nearest (lat, lon) points for every query point.
+
+    Great-circle order equals descending dot product of unit vectors, so this is a chunked
+    matrix product rather than a haversine per pair.
+    """
+    pts, q = _unit_vectors(lat, lon), _unit_vectors(qlat, qlon)
+    out = np.empty((len(q), k), dtype=np.int64)
+    take = k + exclude_self
+    for s in range(0, len(q), _CHUNK):
+        sim = q[s:s + _CHUNK] @ pts.T
+        if take == 1:
+            out[s:s + _CHUNK, 0] = sim.argmax(axis=1)
+            continue
+        part = np.argpartition(-sim, take - 1, axis=1)[:, :take]
+        order = np.take_along_axis(-sim, part, axis=1).argsort(axis=1)
+        out[s:s + _CHUNK] = np.take_along_axis(part, order, axis=1)[:, take - k:]
+    return out
+
+
+class RoadGraph:
+    """Nodes plus undirected (or oneway) edges weighted by travel minutes."""
+
+    def __init__(self, node_ids: Sequence[str], lat, lon, edges: pd.DataFrame):
+        self.node_ids = list(node_ids)
+        self.index = {nid: i for i, nid in enumerate(self.node_ids)}
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+
+        u = edges["from"].map(self.index).to_numpy()
+        v = edges["to"].map(self.index).to_numpy()
+        if np.isnan(u.astype(float)).any() or np.isnan(v.astype(float)).any():
+            raise ValueError("Edge endpoints missing from the node table")
+        self.edge_u = u.astype(np.int64)
+        self.edge_v = v.astype(np.int64)
+        straight = haversine_km(self.lat[self.edge_u], self.lon[self.edge_u], self.lat[self.edge_v], self.lon[self.edge_v])
+        length = edges["length_km"].to_numpy(float) if "length_km" in edges else straight * DETOUR_FACTOR
+        mode = edges["mode"].fillna("road").to_numpy() if "mode" in edges else np.full(len(edges), "road")
+        speed = edges["speed_kmh"].to_numpy(float) if "speed_kmh" in edges else np.array([DEFAULT_SPEED_KMH.get(m, 40.0) for m in mode])
+        self.edge_minutes = length / speed * 60.0
+        self.edge_mode = mode
+        self.oneway = edges["oneway"].fillna(False).astype(bool).to_numpy() if "oneway" in edges else np.zeros(len(edges), bool)
+        # Rounded once so building thousands of routes is list indexing, not rounding
+        self._lat6 = np.round(self.lat, 6).tolist()
+        self._lon6 = np.round(self.lon, 6).tolist()
+
+        self.adj: List[List[Tuple[int, int, float]]] = [[] for _ in self.node_ids]
+        for e, (a, b, w, one) in enumerate(zip(self.edge_u.tolist(), self.edge_v.tolist(), self.edge_minutes.tolist(), self.oneway.tolist())):
+            self.adj[a].append((b, e, w))
+            if not one:
+                self.adj[b].append((a, e, w))
+
+        # A* heuristic scale: the fastest minutes-per-straight-km of any edge keeps it admissible
+        positive = straight > 1e-9
+        self.min_minutes_per_km = float((self.edge_minutes[positive] / straight[positive]).min()) if positive.any() else 0.0
+
+    @classmethod
+    def from_csv(cls, nodes_path: str, edges_path: str) -> "RoadGraph":
+        nodes = pd.read_csv(nodes_path, dtype={"node_id": str})
+        edges = pd.read_csv(edges_path, dtype={"from": str, "to": str})
+        return cls(nodes["node_id"], nodes["lat"], nodes["lon"], edges)
+
+    @classmethod
+    def knn(cls, node_ids: Sequence[str], lat, lon, k: int = KNN_NEIGHBOURS, mode: str = "road") -> "RoadGraph":
+        lat, lon = np.asarray(lat, float), np.asarray(lon, float)
+        k = min(k, len(lat) - 1)
+        nbrs = _nearest(lat, lon, lat, lon, k, exclude_self=True) if k > 0 else np.empty((len(lat), 0), np.int64)
+        a = np.repeat(np.arange(len(lat)), k)
+        b = nbrs.ravel()
+        # One undirected edge per unordered pair
+        pairs = np.unique(np.sort(np.stack([a, b], axis=1), axis=1), axis=0)
+        ids = np.asarray(node_ids, dtype=object)
+        edges = pd.DataFrame({"from": ids[pairs[:, 0]], "to": ids[pairs[:, 1]], "mode": mode})
+        return cls(node_ids, lat, lon, edges)
+
+    def nearest_nodes(self, lat, lon) -> np.ndarray:
+        return _nearest(self.lat, self.lon, np.atleast_1d(np.asarray(lat, float)), np.atleast_1d(np.asarray(lon, float)))[:, 0]
+
+    def edges_near(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Edges with an endpoint or midpoint within radius_km (e.g. a reported blockage)."""
+        mid_lat = (self.lat[self.edge_u] + self.lat[self.edge_v]) / 2
+        mid_lon = (self.lon[self.edge_u] + self.lon[self.edge_v]) / 2
+        near = np.zeros(len(self.edge_u), bool)
+        for la, lo in ((self.lat[self.edge_u], self.lon[self.edge_u]), (self.lat[self.edge_v], self.lon[self.edge_v]), (mid_lat, mid_lon)):
+            near |= haversine_km(lat, lon, la, lo) <= radius_km
+        return np.flatnonzero(near)
+
+    def coords(self, path: Iterable[int]) -> List[Dict[str, float]]:
+        lat, lon = self._lat6, self._lon6
+        return [{"lat": lat[n], "lon": lon[n]} for n in path]
+
+
+class Router:
+    """Shortest-time trees per source node, cached and invalidated only where a change matters.
+
+    Blocking an edge can only lengthen paths that use it, so only trees with that edge in them
+    are recomputed; re-opening one only matters to trees where it would now be a shortcut.
+    """
+
+    def __init__(self, graph: RoadGraph, max_trees: int = MAX_CACHED_TREES):
+        self.graph = graph
+        self.max_trees = max_trees
+        self.blocked: frozenset = frozenset()  # replaced, never mutated, so readers can snapshot it
+        # source -> (minutes per node, parent edge per node, parent node per node)
+        self._trees: "OrderedDict[int, Tuple[np.ndarray, np.ndarray, List[int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped (under _lock) on every change to blocked; a tree is only cached if no change
+        # happened while it was being built, so a concurrent block can't leave a stale one behind
+        self._generation = 0
+        self.tree_builds = 0
+
+    # ---- single-source trees ----
+
+    def _blocked_snapshot(self) -> Tuple[int, frozenset]:
+        with self._lock:
+            return self._generation, self.blocked
+
+    def _dijkstra(self, source: int, blocked: frozenset) -> Tuple[np.ndarray, np.ndarray, List[int]]:
+        n = len(self.graph.node_ids)
+        dist = [float("inf")] * n
+        parent = [-1] * n  # edge id used to reach each node
+        prev = [-1] * n
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        adj = self.graph.adj
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for v, e, w in adj[u]:
+                nd = d + w
+                if nd < dist[v] and e not in blocked:
+                    dist[v] = nd
+                    parent[v] = e
+                    prev[v] = u
+                    heapq.heappush(heap, (nd, v))
+        with self._lock:
+            self.tree_builds += 1
+        return np.array(dist), np.array(parent, dtype=np.int64), prev
+
+    def tree(self, source: int) -> Tuple[np.ndarray, np.ndarray, List[int]]:
+        """(minutes, parent edge, parent node) for every node from source; cached LRU."""
+        while True:
+            with self._lock:
+                hit = self._trees.get(source)
+                if hit is not None:
+                    self._trees.move_to_end(source)
+                    return hit
+                generation, blocked = self._generation, self.blocked
+            built = self._dijkstra(source, blocked)
+            with self._lock:
+                if self._generation != generation:
+                    continue  # blockages changed mid-build; block/unblock never saw this tree
+                self._trees[source] = built
+                while len(self._trees) > self.max_trees:
+                    self._trees.popitem(last=False)
+            return built
+
+    def eta_minutes(self, source: int, targets: Sequence[int]) -> np.ndarray:
+        """ETAs from source to many targets in one sweep (inf where unreachable)."""
+        return self.tree(source)[0][np.asarray(targets, dtype=np.int64)]
+
+    def path(self, source: int, target: int,
+             tree: Optional[Tuple[np.ndarray, np.ndarray, List[int]]] = None) -> Optional[List[int]]:
+        """Node path from source; pass the tree ETAs were read from to get the matching path."""
+        if tree is not None:
+            cached = tree
+        else:
+            with self._lock:
+                cached = self._trees.get(source)
+        if cached is None:
+            return self.astar(source, target)[1]
+        dist, _, prev = cached
+        if not np.isfinite(dist[target]):
+            return None
+        nodes = [target]
+        while nodes[-1] != source:
+            nodes.append(prev[nodes[-1]])
+        return nodes[::-1]
+
+    def astar(self, source: int, target: int) -> Tuple[float, Optional[List[int]]]:
+        """Point-to-point search for one-off queries that don't justify a full tree."""
+        g = self.graph
+        _, blocked = self._blocked_snapshot()
+        h = (haversine_km(g.lat, g.lon, g.lat[target], g.lon[target]) * g.min_minutes_per_km).tolist()
+        best = {source: 0.0}
+        came: Dict[int, int] = {}
+        heap = [(h[source], 0.0, source)]
+        while heap:
+            _, d, u = heapq.heappop(heap)
+            if u == target:
+                nodes = [u]
+                while nodes[-1] != source:
+                    nodes.append(came[nodes[-1]])
+                return d, nodes[::-1]
+            if d > best.get(u, float("inf")):
+                continue
+            for v, e, w in g.adj[u]:
+                nd = d + w
+                if nd < best.get(v, float("inf")) and e not in blocked:
+                    best[v] = nd
+                    came[v] = u
+                    heapq.heappush(heap, (nd + h[v], nd, v))
+        return float("inf"), None
+
+    # ---- blocked edges ----
+
+    def block_edges(self, edge_ids: Iterable[int]) -> List[int]:
+        """Mark edges impassable; returns the sources whose trees were recomputed."""
+        ids = {int(e) for e in edge_ids}
+        with self._lock:
+            new = ids - self.blocked
+            if not new:
+                return []
+            self.blocked = self.blocked | new
+            self._generation += 1
+            ids = np.fromiter(new, dtype=np.int64)
+            affected = [s for s, (_, parent, _) in self._trees.items() if np.isin(parent, ids).any()]
+        return self._rebuild(affected)
+
+    def unblock_edges(self, edge_ids: Iterable[int]) -> List[int]:
+        g = self.graph
+        ids = {int(e) for e in edge_ids}
+        with self._lock:
+            reopened = ids & self.blocked
+            if not reopened:
+                return []
+            self.blocked = self.blocked - reopened
+            self._generation += 1
+            ids = np.fromiter(reopened, dtype=np.int64)
+            u, v, w = g.edge_u[ids], g.edge_v[ids], g.edge_minutes[ids]
+            two_way = ~g.oneway[ids]
+            affected = [
+                s for s, (dist, _, _) in self._trees.items()
+                if (dist[u] + w < dist[v]).any() or (two_way & (dist[v] + w < dist[u])).any()
+            ]
+        return self._rebuild(affected)
+
+    def _rebuild(self, sources: List[int]) -> List[int]:
+        for s in sources:
+            generation, blocked = self._blocked_snapshot()
+            built = self._dijkstra(s, blocked)
+            with self._lock:
+                if self._generation == generation:
+                    if s in self._trees:
+                        self._trees[s] = built
+                else:
+                    # A later change decided what to rebuild from a cache still holding the old
+                    # tree; drop it so the next tree() call builds against the current blockages
+                    self._trees.pop(s, None)
+        return sources
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {"cached_trees": len(self._trees), "tree_builds": self.tree_builds, "blocked_edges": len(self.blocked)}
+
+
+def load_graph(points: Optional[pd.DataFrame] = None, depot: Tuple[float, float] = DEPOT) -> RoadGraph:
+    """Graph files when present, otherwise a kNN graph over the depot and points
+    (a drone_data.csv-shaped frame: Cluster_ID, Latitude, Longitude)."""
+    if os.path.exists(ROAD_NODES_CSV) and os.path.exists(ROAD_EDGES_CSV):
+        return RoadGraph.from_csv(ROAD_NODES_CSV, ROAD_EDGES_CSV)
+    ids, lat, lon = ["DEPOT"], [depot[0]], [depot[1]]
+    if points is not None and len(points):
+        ids += points["Cluster_ID"].astype(str).tolist()
+        lat += points["Latitude"].astype(float).tolist()
+        lon += points["Longitude"].astype(float).tolist()
+    return RoadGraph.knn(ids, lat, lon)
+
+
+def _depot_tree(router: Router, coords: np.ndarray, depot: Tuple[float, float] = DEPOT):
+    g = router.graph
+    source = int(g.nearest_nodes(*depot)[0])
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    targets = g.nearest_nodes(coords[:, 0], coords[:, 1])
+    last_leg = haversine_km(g.lat[targets], g.lon[targets], coords[:, 0], coords[:, 1]) * DETOUR_FACTOR / DEFAULT_SPEED_KMH["road"] * 60
+    tree = router.tree(source)
+    return source, targets, tree, tree[0][np.asarray(targets, dtype=np.int64)] + last_leg
+
+
+def depot_etas(router: Router, coords: np.ndarray, depot: Tuple[float, float] = DEPOT) -> Tuple[int, np.ndarray, np.ndarray]:
+    """(depot node, nearest node per point, minutes per point) from the cached depot tree.
+
+    Minutes include the last leg from the nearest graph node to the point itself at road
+    speed; inf where the point is unreachable with current blockages.
+    """
+    source, targets, _, minutes = _depot_tree(router, coords, depot)
+    return source, targets, minutes
+
+
+def fill_routes(plan, cluster_coords: Dict[str, Tuple[float, float]], router: Router,
+                depot: Tuple[float, float] = DEPOT):
+    """Sets route and eta_minutes on every allocation of a validated Plan from one depot tree.
+
+    Clusters without coordinates keep whatever the model wrote; unreachable ones get None
+    and an assumption noting the blockage.
+    """
+    g = router.graph
+    allocs = [a for a in plan.allocations if a.cluster_id in cluster_coords]
+    if not allocs:
+        return plan
+    coords = np.array([cluster_coords[a.cluster_id] for a in allocs], dtype=float)
+    # ETAs and paths come from the same tree, even if a blockage rebuilds the cached one meanwhile
+    source, targets, tree, etas = _depot_tree(router, coords, depot)
+    for alloc, target, eta, (lat, lon) in zip(allocs, targets.tolist(), etas.tolist(), coords.tolist()):
+        if not np.isfinite(eta):
+            alloc.route, alloc.eta_minutes = None, None
+            plan.assumptions.append(f"{alloc.cluster_id} is unreachable from the depot with current blockages.")
+            continue
+        route = g.coords(router.path(source, target, tree))
+        if (route[-1]["lat"], route[-1]["lon"]) != (round(lat, 6), round(lon, 6)):
+            route.append({"lat": round(lat, 6), "lon": round(lon, 6)})
+        alloc.route = route
+        alloc.eta_minutes = int(round(eta))
+    return plan
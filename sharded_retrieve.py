@@ -0,0 +1,67 @@
+# sharded_retrieve.py
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any
+from haystack import Document
+from hybrid_retrieve import HybridRetriever
+
+# Document kinds written by ingest.py (meta.index), in the order the planner should see them
+KINDS = ("protocol", "report", "situation", "inventory")
+# Inventory goes to the planner as a CSV table already, so it gets no retrieval slots by default
+DEFAULT_QUOTAS = {"protocol": 2, "report": 5, "situation": 5, "inventory": 0}
+
+
+def shard_index_path(kind: str) -> str:
+    return f"{kind}.faiss"
+
+
+def split_by_kind(docs: List[Document]) -> Dict[str, List[Document]]:
+    shards: Dict[str, List[Document]] = {kind: [] for kind in KINDS}
+    for d in docs:
+        kind = d.meta.get("index")
+        if kind not in shards:
+            raise ValueError(f"Document {d.meta.get('id')} has unknown index '{kind}'")
+        shards[kind].append(d)
+    return shards
+
+
+class FanOutRetriever:
+    """Queries one small sub-index per document kind in parallel and merges the results.
+
+    Each kind returns at most its quota, so a flood of situation docs can no longer push
+    the single protocol doc out of the top-k.
+    """
+
+    def __init__(self, stores: Dict[str, Any], embedder, quotas: Optional[Dict[str, int]] = None):
+        self.quotas = dict(DEFAULT_QUOTAS, **(quotas or {}))
+        self.embedder = embedder
+        self.shards = {
+            kind: HybridRetriever(document_store=store, embedder=embedder, top_k=max(self.quotas.get(kind, 0), 1))
+            for kind, store in stores.items()
+        }
+        self._pool = ThreadPoolExecutor(max_workers=max(len(self.shards), 1), thread_name_prefix="fanout")
+
+    @property
+    def max_results(self) -> int:
+        return sum(self.quotas.get(kind, 0) for kind in self.shards)
+
+    def run(self, query: str, mode: str = "dense", quotas: Optional[Dict[str, int]] = None,
+            filters: Optional[Dict[str, Any]] = None,
+            query_embedding: Optional[List[float]] = None) -> List[Document]:
+        quotas = dict(self.quotas, **(quotas or {}))
+        active = [kind for kind in KINDS if kind in self.shards and quotas.get(kind, 0) > 0]
+        if not active:
+            return []
+
+        # Embed once and share the vector across every shard
+        q_emb = query_embedding
+        if q_emb is None and mode != "bm25":
+            q_emb = self.shards[active[0]].embed_query(query)
+
+        futures = {
+            kind: self._pool.submit(self.shards[kind].run, query, mode, quotas[kind], filters, q_emb)
+            for kind in active
+        }
+        merged = []
+        for kind in active:
+            merged.extend(futures[kind].result())
+        return merged
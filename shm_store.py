@@ -0,0 +1,500 @@
+# shm_store.py
+# Cluster and inventory tables in POSIX shared memory, so every worker process of main.py /
+# api.py reads the same columns instead of parsing and holding its own copy.
+#
+# Layout of one segment: a 4 KiB header (seqlock counter, version, active buffer, row counts,
+# schema) followed by two buffers of fixed-width columns. Writers fill the inactive buffer and
+# flip `active` inside a seqlock write section; readers take the active buffer's NumPy views
+# without copying and retry if the counter moved while they looked. select() filters on those
+# views and copies out only the rows a request asked for, so no worker keeps a table copy.
+#
+# Segments belong to a process that outlives the workers; request workers only attach, so a
+# worker exiting or being recycled never unlinks a table the others still use. Either run
+#   SHM_TABLES=flood python shm_store.py serve --clusters drone_data.csv --inventory inventory_data.csv
+# next to the workers, or create them in gunicorn's master (gunicorn.conf.py):
+#   def on_starting(server): server.shm_tables = shm_store.create_tables(CLUSTERS, INVENTORY)
+#   def on_exit(server): shm_store.close_tables(server.shm_tables)
+import os
+import sys
+import json
+import time
+import fcntl
+import signal
+import argparse
+import tempfile
+import threading
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from cluster_store import CLUSTER_COLUMNS, ClusterTable
+from inventory_snapshot import InventorySnapshot
+from columnar_store import load_clusters, load_inventory
+
+SHM_TABLES = os.getenv("SHM_TABLES")  # segment name prefix; unset = per-process tables
+SHM_MIN_CAPACITY = int(os.getenv("SHM_MIN_CAPACITY", "1024"))
+HEADER_BYTES = 4096
+_MAGIC = 0x53484D54424C3031  # "SHMTBL01"
+# Header slots (int64); _H_STARTED counts writes that began copying into the inactive buffer
+_H_MAGIC, _H_SEQ, _H_VERSION, _H_ACTIVE, _H_ROWS0, _H_ROWS1, _H_CAPACITY, _H_SCHEMA_LEN, _H_STARTED = range(9)
+_HEADER_SLOTS = 16
+_SCHEMA_OFFSET = _HEADER_SLOTS * 8
+
+CLUSTER_SCHEMA = {
+    "Cluster_ID": "S32",
+    "No_of_People": "i8",
+    "Latitude": "f8",
+    "Longitude": "f8",
+    "Distance_from_Inventory_km": "f8",
+}
+
+
+def schema_for(df: pd.DataFrame, text_bytes: int = 64) -> Dict[str, str]:
+    """Fixed-width NumPy dtypes for a frame: text -> S<n>, integers -> i8, everything else -> f8."""
+    schema = {}
+    for col, dtype in df.dtypes.items():
+        if pd.api.types.is_integer_dtype(dtype):
+            schema[col] = "i8"
+        elif pd.api.types.is_numeric_dtype(dtype):
+            schema[col] = "f8"
+        else:
+            longest = int(df[col].astype(str).str.encode("utf-8").str.len().max() or 0)
+            schema[col] = f"S{max(text_bytes, 2 * longest)}"
+    return schema
+
+
+def encode_text(values, dtype: str, col: str) -> np.ndarray:
+    """UTF-8 bytes for an S<n> column; raises instead of letting NumPy truncate longer values."""
+    encoded = pd.Series(values, dtype=object).astype(str).str.encode("utf-8")
+    width = np.dtype(dtype).itemsize
+    too_long = encoded.str.len() > width
+    if too_long.any():
+        example = encoded[too_long].iloc[0].decode("utf-8")
+        raise ValueError(f"{col} {example!r} is longer than the shared table's {width} bytes")
+    return encoded.to_numpy().astype(dtype)
+
+
+def _attach_untracked(name: str) -> shared_memory.SharedMemory:
+    # Only the creating process may unlink the segment. Before 3.13 attaching also registers it
+    # with the resource tracker (shared with the parent), which would unlink it on exit.
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args, **kwargs: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class SharedTable:
+    """Fixed-capacity columnar table in shared memory: one writer at a time, lock-free readers."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self._shm = shm
+        self.owner = owner
+        # Forked children inherit the object; only the creating process itself may unlink
+        self._owner_pid = os.getpid() if owner else None
+        self.header = np.ndarray((_HEADER_SLOTS,), dtype=np.int64, buffer=shm.buf)
+        if self.header[_H_MAGIC] != _MAGIC:
+            raise ValueError(f"Shared memory segment {shm.name} is not a SharedTable")
+        raw = bytes(shm.buf[_SCHEMA_OFFSET:_SCHEMA_OFFSET + int(self.header[_H_SCHEMA_LEN])])
+        self.schema: Dict[str, str] = json.loads(raw)
+        self.capacity = int(self.header[_H_CAPACITY])
+        self._buffers = [self._views(b) for b in (0, 1)]
+        self._lock_path = os.path.join(tempfile.gettempdir(), f"{shm.name.lstrip('/')}.lock")
+        self._thread_lock = threading.Lock()  # flock is per open file, not per thread
+
+    # ---- lifecycle ----
+
+    @staticmethod
+    def _size(schema: Dict[str, str], capacity: int) -> int:
+        row = sum(np.dtype(d).itemsize for d in schema.values())
+        return HEADER_BYTES + 2 * row * capacity
+
+    @classmethod
+    def create(cls, name: str, df: pd.DataFrame, schema: Optional[Dict[str, str]] = None,
+               capacity: Optional[int] = None) -> "SharedTable":
+        schema = schema or schema_for(df)
+        capacity = capacity or max(SHM_MIN_CAPACITY, 2 * len(df))
+        encoded = json.dumps(schema).encode()
+        if _SCHEMA_OFFSET + len(encoded) > HEADER_BYTES:
+            raise ValueError("Schema too large for the shared table header")
+        shm = shared_memory.SharedMemory(name=name, create=True, size=cls._size(schema, capacity))
+        header = np.ndarray((_HEADER_SLOTS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[_H_CAPACITY] = capacity
+        header[_H_SCHEMA_LEN] = len(encoded)
+        shm.buf[_SCHEMA_OFFSET:_SCHEMA_OFFSET + len(encoded)] = encoded
+        header[_H_MAGIC] = _MAGIC  # last: attachers wait for it
+        table = cls(shm, owner=True)
+        table.replace(df)
+        return table
+
+    @classmethod
+    def attach(cls, name: str, timeout: float = 10.0) -> "SharedTable":
+        shm = _attach_untracked(name)
+        header = np.ndarray((_HEADER_SLOTS,), dtype=np.int64, buffer=shm.buf)
+        deadline = time.monotonic() + timeout
+        while header[_H_MAGIC] != _MAGIC or header[_H_VERSION] == 0:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Shared table {name} was never initialised")
+            time.sleep(0.01)
+        return cls(shm, owner=False)
+
+    def close(self):
+        self._buffers = []
+        self.header = None
+        self._shm.close()
+        if self.owner and self._owner_pid == os.getpid():
+            self._shm.unlink()
+
+    # ---- layout ----
+
+    def _views(self, buffer: int) -> Dict[str, np.ndarray]:
+        offset = HEADER_BYTES + buffer * (self._size(self.schema, self.capacity) - HEADER_BYTES) // 2
+        views = {}
+        for col, dtype in self.schema.items():
+            dt = np.dtype(dtype)
+            views[col] = np.ndarray((self.capacity,), dtype=dt, buffer=self._shm.buf, offset=offset)
+            offset += dt.itemsize * self.capacity
+        return views
+
+    # ---- readers ----
+
+    @property
+    def version(self) -> int:
+        return int(self.header[_H_VERSION])
+
+    @property
+    def rows(self) -> int:
+        return self._begin()[2]
+
+    def _begin(self) -> Tuple[int, int, int, int]:
+        while True:
+            started = int(self.header[_H_STARTED])
+            seq = int(self.header[_H_SEQ])
+            if seq & 1:
+                time.sleep(0)  # writer is flipping buffers
+                continue
+            active = int(self.header[_H_ACTIVE])
+            rows = int(self.header[_H_ROWS0 + active])
+            version = int(self.header[_H_VERSION])
+            if int(self.header[_H_SEQ]) == seq:
+                return started, active, rows, version
+
+    def columns(self) -> Tuple[int, Dict[str, np.ndarray]]:
+        """(version, zero-copy column views). The views stay consistent until the second write
+        after this call starts, when their buffer is reused; use read() when that is not enough."""
+        _, active, rows, version = self._begin()
+        return version, {col: v[:rows] for col, v in self._buffers[active].items()}
+
+    def read(self, fn: Callable[[int, Dict[str, np.ndarray]], Any]) -> Any:
+        """fn(version, views) on a consistent snapshot; re-run if a write overtook it."""
+        while True:
+            started, active, rows, version = self._begin()
+            out = fn(version, {col: v[:rows] for col, v in self._buffers[active].items()})
+            # The first write after _begin() fills the other buffer; a second one refills ours
+            if int(self.header[_H_STARTED]) - started < 2:
+                return out
+
+    def select(self, where: Optional[Callable[[Dict[str, np.ndarray]], np.ndarray]] = None) -> Tuple[int, pd.DataFrame]:
+        """(version, DataFrame) of the rows where(views) marks True (all rows without where).
+
+        The mask is computed on the shared views and only the selected rows are copied, inside
+        one seqlock-validated read; text is decoded from the copies, so the frame stays valid."""
+        def build(version, cols):
+            if where is None:
+                return version, {col: arr.copy() for col, arr in cols.items()}
+            idx = np.flatnonzero(where(cols))
+            return version, {col: arr[idx] for col, arr in cols.items()}
+        version, data = self.read(build)
+        for col, arr in data.items():
+            if arr.dtype.kind == "S":
+                data[col] = pd.Series(arr).str.decode("utf-8")
+        return version, pd.DataFrame(data, copy=False)
+
+    # ---- writer ----
+
+    @contextmanager
+    def _exclusive(self):
+        with self._thread_lock, open(self._lock_path, "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def write(self, fn: Callable[[Dict[str, np.ndarray], int], Optional[int]]) -> int:
+        """fn(columns, rows) edits a private copy of the current rows (full-capacity arrays) and
+        returns the new row count (None = unchanged, False = no change at all). Publishes atomically."""
+        with self._exclusive():
+            active = int(self.header[_H_ACTIVE])
+            rows = int(self.header[_H_ROWS0 + active])
+            src, dst = self._buffers[active], self._buffers[1 - active]
+            self.header[_H_STARTED] += 1
+            for col in self.schema:
+                dst[col][:rows] = src[col][:rows]
+            new_rows = fn(dst, rows)
+            if new_rows is False:
+                return self.version
+            new_rows = rows if new_rows is None else int(new_rows)
+            if not 0 <= new_rows <= self.capacity:
+                raise ValueError(f"Shared table holds at most {self.capacity} rows")
+            self.header[_H_SEQ] += 1
+            self.header[_H_ROWS0 + 1 - active] = new_rows
+            self.header[_H_ACTIVE] = 1 - active
+            self.header[_H_VERSION] += 1
+            self.header[_H_SEQ] += 1
+            return self.version
+
+    def replace(self, df: pd.DataFrame) -> int:
+        if len(df) > self.capacity:
+            raise ValueError(f"Shared table holds at most {self.capacity} rows")
+
+        def fill(cols, _rows):
+            for col, dtype in self.schema.items():
+                values = df[col].to_numpy()
+                if np.dtype(dtype).kind == "S":
+                    values = encode_text(values, dtype, col)
+                cols[col][:len(df)] = values
+            return len(df)
+        return self.write(fill)
+
+
+class SharedInventory(InventorySnapshot):
+    """InventorySnapshot over a SharedTable: versions and stock are the same in every worker."""
+
+    def __init__(self, table: SharedTable):
+        self._table = table
+        self._lock = threading.Lock()
+        self._cache: Dict[str, tuple] = {}
+        self._frame: Tuple[int, Optional[pd.DataFrame]] = (-1, None)
+
+    @property
+    def version(self) -> int:
+        return self._table.version
+
+    def _state(self) -> Tuple[int, pd.DataFrame]:
+        cached = self._frame
+        if cached[0] != self._table.version:
+            # A few dozen resources: the one table small enough to keep a frame of per worker
+            self._frame = cached = self._table.select()
+        return cached
+
+    @property
+    def df(self) -> pd.DataFrame:
+        return self._state()[1]
+
+    _df = df  # base-class renderers read self._df
+
+    def _row(self, cols, rows, resource: str) -> int:
+        hits = np.flatnonzero(cols["Resource"][:rows] == resource.encode("utf-8"))
+        if not len(hits):
+            raise KeyError(f"Unknown resource: {resource}")
+        return int(hits[0])
+
+    def set_quantity(self, resource: str, quantity: int) -> int:
+        if int(quantity) < 0:
+            raise ValueError(f"Quantity for {resource} must be >= 0, got {quantity}")
+
+        def edit(cols, rows):
+            i = self._row(cols, rows, resource)
+            if int(cols["Quantity"][i]) == int(quantity):
+                return False
+            cols["Quantity"][i] = int(quantity)
+        return self._table.write(edit)
+
+    def adjust(self, resource: str, delta: int) -> int:
+        """Add (restock) or subtract (allocate) units; stock never goes below zero."""
+        def edit(cols, rows):
+            i = self._row(cols, rows, resource)
+            if delta == 0:
+                return False
+            cols["Quantity"][i] = max(0, int(cols["Quantity"][i]) + int(delta))
+        return self._table.write(edit)
+
+    def replace(self, df: pd.DataFrame) -> int:
+        return self._table.replace(df.reset_index(drop=True))
+
+
+class SharedClusterTable(ClusterTable):
+    """ClusterTable over a SharedTable. The change log only holds this worker's writes, so
+    changes_since() answers None (full refetch) whenever another worker wrote in between.
+
+    Nothing is cached per worker: select() copies the rows a request needs out of the shared
+    buffers, and snapshot()/df copy the whole table for the callers that need all of it."""
+
+    def __init__(self, table: SharedTable, history: int = 1024):
+        super().__init__(pd.DataFrame(columns=CLUSTER_COLUMNS), history)
+        self._table = table
+
+    @property
+    def version(self) -> int:
+        return self._table.version
+
+    @version.setter
+    def version(self, _value):
+        pass  # base __init__ assigns 0; the shared header is the only source of truth
+
+    def snapshot(self) -> Tuple[int, pd.DataFrame]:
+        return self._table.select()
+
+    def select(self, where: Optional[Callable[[Dict[str, np.ndarray]], np.ndarray]] = None,
+               ids: Optional[Iterable[str]] = None) -> Tuple[int, pd.DataFrame]:
+        if ids is not None:
+            wanted = np.array([str(c).encode("utf-8") for c in ids] or [b""], dtype=object)
+
+            def match(cols, where=where):
+                mask = np.isin(cols["Cluster_ID"], wanted)
+                return mask & where(cols) if where is not None else mask
+            return self._table.select(match)
+        return self._table.select(where)
+
+    @property
+    def df(self) -> pd.DataFrame:
+        return self.snapshot()[1]
+
+    def upsert(self, rows: Iterable[Dict[str, Any]]) -> int:
+        new = pd.DataFrame(list(rows), columns=CLUSTER_COLUMNS)
+        if new.empty:
+            return self.version
+        new = new.drop_duplicates("Cluster_ID", keep="last")
+        ids = encode_text(new["Cluster_ID"], self._table.schema["Cluster_ID"], "Cluster_ID")
+        diff = {}
+
+        def edit(cols, n):
+            index = {cid: i for i, cid in enumerate(cols["Cluster_ID"][:n].tolist())}
+            added, changed = set(), set()
+            for cid, row in zip(ids, new.itertuples(index=False)):
+                i = index.get(cid)
+                values = row._asdict()
+                if i is None:
+                    i = n
+                    n += 1
+                    if n > self.capacity:
+                        raise ValueError(f"Shared cluster table holds at most {self.capacity} rows")
+                    cols["Cluster_ID"][i] = cid
+                    added.add(cid.decode())
+                elif all(cols[c][i] == values[c] for c in CLUSTER_COLUMNS[1:]):
+                    continue
+                else:
+                    changed.add(cid.decode())
+                for c in CLUSTER_COLUMNS[1:]:
+                    cols[c][i] = values[c]
+            if not added and not changed:
+                return False
+            diff.update(added=added, changed=changed)
+            return n
+        return self._logged(edit, diff)
+
+    def remove(self, cluster_ids: Iterable[str]) -> int:
+        drop = {str(c).encode("utf-8") for c in cluster_ids}
+        diff = {}
+
+        def edit(cols, n):
+            keep = ~np.isin(cols["Cluster_ID"][:n], list(drop))
+            if keep.all():
+                return False
+            diff.update(removed={c.decode() for c in cols["Cluster_ID"][:n][~keep].tolist()})
+            kept = int(keep.sum())
+            for c in CLUSTER_COLUMNS:
+                cols[c][:kept] = cols[c][:n][keep]
+            return kept
+        return self._logged(edit, diff)
+
+    @property
+    def capacity(self) -> int:
+        return self._table.capacity
+
+    def _logged(self, edit, diff) -> int:
+        before = self._table.version
+        version = self._table.write(edit)
+        if version != before:
+            with self._lock:
+                self._log.append((version, diff.get("added", set()), diff.get("changed", set()), diff.get("removed", set())))
+        return version
+
+    def changes_since(self, since: int) -> Optional[Dict[str, set]]:
+        with self._lock:
+            logged = {v for v, *_ in self._log}
+        if any(v not in logged for v in range(since + 1, self.version + 1)):
+            return None
+        return super().changes_since(since)
+
+
+def _segment(kind: str) -> str:
+    return f"{SHM_TABLES}-{kind}"
+
+
+def _attach(kind: str) -> SharedTable:
+    try:
+        return SharedTable.attach(_segment(kind))
+    except FileNotFoundError:
+        raise RuntimeError(f"Shared table {_segment(kind)} does not exist; create it with "
+                           f"'python shm_store.py serve' or create_tables() in the server's master process") from None
+
+
+def create_tables(clusters_path: Optional[str] = None, inventory_path: Optional[str] = None) -> List[SharedTable]:
+    """Create the SHM_TABLES segments from .csv or .parquet files, owned by the calling process."""
+    if not SHM_TABLES:
+        raise RuntimeError("SHM_TABLES is not set")
+    tables = []
+    try:
+        if clusters_path:
+            df = load_clusters(clusters_path)[CLUSTER_COLUMNS]
+            # IDs at least as wide as CLUSTER_SCHEMA, with headroom over the longest one loaded
+            schema = {**CLUSTER_SCHEMA, "Cluster_ID": schema_for(df[["Cluster_ID"]], text_bytes=32)["Cluster_ID"]}
+            tables.append(SharedTable.create(_segment("clusters"), df, schema))
+        if inventory_path:
+            tables.append(SharedTable.create(_segment("inventory"), load_inventory(inventory_path)))
+    except BaseException:
+        close_tables(tables)
+        raise
+    return tables
+
+
+def close_tables(tables: Iterable[SharedTable]):
+    for table in tables:
+        table.close()
+
+
+def open_clusters(load: Callable[[], pd.DataFrame]) -> ClusterTable:
+    """Attach to the shared cluster table when SHM_TABLES is set, otherwise a private ClusterTable from load()."""
+    if not SHM_TABLES:
+        return ClusterTable(load())
+    return SharedClusterTable(_attach("clusters"))
+
+
+def open_inventory(path: str) -> InventorySnapshot:
+    """Inventory from a .csv or typed .parquet snapshot; the shared table when SHM_TABLES is set."""
+    if not SHM_TABLES:
+        return InventorySnapshot(load_inventory(path))
+    return SharedInventory(_attach("inventory"))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Create and hold the SHM_TABLES segments for main.py / api.py workers")
+    ap.add_argument("command", choices=("serve",))
+    ap.add_argument("--clusters", default=os.getenv("DRONE_DATA", "drone_data.csv"))
+    ap.add_argument("--inventory", default=os.getenv("INVENTORY_PATH", os.getenv("INVENTORY_CSV")))
+    args = ap.parse_args(argv)
+    tables = create_tables(args.clusters, args.inventory)
+    # Unlinked on SIGTERM / Ctrl-C; workers attached by then keep their mappings until they exit
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        print(", ".join(f"{t._shm.name}: {t.rows} rows" for t in tables), flush=True)
+        while True:
+            signal.pause()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        close_tables(tables)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+# stock_ledger.py
+# Inventory aggregates kept up to date on every allocation/restock instead of rescanned per call.
+#
+# LOW_STOCK_THRESHOLD sets the default alert level (10 units); LOW_STOCK_THRESHOLDS overrides it per
+# category, e.g. "medical=40,water=100,equipment=5".
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+import pandas as pd
+import orjson
+
+DEFAULT_CATEGORY = "general"
+
+
+def parse_thresholds(spec: str) -> Dict[str, int]:
+    out: Dict[str, int] = {}
+    for part in spec.split(","):
+        name, sep, value = part.partition("=")
+        if sep and name.strip():
+            out[name.strip()] = int(value)
+    return out
+
+
+LOW_STOCK_THRESHOLD = int(os.getenv("LOW_STOCK_THRESHOLD", "10"))
+LOW_STOCK_THRESHOLDS = parse_thresholds(os.getenv("LOW_STOCK_THRESHOLDS", ""))
+
+
+class StockLedger:
+    """Per-item stock with running totals, per-category sums and a low-stock index.
+
+    Every change is O(1): the item's delta is applied to the overall and category totals, and
+    the item enters or leaves the low-stock index when it crosses its category's threshold. The
+    status dict (and its JSON bytes) is built at most once per version, so polling it is free.
+
+    Item dicts are updated in place, so a caller's inventory list stays the source of truth for
+    anything else that reads it (FAISS id maps, pickles).
+    """
+
+    def __init__(self, items: Iterable[Dict[str, Any]], thresholds: Optional[Mapping[str, int]] = None,
+                 default_threshold: int = LOW_STOCK_THRESHOLD):
+        self.default_threshold = default_threshold
+        self._thresholds = dict(LOW_STOCK_THRESHOLDS if thresholds is None else thresholds)
+        self._lock = threading.Lock()
+        self._cache: Dict[str, tuple] = {}
+        self.version = 0
+        self.reset(items)
+
+        self.source_version: Optional[int] = None  # InventorySnapshot version this ledger mirrors
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, **kwargs) -> "StockLedger":
+        """Ledger over an inventory_data.csv-shaped frame (Resource, Quantity[, Category])."""
+        return cls(_frame_items(df), **kwargs)
+
+    def reset(self, items: Iterable[Dict[str, Any]], initial: Optional[Mapping[str, int]] = None):
+        """Rebuild every aggregate from scratch; the only O(n) path.
+
+        initial keeps the usage baseline across a resync; items it doesn't know start at their
+        current quantity.
+        """
+        initial = dict(initial or {})
+        with self._lock:
+            self._items: Dict[str, Dict[str, Any]] = {}
+            self.initial: Dict[str, int] = {}
+            self._categories: Dict[str, Dict[str, int]] = {}
+            self._members: Dict[str, List[str]] = {}
+            self._low: Dict[str, int] = {}
+            self.total_quantity = 0
+            self.total_initial = 0
+            for item in items:
+                name, qty = item["item"], int(item["quantity"])
+                start = int(initial.get(name, qty))
+                cat = self._category(item)
+                self._items[name] = item
+                self.initial[name] = start
+                agg = self._categories.setdefault(cat, {"items": 0, "total_quantity": 0, "initial_quantity": 0})
+                agg["items"] += 1
+                agg["total_quantity"] += qty
+                agg["initial_quantity"] += start
+                self._members.setdefault(cat, []).append(name)
+                self.total_quantity += qty
+                self.total_initial += start
+                if qty < self.threshold(cat):
+                    self._low[name] = qty
+            self._bump()
+
+    @staticmethod
+    def _category(item: Dict[str, Any]) -> str:
+        return item.get("category") or DEFAULT_CATEGORY
+
+    def _bump(self):
+        # Callers hold self._lock
+        self.version += 1
+        self._cache.clear()
+
+    def threshold(self, category: str) -> int:
+        return self._thresholds.get(category, self.default_threshold)
+
+    def set_threshold(self, category: str, value: int) -> int:
+        """Change one category's alert level; re-checks only that category's items."""
+        with self._lock:
+            self._thresholds[category] = int(value)
+            for name in self._members.get(category, ()):
+                self._index(name, int(self._items[name]["quantity"]), category)
+            self._bump()
+            return self.version
+
+    def _index(self, name: str, qty: int, category: str):
+        if qty < self.threshold(category):
+            self._low[name] = qty
+        else:
+            self._low.pop(name, None)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        return self._items.get(name)
+
+    def quantity(self, name: str) -> int:
+        return int(self._item(name)["quantity"])
+
+    def is_low(self, name: str) -> bool:
+        return name in self._low
+
+    def _item(self, name: str) -> Dict[str, Any]:
+        item = self._items.get(name)
+        if item is None:
+            raise KeyError(f"Unknown resource: {name}")
+        return item
+
+    def _set(self, item: Dict[str, Any], quantity: int) -> int:
+        # Callers hold self._lock
+        old, new = int(item["quantity"]), max(0, int(quantity))
+        if old == new:
+            return self.version
+        item["quantity"] = new
+        cat = self._category(item)
+        self._categories[cat]["total_quantity"] += new - old
+        self.total_quantity += new - old
+        self._index(item["item"], new, cat)
+        self._bump()
+        return self.version
+
+    def set_quantity(self, name: str, quantity: int) -> int:
+        with self._lock:
+            return self._set(self._item(name), quantity)
+
+    def adjust(self, name: str, delta: int) -> int:
+        """Add (restock) or subtract (allocate) units; stock never goes below zero."""
+        with self._lock:
+            item = self._item(name)
+            return self._set(item, int(item["quantity"]) + int(delta))
+
+    def allocate(self, name: str, qty: int) -> int:
+        """Take up to qty units; returns how many were actually taken."""
+        with self._lock:
+            item = self._item(name)
+            taken = min(max(0, int(qty)), int(item["quantity"]))
+            self._set(item, int(item["quantity"]) - taken)
+            return taken
+
+    def restock(self, name: str, qty: int) -> int:
+        return self.adjust(name, abs(int(qty)))
+
+    def follow(self, snapshot) -> "StockLedger":
+        """Mirror an InventorySnapshot. Writes made through applied() keep it current; a version
+        it didn't see (another worker's update over SHM_TABLES) costs one resync."""
+        if snapshot.version != self.source_version:
+            version, df = snapshot.snapshot()
+            self.reset(_frame_items(df), initial=self.initial)
+            self.source_version = version
+        return self
+
+    def applied(self, version: int, name: str, quantity: int):
+        """Record a set_quantity this process made on the mirrored snapshot, in O(1)."""
+        if self.source_version is not None and version == self.source_version + 1:
+            self.set_quantity(name, quantity)
+            self.source_version = version
+
+    def _low_stock(self) -> List[Dict[str, Any]]:
+        out = []
+        for name, qty in sorted(self._low.items(), key=lambda kv: (kv[1], kv[0])):
+            cat = self._category(self._items[name])
+            out.append({"item": name, "quantity": qty, "category": cat, "threshold": self.threshold(cat)})
+        return out
+
+    def low_stock(self) -> List[Dict[str, Any]]:
+        """Items under their category threshold, emptiest first. Sorts only the alert set."""
+        with self._lock:
+            return self._low_stock()
+
+    def status(self) -> Dict[str, Any]:
+        """get_inventory_status shape plus usage and thresholds; cached until the next change."""
+        with self._lock:
+            hit = self._cache.get("status")
+            if hit is None:
+                categories = {
+                    cat: {**agg, "used": agg["initial_quantity"] - agg["total_quantity"], "threshold": self.threshold(cat)}
+                    for cat, agg in self._categories.items()
+                }
+                hit = self._cache["status"] = {
+                    "version": self.version,
+                    "total_items": len(self._items),
+                    "total_quantity": self.total_quantity,
+                    "total_initial": self.total_initial,
+                    "total_used": self.total_initial - self.total_quantity,
+                    "categories": categories,
+                    "low_stock_items": self._low_stock(),
+                }
+            return hit
+
+    def status_bytes(self) -> bytes:
+        status = self.status()
+        with self._lock:
+            hit = self._cache.get("status_json")
+            if hit is None or hit[0] != status["version"]:
+                hit = (status["version"], orjson.dumps(status))
+                if status["version"] == self.version:
+                    self._cache["status_json"] = hit
+            return hit[1]
+
+
+def _frame_items(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    cats = df["Category"] if "Category" in df.columns else [DEFAULT_CATEGORY] * len(df)
+    return [{"item": r, "quantity": int(q), "category": c} for r, q, c in zip(df["Resource"], df["Quantity"], cats)]
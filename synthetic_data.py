@@ -0,0 +1,109 @@
+# synthetic_data.py
+# Seeded generators shaped like drone_data.csv / inventory_data.csv / raag2 inventory / Plan JSON /
+# raw drone detections,
+# for benchmarks and simulations at sizes the real CSVs don't reach.
+from typing import Any, Dict, List, Tuple
+import numpy as np
+import pandas as pd
+from geo import DEPOT, haversine_km
+
+# Bounding box and headcount range of the drone_data.csv sample
+LAT_RANGE = (18.0, 19.0)
+LON_RANGE = (73.0, 74.0)
+PEOPLE_RANGE = (5, 100)
+
+BASE_RESOURCES = ["Medical Kits", "Emergency Kits", "Food Packets", "Water Bottles", "Blankets", "Rescue Boats"]
+RAG_CATEGORIES = ["medical", "food", "water", "rescue", "shelter", "equipment"]
+
+
+def cluster_ids(n: int, start: int = 1) -> List[str]:
+    width = max(3, len(str(start + n - 1)))
+    return [f"C{i:0{width}d}" for i in range(start, start + n)]
+
+
+def synth_clusters(n: int, seed: int = 0, start: int = 1) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(*LAT_RANGE, n)
+    lon = rng.uniform(*LON_RANGE, n)
+    return pd.DataFrame({
+        "Cluster_ID": cluster_ids(n, start),
+        "No_of_People": rng.integers(PEOPLE_RANGE[0], PEOPLE_RANGE[1], n),
+        "Latitude": lat.round(6),
+        "Longitude": lon.round(6),
+        "Distance_from_Inventory_km": haversine_km(DEPOT[0], DEPOT[1], lat, lon).round(2),
+    })
+
+
+def resource_names(n: int) -> List[str]:
+    if n <= len(BASE_RESOURCES):
+        return BASE_RESOURCES[:n]
+    return BASE_RESOURCES + [f"{BASE_RESOURCES[i % len(BASE_RESOURCES)]} #{i}" for i in range(len(BASE_RESOURCES), n)]
+
+
+def synth_inventory(n: int, seed: int = 0) -> pd.DataFrame:
+    """inventory_data.csv shape: Resource, Quantity, Inventory_Latitude, Inventory_Longitude."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Resource": resource_names(n),
+        "Quantity": rng.integers(50, 500, n),
+        "Inventory_Latitude": DEPOT[0],
+        "Inventory_Longitude": DEPOT[1],
+    })
+
+
+def synth_rag_inventory(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """DisasterReliefRAG.inventory shape: id, item, quantity, category, priority."""
+    rng = np.random.default_rng(seed)
+    qty = rng.integers(10, 500, n)
+    cats = rng.integers(0, len(RAG_CATEGORIES), n)
+    return [
+        {"id": i + 1, "item": name, "quantity": int(qty[i]), "category": RAG_CATEGORIES[cats[i]],
+         "priority": int(cats[i] % 3) + 1}
+        for i, name in enumerate(resource_names(n))
+    ]
+
+
+def synth_plan(n_alloc: int, inventory_df: pd.DataFrame, seed: int = 0) -> Dict[str, Any]:
+    """A schema-valid Plan dict whose allocations stay within inventory_df quantities."""
+    rng = np.random.default_rng(seed)
+    names = inventory_df["Resource"].tolist()
+    remaining = dict(zip(names, inventory_df["Quantity"].astype(int).tolist()))
+    allocations = []
+    for cid in cluster_ids(n_alloc):
+        items = []
+        for name in rng.choice(names, size=min(2, len(names)), replace=False):
+            qty = min(int(rng.integers(1, 5)), remaining[name])
+            if qty > 0:
+                remaining[name] -= qty
+                items.append({"item": str(name), "qty": qty})
+        allocations.append({
+            "cluster_id": cid,
+            "priority": round(float(rng.uniform()), 3),
+            "items": items,
+            "assigned_team": f"BoatTeam-{int(rng.integers(1, 20))}",
+            "route": [{"lat": round(float(rng.uniform(*LAT_RANGE)), 5), "lon": round(float(rng.uniform(*LON_RANGE)), 5)}],
+            "eta_minutes": int(rng.integers(10, 240)),
+        })
+    return {
+        "objective": "Deliver relief to synthetic clusters.",
+        "assumptions": ["Synthetic benchmark plan."],
+        "constraints": [{"type": "time", "max_minutes": 360}],
+        "allocations": allocations,
+        "unmet_demand": [],
+        "source_attributions": [{"source": "report:RP1022"}],
+        "summary": f"{n_alloc} synthetic allocations.",
+    }
+
+
+def synth_detections(n: int, seed: int = 0, groups: int = 500, spread_m: float = 120.0,
+                     noise: float = 0.05) -> Tuple[np.ndarray, np.ndarray]:
+    """Person detections (lat, lon) around `groups` stranded groups, plus a fraction of stray hits."""
+    rng = np.random.default_rng(seed)
+    centers = np.column_stack([rng.uniform(*LAT_RANGE, groups), rng.uniform(*LON_RANGE, groups)])
+    n_noise = int(n * noise)
+    pick = rng.integers(0, groups, n - n_noise)
+    deg = spread_m / 111_320.0
+    lat = np.concatenate([centers[pick, 0] + rng.normal(0, deg, len(pick)), rng.uniform(*LAT_RANGE, n_noise)])
+    lon = np.concatenate([centers[pick, 1] + rng.normal(0, deg, len(pick)), rng.uniform(*LON_RANGE, n_noise)])
+    order = rng.permutation(n)  # interleave groups and noise like a real sweep would
+    return lat[order], lon[order]
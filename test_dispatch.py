@@ -0,0 +1,68 @@
+# test_dispatch.py
+# Feasibility checks for dispatch.py: run with python -m pytest -q test_dispatch.py
+import random
+import numpy as np
+import pandas as pd
+
+from dispatch import DEFAULT_MAX_MINUTES, Dispatcher, Stop, Team, assign_teams
+from geo import DEPOT
+from planner_prompt import Plan
+from routing import RoadGraph, Router, fill_routes
+
+
+def _teams(n=10):
+    return [Team(f"Team-{i + 1}") for i in range(n)]
+
+
+def _single_trip_minutes(d: Dispatcher, s: int, team: Team) -> float:
+    return d._minutes(d._km(-1, s) + d._km(s, -1), 1, team)
+
+
+def test_reachable_single_cluster_is_always_assigned():
+    teams = _teams()
+    rng = random.Random(0)
+    for _ in range(500):
+        stop = Stop("C001", DEPOT[0] + rng.uniform(-1.2, 1.2), DEPOT[1] + rng.uniform(-1.2, 1.2), rng.randint(1, 500), 1.0)
+        d = Dispatcher(teams).solve([stop])
+        reachable = _single_trip_minutes(d, 0, teams[0]) <= DEFAULT_MAX_MINUTES
+        assert (d.unassigned == []) == reachable
+        if reachable:
+            assert d.arrivals()["C001"][0] is not None
+
+
+def test_every_trip_fits_a_shift_with_service_time():
+    teams = _teams()
+    rng = random.Random(1)
+    for _ in range(300):
+        stops = [Stop(f"C{i:03d}", DEPOT[0] + rng.uniform(-1.2, 1.2), DEPOT[1] + rng.uniform(-1.2, 1.2),
+                      rng.randint(1, 400), rng.random()) for i in range(rng.randint(2, 6))]
+        d = Dispatcher(teams).solve(stops)
+        for trip in d.trips:
+            assert d._minutes(trip.km, len(trip.stops), teams[0]) <= DEFAULT_MAX_MINUTES + 1e-6
+        # With 10 idle teams, only clusters out of range even on their own go unassigned
+        for s in d.unassigned:
+            assert _single_trip_minutes(d, s, teams[0]) > DEFAULT_MAX_MINUTES
+
+
+def _plan(cluster_ids):
+    return Plan(objective="o", assumptions=[], constraints=[], unmet_demand=[], source_attributions=[], summary="s",
+                allocations=[{"cluster_id": c, "priority": 0.5, "items": [{"item": "Water", "qty": 10}]} for c in cluster_ids])
+
+
+def test_unreachable_cluster_gets_no_team_and_road_etas_are_kept():
+    # Depot - A - B in a line; B hangs off A by a single edge that gets blocked
+    nodes = pd.DataFrame({"node_id": ["D", "A", "B"], "lat": [DEPOT[0], DEPOT[0] + 0.1, DEPOT[0] + 0.2],
+                          "lon": [DEPOT[1]] * 3})
+    graph = RoadGraph(nodes["node_id"], nodes["lat"], nodes["lon"],
+                      pd.DataFrame({"from": ["D", "A"], "to": ["A", "B"], "length_km": [30.0, 30.0]}))
+    router = Router(graph)
+    router.block_edges([1])
+    coords = {"C001": (DEPOT[0] + 0.1, DEPOT[1]), "C002": (DEPOT[0] + 0.2, DEPOT[1])}
+    plan = fill_routes(_plan(["C001", "C002"]), coords, router)
+    road_eta = plan.allocations[0].eta_minutes
+    assign_teams(plan, coords, _teams(), router=router)
+    reachable, blocked = plan.allocations
+    assert blocked.route is None and blocked.assigned_team is None and blocked.eta_minutes is None
+    assert reachable.assigned_team is not None
+    # First stop of a trip: the scheduled arrival is the road-graph ETA, not a straight-line estimate
+    assert np.isclose(reachable.eta_minutes, road_eta, atol=1)
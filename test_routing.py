@@ -0,0 +1,52 @@
+# test_routing.py
+# Blockage consistency in routing.Router: run with python -m pytest -q test_routing.py
+import numpy as np
+import pandas as pd
+
+from geo import DEPOT
+from planner_prompt import Plan
+from routing import RoadGraph, Router, fill_routes
+
+
+def _line_router():
+    # Depot - A - B in a line; B hangs off A by edge 1
+    nodes = pd.DataFrame({"node_id": ["D", "A", "B"], "lat": [DEPOT[0], DEPOT[0] + 0.1, DEPOT[0] + 0.2],
+                          "lon": [DEPOT[1]] * 3})
+    graph = RoadGraph(nodes["node_id"], nodes["lat"], nodes["lon"],
+                      pd.DataFrame({"from": ["D", "A"], "to": ["A", "B"], "length_km": [30.0, 30.0]}))
+    return Router(graph)
+
+
+def test_tree_built_during_a_block_is_not_cached_stale():
+    router = _line_router()
+    build = router._dijkstra
+    calls = []
+
+    def racing_build(source, blocked):
+        calls.append(source)
+        if len(calls) == 1:
+            # Another request blocks B's only edge while this tree is being built
+            router.block_edges([1])
+        return build(source, blocked)
+
+    router._dijkstra = racing_build
+    dist = router.tree(0)[0]
+    assert not np.isfinite(dist[2])
+    assert not np.isfinite(router.tree(0)[0][2])
+
+
+def test_fill_routes_uses_one_tree_for_etas_and_paths():
+    router = _line_router()
+    tree = router.tree
+
+    def tree_then_block(source):
+        t = tree(source)
+        router.block_edges([1])  # rebuilds the cached tree after the ETAs were read
+        return t
+
+    router.tree = tree_then_block
+    coords = {"C002": (DEPOT[0] + 0.2, DEPOT[1])}
+    plan = Plan(objective="o", assumptions=[], constraints=[], unmet_demand=[], source_attributions=[], summary="s",
+                allocations=[{"cluster_id": "C002", "priority": 0.5, "items": [{"item": "Water", "qty": 10}]}])
+    alloc = fill_routes(plan, coords, router).allocations[0]
+    assert alloc.route is not None and alloc.eta_minutes is not None
@@ -0,0 +1,31 @@
+# test_simulator.py
+# Supply knobs in simulator.py: run with python -m pytest -q test_simulator.py
+import numpy as np
+
+from simulator import RESTOCK, RESTOCK_SHARE_RANGE, calibrated_stock, generate_timeline, run_scenario
+
+
+def _restocks(events):
+    return [ev.data for ev in events if ev.kind == RESTOCK]
+
+
+def test_restock_count_follows_restocks_per_day():
+    counts = {rate: np.mean([len(_restocks(generate_timeline(seed, restocks_per_day=rate))) for seed in range(40)])
+              for rate in (3.0, 30.0)}
+    assert 2 < counts[3.0] < 4
+    assert 27 < counts[30.0] < 33
+
+
+def test_restock_sizes_follow_the_given_stock():
+    stock = dict(calibrated_stock(), **{"Water Bottles": 100})
+    for seed in range(20):
+        for r in _restocks(generate_timeline(seed, stock=stock, restocks_per_day=30.0)):
+            lo, hi = RESTOCK_SHARE_RANGE
+            assert int(stock[r["resource"]] * lo) <= r["qty"] <= int(stock[r["resource"]] * hi)
+
+
+def test_more_restocks_leave_less_unmet():
+    stock = calibrated_stock()
+    few = run_scenario("severity", 1, initial_stock=stock, restocks_per_day=3.0)
+    many = run_scenario("severity", 1, initial_stock=stock, restocks_per_day=30.0)
+    assert many["unmet_fraction"] < few["unmet_fraction"]